@@ -1,4 +1,6 @@
+import os
 from library.mysql_helper import DatabaseHandler
+from library.query_profiler import QueryProfiler
 from library import secret
 
 # DB Handler 인스턴스 생성
@@ -31,3 +33,12 @@ except Exception as e:
 
     us_db_handler = MockHandler()
     kr_db_handler = MockHandler()
+
+
+# SQL 프로파일링 (opt-in): SQL_PROFILE=1 이면 요청 단위로 쿼리 집계, N+1 임계값은 SQL_N_PLUS_ONE
+query_profiler = None
+if os.getenv('SQL_PROFILE') == '1':
+    query_profiler = QueryProfiler(n_plus_one_threshold=int(os.getenv('SQL_N_PLUS_ONE', '5')))
+    for handler in (us_db_handler, kr_db_handler):
+        if hasattr(handler, 'engine'):
+            query_profiler.attach(handler.engine)
@@ -0,0 +1,80 @@
+"""
+Microbenchmark of the recording wrapper: added cost per get_last_price call for each policy.
+
+Each policy patches a trivial manager method and times it against the unpatched method
+(best of --repeat runs of --calls calls). Numbers depend on the machine, so they are only
+reported, never asserted on.
+
+    python benchmarks/recorder_overhead.py --policy on_change,100,always --out overhead.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+DEFAULT_POLICIES = ['on_change', '100', 'always']
+
+
+def per_call_us(func, n=20000, repeat=5):
+    """Best of `repeat` runs, in microseconds per call"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n):
+            func('AAPL')
+        best = min(best, time.perf_counter() - start)
+    return best / n * 1e6
+
+
+def overhead_us(policy, n=20000, repeat=5):
+    """Recording cost per call (us) of `policy` on top of the bare method"""
+    from library.recorder import AsyncDataRecorder, apply_patches
+
+    class Manager:
+        user_id = 'user'
+
+        def get_last_price(self, symbol):
+            return 100.0
+
+    baseline = per_call_us(Manager().get_last_price, n, repeat)
+    test_dir = tempfile.mkdtemp()
+    recorder = AsyncDataRecorder(os.path.join(test_dir, "bench.jsonl"), queue_size=n * repeat + 1)
+    try:
+        apply_patches(recorder, [Manager], {'get_last_price': policy})
+        return per_call_us(Manager().get_last_price, n, repeat) - baseline
+    finally:
+        recorder.close()
+        shutil.rmtree(test_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the recorder wrapper cost per call')
+    parser.add_argument('--policy', type=lambda s: s.split(','), default=DEFAULT_POLICIES,
+                        help='Record policies (comma list, e.g. on_change,1/100,always)')
+    parser.add_argument('--calls', type=int, default=20000, help='Calls per timed run')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per policy (best is kept)')
+    parser.add_argument('--out', help='Write the JSON report here')
+    args = parser.parse_args(argv)
+
+    report = {}
+    for policy in args.policy:
+        report[policy] = round(overhead_us(policy, args.calls, args.repeat), 3)
+        print(f"[Bench] policy {policy:<12} overhead {report[policy]:8.3f}us/call")
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"[Bench] Report written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""
+End-to-end benchmark of TradingSystem.process_trading_rules.
+
+Each scenario builds an in-memory SQLite database (accounts + trading_rules) and a
+PaperExchange with the same accounts, then runs the real trading loop for a fixed number
+of cycles on a SimulatedClock: every cycle reads the next tick of a seeded SyntheticMarket,
+so prices move and rules trigger, but no wall time is spent sleeping.
+
+Per scenario it reports cycle time (p50/p95/max), per-phase latency (the QueryProfiler
+units: startup, cycle, close), SQL statements and broker calls per cycle, and peak RSS.
+Scenarios run in a fresh spawned process by default so peak RSS belongs to one scenario.
+
+    python benchmarks/trading_loop.py --rules 10,100,1000,5000 --users 1,10,50 --out bench.json
+    python benchmarks/trading_loop.py --baseline bench.json     # exit 1 on regression
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+project_root = str(Path(__file__).parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+SESSION_CLOSE = datetime(2024, 1, 2, 16, 0)  # Tuesday
+TIME_METRICS = ('cycle_ms_p50', 'cycle_ms_p95', 'startup_ms', 'close_ms', 'peak_rss_mb')
+# Absolute slack on top of the relative tolerance so sub-millisecond jitter is not a regression
+ABSOLUTE_SLACK = {'peak_rss_mb': 5.0}
+DEFAULT_MS_SLACK = 2.0
+COUNT_METRICS = ('sql_per_cycle', 'broker_calls_per_cycle')
+
+
+def scenario_key(scenario):
+    return f"rules={scenario['rules']},users={scenario['users']},accounts={scenario['accounts']}"
+
+
+def build_scenario(rules, users, accounts, seed=0, cycles=20, cash=100000.0):
+    """
+    (db, exchange, clock) for rules spread round-robin over users x accounts.
+    Every account trades its own symbols (one rule per account/symbol, like production);
+    a third of the rules are percent SELL rules with a holding, the rest price BUY rules
+    with limits just under the opening price.
+    """
+    from library.clock import SimulatedClock
+    from library.mysql_helper import DatabaseHandler
+    from library.paper_broker import PaperExchange
+    from library.synthetic_market import SyntheticMarket
+
+    db = DatabaseHandler(':memory:', backend='sqlite')
+    db.bootstrap_schema('us')
+    account_ids = []
+    for u in range(users):
+        user = f'bench{u:02d}'
+        for a in range(accounts):
+            account_id, number = f'{user}_{a}', f'{u:02d}{a:03d}'
+            db.add_account(account_id, user, number, 'Bench')
+            db.update_account_hash(number, f'hash_{number}', user)
+            account_ids.append(account_id)
+
+    n_symbols = -(-rules // len(account_ids))  # ceil
+    market = SyntheticMarket('schwab', n_symbols=n_symbols, days=1, tick_seconds=60.0, seed=seed,
+                             jumps_per_day=0.0, sigma=(0.3, 0.8))
+    _, day_prices = market.generate_day(0)
+    day_prices = day_prices[:, :cycles + 1]
+    rng = np.random.default_rng(seed)
+
+    holdings = []
+    for i in range(rules):
+        account_id = account_ids[i % len(account_ids)]
+        k = i // len(account_ids)
+        symbol, open_price = market.symbols[k], float(day_prices[k, 0])
+        if i % 3 == 2:
+            db.add_trading_rule(account_id, symbol, round(float(rng.uniform(0.1, 1.0)), 2), 'percent',
+                                0, 2000.0, 0, 1)
+            holdings.append((i + 1, open_price, int(rng.integers(10, 50)), round(open_price * 0.995, 2)))
+        else:
+            db.add_trading_rule(account_id, symbol, round(open_price * float(rng.uniform(0.99, 1.0)), 2),
+                                'price', 100, 1000.0, 1, 1)
+    for rule_id, price, quantity, avg in holdings:
+        db.update_current_price_quantity(rule_id, price, quantity, avg)
+
+    clock = SimulatedClock(SESSION_CLOSE - timedelta(seconds=cycles))
+    start = clock.now()
+    index = {s: k for k, s in enumerate(market.symbols)}
+
+    def price_source(symbol, now):
+        k = index.get(symbol)
+        if k is None:
+            return None
+        tick = min(int((now - start).total_seconds()), day_prices.shape[1] - 1)
+        return float(day_prices[k, tick])
+
+    exchange = PaperExchange(price_source, clock=clock)
+    exchange.load_accounts(db, cash=cash)
+    return db, exchange, clock
+
+
+def _make_system(exchange, db, clock, log_level=logging.ERROR):
+    from strategies.paper_strategy import PaperMarketStrategy
+    from trader import TradingSystem
+
+    class BenchTradingSystem(TradingSystem):
+        """Attributes broker calls to the QueryProfiler unit that made them"""
+
+        def _start_profile_unit(self, name):
+            self._calls_at_start = sum(exchange.calls.values())
+            super()._start_profile_unit(name)
+
+        def _end_profile_unit(self):
+            summary = self.query_profiler.end_unit() if self.query_profiler else None
+            if summary is not None:
+                summary['broker_calls'] = sum(exchange.calls.values()) - self._calls_at_start
+
+    system = BenchTradingSystem(PaperMarketStrategy(exchange, db), clock=clock)
+    system.send_alert = lambda msg: None
+    system.logger.setLevel(log_level)
+    system.enable_query_profiling(n_plus_one_threshold=10 ** 9)
+    system.query_profiler.summaries = []  # keep every unit, not just the last 500
+    return system
+
+
+def run_scenario(rules, users, accounts, cycles=20, seed=0, log_level=logging.ERROR):
+    """Builds and runs one scenario; returns its metrics dict"""
+    scenario = {"rules": rules, "users": users, "accounts": accounts, "cycles": cycles, "seed": seed}
+    build_started = time.perf_counter()
+    db, exchange, clock = build_scenario(rules, users, accounts, seed=seed, cycles=cycles)
+    system = _make_system(exchange, db, clock, log_level)
+    build_s = time.perf_counter() - build_started
+
+    started = time.perf_counter()
+    system.process_trading_rules()
+    total_s = time.perf_counter() - started
+
+    units = system.query_profiler.summaries
+    cycle_units = [u for u in units if u['name'].startswith('cycle-')]
+    phase = {name: next((u for u in units if u['name'] == name), None) for name in ('startup', 'close')}
+    cycle_ms = np.array([u['duration_ms'] for u in cycle_units]) if cycle_units else np.zeros(1)
+    n = max(len(cycle_units), 1)
+    db.engine.dispose()
+
+    return {
+        **scenario,
+        "key": scenario_key(scenario),
+        "build_s": round(build_s, 3),
+        "total_s": round(total_s, 3),
+        "cycles_run": len(cycle_units),
+        "cycle_ms_mean": round(float(cycle_ms.mean()), 3),
+        "cycle_ms_p50": round(float(np.percentile(cycle_ms, 50)), 3),
+        "cycle_ms_p95": round(float(np.percentile(cycle_ms, 95)), 3),
+        "cycle_ms_max": round(float(cycle_ms.max()), 3),
+        "cycle_sql_ms_mean": round(sum(u['query_ms'] for u in cycle_units) / n, 3),
+        "startup_ms": phase['startup']['duration_ms'] if phase['startup'] else None,
+        "startup_sql": phase['startup']['query_count'] if phase['startup'] else None,
+        "startup_broker_calls": phase['startup'].get('broker_calls') if phase['startup'] else None,
+        "close_ms": phase['close']['duration_ms'] if phase['close'] else None,
+        "close_sql": phase['close']['query_count'] if phase['close'] else None,
+        "close_broker_calls": phase['close'].get('broker_calls') if phase['close'] else None,
+        "sql_per_cycle": round(sum(u['query_count'] for u in cycle_units) / n, 2),
+        "broker_calls_per_cycle": round(sum(u.get('broker_calls', 0) for u in cycle_units) / n, 2),
+        "broker_calls": dict(sorted(exchange.calls.items())),
+        "fills": len(exchange.fills),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def expand_scenarios(rules, users, accounts):
+    return [{"rules": r, "users": u, "accounts": a} for r, u, a in itertools.product(rules, users, accounts)]
+
+
+def run_suite(scenarios, cycles=20, seed=0, isolate=True, progress=None, log_level=logging.ERROR):
+    """Runs every scenario (each in a fresh spawned process when isolate) and returns the report"""
+    results = []
+    for scenario in scenarios:
+        args = (scenario['rules'], scenario['users'], scenario['accounts'], cycles, seed, log_level)
+        if isolate:
+            import multiprocess as mp
+            with mp.get_context('spawn').Pool(1) as pool:
+                result = pool.apply(run_scenario, args)
+        else:
+            result = run_scenario(*args)
+        results.append(result)
+        if progress:
+            progress(result)
+    return {
+        "meta": {"created_at": datetime.now().isoformat(timespec='seconds'), "python": platform.python_version(),
+                 "platform": platform.platform(), "cycles": cycles, "seed": seed, "isolated": isolate},
+        "scenarios": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.25, count_tolerance=0.0):
+    """
+    Regressions of report against baseline, matched by scenario key:
+    time/RSS metrics may grow by tolerance (relative) plus ABSOLUTE_SLACK, SQL/broker counts
+    by count_tolerance.
+    Returns a list of {key, metric, baseline, current, change_pct}.
+    """
+    base = {s['key']: s for s in baseline.get('scenarios', [])}
+    regressions = []
+    for current in report['scenarios']:
+        previous = base.get(current['key'])
+        if previous is None:
+            continue
+        for metric in TIME_METRICS + COUNT_METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            if metric in TIME_METRICS:
+                limit = old * (1 + tolerance) + ABSOLUTE_SLACK.get(metric, DEFAULT_MS_SLACK)
+            else:
+                limit = old * (1 + count_tolerance) + 1e-9
+            if new > limit:
+                change = (new - old) / old * 100 if old else float('inf')
+                regressions.append({"key": current['key'], "metric": metric, "baseline": old, "current": new,
+                                    "change_pct": round(change, 1)})
+    return regressions
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the trading loop against paper brokers')
+    parser.add_argument('--rules', type=_int_list, default=[10, 100, 1000, 5000], help='Rule counts (comma list)')
+    parser.add_argument('--users', type=_int_list, default=[1, 10, 50], help='User counts (comma list)')
+    parser.add_argument('--accounts', type=_int_list, default=[1], help='Accounts per user (comma list)')
+    parser.add_argument('--cycles', type=int, default=20, help='Loop cycles per scenario')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--in-process', action='store_true',
+                        help='Run scenarios in this process (faster, but peak RSS is cumulative)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Keep the trading_system DEBUG log (console logging then counts in cycle time)')
+    parser.add_argument('--out', help='Write the JSON report here')
+    parser.add_argument('--baseline', help='Compare against this stored report and exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative growth of time/RSS metrics')
+    parser.add_argument('--count-tolerance', type=float, default=0.0,
+                        help='Allowed relative growth of SQL statements / broker calls per cycle')
+    args = parser.parse_args(argv)
+
+    def progress(r):
+        print(f"[Bench] {r['key']:<32} cycle p50 {r['cycle_ms_p50']:8.2f}ms  p95 {r['cycle_ms_p95']:8.2f}ms  "
+              f"sql/cycle {r['sql_per_cycle']:7.1f}  broker/cycle {r['broker_calls_per_cycle']:7.1f}  "
+              f"rss {r['peak_rss_mb']:.0f}MB")
+
+    report = run_suite(expand_scenarios(args.rules, args.users, args.accounts), cycles=args.cycles,
+                       seed=args.seed, isolate=not args.in_process, progress=progress,
+                       log_level=logging.DEBUG if args.verbose else logging.ERROR)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"[Bench] Report written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.count_tolerance)
+        for r in regressions:
+            print(f"[Bench] REGRESSION {r['key']} {r['metric']}: {r['baseline']} -> {r['current']} "
+                  f"({r['change_pct']:+.1f}%)")
+        if regressions:
+            return 1
+        print("[Bench] No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,7 @@ CREATE TABLE accounts (
     cash_balance DECIMAL(10, 2) DEFAULT 0.00,
     contribution DECIMAL(15,2) DEFAULT 0.00,
     total_value DECIMAL(15,2) DEFAULT 0.00,
+    account_type VARCHAR(20) DEFAULT 'NORMAL',
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
 
@@ -22,15 +23,16 @@ CREATE TABLE trading_rules (
     symbol VARCHAR(10) NOT NULL,
     trade_action TINYINT NOT NULL,
     limit_value DECIMAL(10, 2) NOT NULL,
-    limit_type ENUM('price', 'percent', 'high_percent') NOT NULL DEFAULT 'price',
+    limit_type ENUM('price', 'percent', 'high_percent', 'weekly', 'monthly') NOT NULL DEFAULT 'price',
     target_amount INT NOT NULL,
     daily_money DECIMAL(10, 2) NOT NULL,
-    current_holding INT NOT NULL,
+    cash_only TINYINT NOT NULL DEFAULT 1,
+    current_holding INT NOT NULL DEFAULT 0,
     average_price decimal(10,2),
-    last_price DECIMAL(10, 2) NOT NULL,
+    last_price DECIMAL(10, 2) NOT NULL DEFAULT 0,
     high_price DECIMAL(10, 2) DEFAULT 0.00,
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    status ENUM('ACTIVE', 'COMPLETED', 'CANCELLED') DEFAULT 'ACTIVE'
+    status ENUM('ACTIVE', 'COMPLETED', 'CANCELLED', 'PROCESSED') DEFAULT 'ACTIVE'
 );
 
 CREATE TABLE trade_history (
@@ -58,6 +60,15 @@ CREATE TABLE helper_db.daily_records (
     UNIQUE KEY (record_date, account_id, symbol)
 );
 
+-- daily_records의 'total' 행 롤업 (add_daily_result/upsert_daily_record 시점에 갱신)
+CREATE TABLE helper_db.daily_portfolio_totals (
+    record_date DATE NOT NULL,
+    account_id VARCHAR(20) NOT NULL,
+    total_value DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (record_date, account_id)
+);
+
 CREATE TABLE contribution_history (
     id INT AUTO_INCREMENT PRIMARY KEY,
     account_number VARCHAR(20) NOT NULL,
@@ -73,6 +84,18 @@ CREATE TABLE contribution_history (
 
 CREATE UNIQUE INDEX idx_account_number ON accounts(account_number);
 
+-- contribution_history 집계 (ContributionManager 적재 시점에 갱신)
+CREATE TABLE contribution_totals (
+    account_number VARCHAR(20) PRIMARY KEY,
+    total_amount DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+CREATE TABLE contribution_daily_totals (
+    transaction_day DATE PRIMARY KEY,
+    total_amount DECIMAL(15, 2) NOT NULL DEFAULT 0
+);
+
 -------------kr
 CREATE DATABASE IF NOT EXISTS helper_kr_db;
 USE helper_kr_db;
@@ -86,6 +109,7 @@ CREATE TABLE helper_kr_db.accounts (
     cash_balance DECIMAL(10, 2) DEFAULT 0.00,
     contribution DECIMAL(15) DEFAULT 0,
     total_value DECIMAL(15,2) DEFAULT 0.00,
+    account_type VARCHAR(20) DEFAULT 'NORMAL',
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
 CREATE TABLE helper_kr_db.trading_rules (
@@ -95,15 +119,16 @@ CREATE TABLE helper_kr_db.trading_rules (
     stock_name text NOT NULL,
     trade_action TINYINT NOT NULL,
     limit_value DECIMAL(10) NOT NULL,
-    limit_type ENUM('price', 'percent', 'high_percent') NOT NULL DEFAULT 'price',
+    limit_type ENUM('price', 'percent', 'high_percent', 'weekly', 'monthly') NOT NULL DEFAULT 'price',
     target_amount INT NOT NULL,
     daily_money DECIMAL(10) NOT NULL,
-    current_holding INT NOT NULL,
+    cash_only TINYINT NOT NULL DEFAULT 1,
+    current_holding INT NOT NULL DEFAULT 0,
     average_price decimal(10,2),
-    last_price DECIMAL(10) NOT NULL,
+    last_price DECIMAL(10) NOT NULL DEFAULT 0,
     high_price DECIMAL(10) DEFAULT 0,
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    status ENUM('ACTIVE', 'COMPLETED', 'CANCELLED') DEFAULT 'ACTIVE'
+    status ENUM('ACTIVE', 'COMPLETED', 'CANCELLED', 'PROCESSED') DEFAULT 'ACTIVE'
 );
 CREATE TABLE helper_kr_db.trade_history (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -128,4 +153,12 @@ CREATE TABLE helper_kr_db.daily_records (
     quantity DECIMAL(15, 6) DEFAULT 0,
     amount DECIMAL(18, 2),
     UNIQUE KEY (record_date, account_id, symbol)
-);
\ No newline at end of file
+);
+
+CREATE TABLE helper_kr_db.daily_portfolio_totals (
+    record_date DATE NOT NULL,
+    account_id VARCHAR(20) NOT NULL,
+    total_value DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (record_date, account_id)
+);
@@ -0,0 +1,415 @@
+"""
+Backtester for trading_rules over archived ticks.
+
+Rules are dicts in the trading_rules shape (id, symbol, trade_action, limit_type,
+limit_value, target_amount, daily_money, cash_only, status, average_price, high_price)
+plus the account key (hash_value, or account_id). Fills follow trader.py:
+    - the trigger price per limit_type (price / percent / high_percent / weekly / monthly)
+    - TradeCalculator.calculate_buy_quantity / calculate_sell_quantity, including the
+      int() of get_trade_today and the ETF sale for cash_only=False shortfalls
+    - high_percent buys below the running high of the day (TradingSystem.intraday), and the
+      day's high is written to rules that already track one before update_result
+    - COMPLETED / PROCESSED transitions and the end-of-day update_result
+      (average_price, high_price = max(close, high_price), reset when the position is gone)
+
+Every archived tick is one evaluation (the live loop sees one price per cycle).
+Trigger thresholds are computed per day for all rules at once, and the next tick a rule
+can fill at is found with a NumPy scan over that day's prices (threshold AND budget/cash
+bound), so only ticks that can change state reach the Python state machine.
+"""
+import heapq
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from library.trade_calculator import TradeCalculator
+
+SELL, BUY = 0, 1  # trading_rules.trade_action (OrderType in trader.py)
+PERIODIC_TYPES = ('weekly', 'monthly')
+DAY_SECONDS = 86400
+
+
+def _local_utc_offset():
+    return int(datetime.now().astimezone().utcoffset().total_seconds())
+
+
+def _tick_slicer(ticks):
+    """TickArchive or {symbol: (ts, price)} -> slice(symbol, start_ts, end_ts)"""
+    if hasattr(ticks, 'slice'):
+        def slice_archive(symbol, start_ts, end_ts):
+            if symbol not in ticks.manifest['symbols']:
+                return np.empty(0), np.empty(0)
+            return ticks.slice(symbol, start_ts, end_ts)
+        return slice_archive
+
+    def slice_dict(symbol, start_ts, end_ts):
+        if symbol not in ticks:
+            return np.empty(0), np.empty(0)
+        ts, price = (np.asarray(a, dtype=np.float64) for a in ticks[symbol])
+        lo = 0 if start_ts is None else int(np.searchsorted(ts, start_ts, side='left'))
+        hi = len(ts) if end_ts is None else int(np.searchsorted(ts, end_ts, side='right'))
+        return ts[lo:hi], price[lo:hi]
+    return slice_dict
+
+
+class BacktestResult:
+    def __init__(self, trades, daily, rules, start_equity):
+        self.trades = trades  # [{ts, date, rule_id, account, symbol, side, quantity, price, used_money}]
+        self.daily = daily    # [{date, cash, etf, holdings_value, equity, trades, accounts}]
+        self.rules = rules    # final rule state (status, average_price, high_price, ...)
+        self.start_equity = start_equity
+
+    def summary(self):
+        equity = np.array([d['equity'] for d in self.daily] or [self.start_equity], dtype=np.float64)
+        peak = np.maximum.accumulate(equity)
+        drawdown = np.where(peak > 0, (peak - equity) / np.where(peak > 0, peak, 1), 0.0)
+        start = self.start_equity
+        return {
+            "days": len(self.daily),
+            "trades": len(self.trades),
+            "bought": round(sum(t['used_money'] for t in self.trades if t['side'] == 'BUY'), 4),
+            "sold": round(sum(t['used_money'] for t in self.trades if t['side'] == 'SELL'), 4),
+            "start_equity": round(start, 4),
+            "end_equity": round(float(equity[-1]), 4),
+            "return_pct": round((float(equity[-1]) / start - 1) * 100, 4) if start else 0.0,
+            "max_drawdown_pct": round(float(drawdown.max()) * 100, 4),
+            "completed_rules": sum(1 for r in self.rules if r['status'] == 'COMPLETED'),
+        }
+
+    def to_dict(self):
+        return {"summary": self.summary(), "trades": self.trades, "daily": self.daily, "rules": self.rules}
+
+
+class _Book:
+    """Cash / ETF reserve per account, holdings and average cost per (account, symbol)"""
+
+    def __init__(self, accounts, positions, rules):
+        self.cash, self.etf = {}, {}
+        for account, value in (accounts or {}).items():
+            if isinstance(value, dict):
+                self.cash[account] = float(value.get('cash', 0.0))
+                self.etf[account] = float(value.get('etf', 0.0))
+            else:
+                self.cash[account] = float(value)
+                self.etf[account] = 0.0
+        self.holding, self.avg = {}, {}
+        for rule in rules:
+            key = (rule['account'], rule['symbol'])
+            self.cash.setdefault(rule['account'], 0.0)
+            self.etf.setdefault(rule['account'], 0.0)
+            if key not in self.holding:
+                self.holding[key] = int(rule.get('current_holding') or 0)
+                self.avg[key] = float(rule.get('average_price') or 0.0)
+        for account, symbols in (positions or {}).items():
+            for symbol, value in symbols.items():
+                quantity, avg = value if isinstance(value, (tuple, list)) else (value, 0.0)
+                self.holding[(account, symbol)] = int(quantity)
+                self.avg[(account, symbol)] = float(avg)
+
+    def fill(self, key, side, quantity, price):
+        money = quantity * price
+        if side == BUY:
+            old = self.holding.get(key, 0)
+            new = old + quantity
+            self.avg[key] = (self.avg.get(key, 0.0) * old + money) / new if new > 0 else 0.0
+            self.holding[key] = new
+            self.cash[key[0]] -= money
+        else:
+            self.holding[key] = self.holding.get(key, 0) - quantity
+            if self.holding[key] <= 0:
+                self.avg[key] = 0.0
+            self.cash[key[0]] += money
+        return money
+
+
+def _normalize_rule(rule):
+    r = dict(rule)
+    r['account'] = rule.get('hash_value') or rule.get('account_id')
+    r['status'] = rule.get('status', 'ACTIVE')
+    r['trade_action'] = int(rule['trade_action'])
+    r['limit_value'] = float(rule['limit_value'])
+    r['average_price'] = float(rule.get('average_price') or 0.0)
+    r['high_price'] = float(rule.get('high_price') or 0.0)
+    r['cash_only'] = bool(rule.get('cash_only', True))
+    return r
+
+
+def _is_periodic_day(rule, day):
+    # Same check as TradingSystem.check_periodic_buy_date
+    if rule['limit_type'] == 'weekly':
+        return day.weekday() == rule['limit_value']
+    if rule['limit_type'] == 'monthly':
+        return day.day == rule['limit_value']
+    return False
+
+
+def trigger_bounds(rules):
+    """
+    [lo, hi] price band that triggers each rule today, for all rules at once
+    (mirrors the limit_type branches of TradingSystem.process_trading_rules).
+    A rule that cannot trigger gets lo > hi.
+    """
+    n = len(rules)
+    action = np.fromiter((r['trade_action'] for r in rules), dtype=np.int8, count=n)
+    value = np.fromiter((r['limit_value'] for r in rules), dtype=np.float64, count=n)
+    avg = np.fromiter((r['average_price'] for r in rules), dtype=np.float64, count=n)
+    high = np.fromiter((r['high_price'] for r in rules), dtype=np.float64, count=n)
+    kind = np.array([r['limit_type'] for r in rules], dtype=object)
+    buy = action == BUY
+
+    lo = np.zeros(n)
+    hi = np.full(n, np.inf)
+    never = np.zeros(n, dtype=bool)
+
+    periodic = np.isin(kind, PERIODIC_TYPES)
+    never |= periodic & ~buy
+
+    percent = kind == 'percent'
+    no_avg = percent & (avg == 0)
+    never |= no_avg & ~buy  # average_price 0: buy at any price, never sell
+    with_avg = percent & ~no_avg
+    hi = np.where(with_avg & buy, avg * (1 - value / 100), hi)
+    lo = np.where(with_avg & ~buy, avg * (1 + value / 100), lo)
+
+    high_percent = kind == 'high_percent'
+    never |= high_percent & (~buy | ~(high > 0))
+    hi = np.where(high_percent & buy, high * (1 - value / 100), hi)
+
+    price = ~(periodic | percent | high_percent)
+    hi = np.where(price & buy, value, hi)
+    lo = np.where(price & ~buy, value, lo)
+
+    lo = np.where(never, np.inf, lo)
+    hi = np.where(never, -np.inf, hi)
+    return lo, hi
+
+
+def run_backtest(rules, ticks, accounts=None, positions=None, start_ts=None, end_ts=None, utc_offset=None):
+    """
+    Simulate rules over ticks (TickArchive or {symbol: (ts, price)}).
+    accounts: {account: cash} or {account: {"cash": x, "etf": y}} where account is the rule's
+    hash_value (or account_id); etf is the cash-equivalent reserve sold for cash_only=False
+    shortfalls. positions: {account: {symbol: quantity or (quantity, average_price)}}; by
+    default holdings come from the rules' current_holding / average_price.
+    Days are split on local midnight (utc_offset seconds, default: this machine's offset).
+    """
+    rules = [_normalize_rule(r) for r in rules]
+    book = _Book(accounts, positions, rules)
+    slicer = _tick_slicer(ticks)
+    offset = _local_utc_offset() if utc_offset is None else utc_offset
+    symbols = sorted({r['symbol'] for r in rules})
+
+    series = {s: slicer(s, start_ts, end_ts) for s in symbols}
+    day_ids = np.unique(np.concatenate(
+        [np.floor((ts + offset) / DAY_SECONDS) for ts, _ in series.values()] or [np.empty(0)]))
+    closes = {}
+    trades, daily = [], []
+    start_equity = None
+
+    for day_id in day_ids.astype(np.int64):
+        day = datetime(1970, 1, 1) + timedelta(days=int(day_id))
+        day_start = day_id * DAY_SECONDS - offset
+        today = {}
+        for s, (ts, price) in series.items():
+            lo = int(np.searchsorted(ts, day_start, side='left'))
+            hi = int(np.searchsorted(ts, day_start + DAY_SECONDS, side='left'))
+            today[s] = (ts[lo:hi], price[lo:hi])
+
+        if start_equity is None:
+            start_equity = _opening_equity(book, today)
+
+        # update_periodic_rule_status
+        for r in rules:
+            if r['status'] == 'PROCESSED' and r['limit_type'] in PERIODIC_TYPES and _is_periodic_day(r, day):
+                r['status'] = 'ACTIVE'
+
+        day_trades = _simulate_day(rules, today, book, day.date().isoformat())
+        trades.extend(day_trades)
+
+        for s, (ts, price) in today.items():
+            if len(price):
+                closes[s] = float(price[-1])
+        _flush_highs(rules, today)
+        _update_result(rules, book, closes)
+        daily.append(_snapshot(book, closes, day.date().isoformat(), len(day_trades)))
+
+    final_rules = [{k: v for k, v in r.items() if k != 'account'} for r in rules]
+    return BacktestResult(trades, daily, final_rules, start_equity or 0.0)
+
+
+def _simulate_day(rules, today, book, date_str):
+    lo, hi = trigger_bounds(rules)
+    traded = [0.0] * len(rules)  # get_trade_today per rule
+    by_key = {}
+    by_account = {}
+    for i, r in enumerate(rules):
+        by_key.setdefault((r['account'], r['symbol']), []).append(i)
+        by_account.setdefault(r['account'], []).append(i)
+    version = [0] * len(rules)
+    heap = []
+    # TradingSystem.intraday: high_percent rules buy below the running high of the day
+    day_highs = {s: np.maximum.accumulate(price) for s, (_, price) in today.items() if len(price)}
+
+    def cap(i):
+        """Highest price at which rule i can still get a non-zero quantity (None: cannot)"""
+        r = rules[i]
+        holding = book.holding.get((r['account'], r['symbol']), 0)
+        budget = max(0, r['daily_money'] - int(traded[i]))
+        if r['trade_action'] == BUY:
+            if r['target_amount'] - holding <= 0:
+                return None
+            cash = book.cash[r['account']] + (0.0 if r['cash_only'] else book.etf[r['account']])
+            return min(budget, cash)
+        if holding - r['target_amount'] <= 0:
+            return None
+        return budget
+
+    def arm(i, start):
+        version[i] += 1
+        r = rules[i]
+        if r['status'] != 'ACTIVE' or lo[i] > hi[i]:
+            return
+        limit = cap(i)
+        if limit is None:
+            return
+        ts, price = today[r['symbol']]
+        band = price[start:]
+        upper = min(hi[i], limit)
+        if r['limit_type'] == 'high_percent':
+            running = np.maximum(day_highs[r['symbol']][start:], r['high_price'])
+            upper = np.minimum(running * (1 - r['limit_value'] / 100), limit)
+        hits = np.flatnonzero((band >= lo[i]) & (band <= upper) & (band > 0))
+        if len(hits):
+            j = start + int(hits[0])
+            # Within one cycle the rules are processed ordered by trade_action (SELL first)
+            heapq.heappush(heap, (float(ts[j]), r['trade_action'], i, j, version[i]))
+
+    for i in range(len(rules)):
+        if len(today[rules[i]['symbol']][0]):
+            arm(i, 0)
+
+    day_trades = []
+    while heap:
+        when, action, i, j, ver = heapq.heappop(heap)
+        if ver != version[i]:
+            continue
+        r = rules[i]
+        key = (r['account'], r['symbol'])
+        price = float(today[r['symbol']][1][j])
+        quantity = _evaluate(r, book, key, price, int(traded[i]))
+        if quantity > 0:
+            side = 'BUY' if action == BUY else 'SELL'
+            money = book.fill(key, action, quantity, price)
+            traded[i] += money
+            day_trades.append({"ts": when, "date": date_str, "rule_id": r.get('id'), "account": r['account'],
+                               "symbol": r['symbol'], "side": side, "quantity": quantity, "price": price,
+                               "used_money": money})
+            # A fill moves holdings of this key and cash of this account: re-arm the affected rules
+            for k in set(by_key[key]) | set(by_account[r['account']]):
+                if k != i:
+                    ts_k = today[rules[k]['symbol']][0]
+                    side_k = 'right' if (rules[k]['trade_action'], k) < (action, i) else 'left'
+                    arm(k, int(np.searchsorted(ts_k, when, side=side_k)))
+        arm(i, j + 1)
+    return day_trades
+
+
+def _evaluate(rule, book, key, price, today_traded_money):
+    """One evaluation of buy_stock / sell_stock; returns the filled quantity"""
+    holding = book.holding.get(key, 0)
+    if rule['trade_action'] == BUY:
+        account = key[0]
+        decision = TradeCalculator.calculate_buy_quantity(
+            target_amount=int(rule['target_amount']),
+            current_holding=int(holding),
+            daily_money_limit=float(rule['daily_money']),
+            today_traded_money=today_traded_money,
+            current_price=price,
+            available_cash=book.cash[account],
+            cash_only=rule['cash_only']
+        )
+        if decision.shortfall > 0:
+            # manager.sell_etf_for_cash, then a strict second pass
+            sold = min(decision.shortfall, book.etf[account])
+            book.etf[account] -= sold
+            book.cash[account] += sold
+            decision = TradeCalculator.calculate_buy_quantity(
+                target_amount=int(rule['target_amount']),
+                current_holding=int(holding),
+                daily_money_limit=float(rule['daily_money']),
+                today_traded_money=today_traded_money,
+                current_price=price,
+                available_cash=book.cash[account],
+                cash_only=True
+            )
+        if decision.quantity <= 0:
+            return 0
+        if rule['limit_type'] in PERIODIC_TYPES:
+            rule['status'] = 'PROCESSED'
+        elif int(holding) + decision.quantity >= int(rule['target_amount']):
+            rule['status'] = 'COMPLETED'
+        return decision.quantity
+
+    decision = TradeCalculator.calculate_sell_quantity(
+        target_amount=int(rule['target_amount']),
+        current_holding=int(holding),
+        daily_money_limit=float(rule['daily_money']),
+        today_traded_money=today_traded_money,
+        current_price=price
+    )
+    if decision.quantity <= 0:
+        return 0
+    if holding - decision.quantity <= rule['target_amount']:
+        rule['status'] = 'COMPLETED'
+    return decision.quantity
+
+
+def _flush_highs(rules, today):
+    # TradingSystem.flush_intraday_highs: the day's high for high_percent rules already tracking one
+    highs = {s: float(price.max()) for s, (_, price) in today.items() if len(price)}
+    for r in rules:
+        if (r['limit_type'] == 'high_percent' and r['status'] == 'ACTIVE' and r['high_price'] > 0
+                and highs.get(r['symbol'], 0.0) > r['high_price']):
+            r['high_price'] = highs[r['symbol']]
+
+
+def _update_result(rules, book, closes):
+    # TradingSystem.update_result: refresh average_price / high_price from the day's positions
+    for r in rules:
+        key = (r['account'], r['symbol'])
+        close = closes.get(r['symbol'])
+        if close is None:
+            continue
+        r['current_holding'] = book.holding.get(key, 0)
+        r['last_price'] = close
+        if book.holding.get(key, 0) <= 0:
+            r['average_price'] = 0.0
+            r['high_price'] = 0.0
+            continue
+        r['average_price'] = book.avg[key]
+        if r['average_price'] > 0:
+            r['high_price'] = max(close, r['high_price'])
+
+
+def _opening_equity(book, today):
+    # Holdings valued at the first tick of the first day
+    value = sum(book.cash.values()) + sum(book.etf.values())
+    for (_, symbol), quantity in book.holding.items():
+        price = today.get(symbol, ((), ()))[1]
+        value += quantity * (float(price[0]) if len(price) else 0.0)
+    return value
+
+
+def _snapshot(book, closes, date_str, trade_count):
+    holdings_value = sum(q * closes.get(s, 0.0) for (_, s), q in book.holding.items())
+    accounts = {}
+    for (account, symbol), quantity in book.holding.items():
+        accounts.setdefault(account, {"cash": 0.0, "etf": 0.0, "holdings": {}})["holdings"][symbol] = quantity
+    for account in book.cash:
+        entry = accounts.setdefault(account, {"cash": 0.0, "etf": 0.0, "holdings": {}})
+        entry["cash"] = round(book.cash[account], 4)
+        entry["etf"] = round(book.etf[account], 4)
+    cash, etf = sum(book.cash.values()), sum(book.etf.values())
+    return {"date": date_str, "cash": round(cash, 4), "etf": round(etf, 4),
+            "holdings_value": round(holdings_value, 4), "equity": round(cash + etf + holdings_value, 4),
+            "trades": trade_count, "accounts": accounts}
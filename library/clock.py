@@ -1,12 +1,19 @@
+import heapq
+import itertools
+import time
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from typing import Optional
+from typing import Callable, Optional
 
 class Clock:
     def now(self, tz: Optional[ZoneInfo] = None) -> datetime:
         """Returns the current time, optionally in a specific timezone."""
         return datetime.now(tz)
 
+    def sleep(self, seconds: float) -> None:
+        """Blocks for the given number of seconds."""
+        time.sleep(seconds)
+
 class MockClock(Clock):
     def __init__(self, fixed_time: datetime):
         self._time = fixed_time
@@ -26,3 +33,90 @@ class MockClock(Clock):
         
     def advance_seconds(self, seconds: int):
         self._time += timedelta(seconds=seconds)
+
+    def sleep(self, seconds: float) -> None:
+        # No real waiting: sleeping just moves mocked time forward
+        self.advance_seconds(seconds)
+
+
+class SimulatedClock(MockClock):
+    """
+    Virtual time driven by a heap of scheduled events.
+
+    sleep() never waits: it jumps straight to each event that falls due within the sleep,
+    runs it with now() set to its scheduled time, and ends at the sleep's target. Events at
+    the same instant run in the order they were scheduled, so a simulated trading day is
+    deterministic and runs as fast as the CPU allows.
+    """
+
+    def __init__(self, start_time: datetime):
+        super().__init__(start_time)
+        self._events = []  # (when, seq, event)
+        self._seq = itertools.count()
+        self.slept = 0.0
+        self.events_fired = 0
+
+    def call_at(self, when: datetime, callback: Callable, *args, interval: Optional[float] = None) -> dict:
+        """Schedules callback(*args) at when (repeating every interval seconds if given)"""
+        if when.tzinfo is None and self._time.tzinfo is not None:
+            when = when.replace(tzinfo=self._time.tzinfo)
+        event = {"when": when, "callback": callback, "args": args, "interval": interval, "cancelled": False}
+        heapq.heappush(self._events, (when, next(self._seq), event))
+        return event
+
+    def call_later(self, delay: float, callback: Callable, *args) -> dict:
+        return self.call_at(self._time + timedelta(seconds=delay), callback, *args)
+
+    def call_every(self, interval: float, callback: Callable, *args, start: Optional[datetime] = None) -> dict:
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        return self.call_at(start or self._time, callback, *args, interval=interval)
+
+    def cancel(self, event: dict) -> None:
+        event["cancelled"] = True
+
+    def next_event_time(self) -> Optional[datetime]:
+        while self._events and self._events[0][2]["cancelled"]:
+            heapq.heappop(self._events)
+        return self._events[0][0] if self._events else None
+
+    def run_until(self, target: datetime) -> int:
+        """Fires every event due up to target (inclusive) and leaves now() at target"""
+        fired = 0
+        while True:
+            when = self.next_event_time()
+            if when is None or when > target:
+                break
+            _, _, event = heapq.heappop(self._events)
+            self._time = max(self._time, when)
+            if event["interval"]:
+                # Re-arm before running so the callback can cancel its own repeat
+                event["when"] = when + timedelta(seconds=event["interval"])
+                heapq.heappush(self._events, (event["when"], next(self._seq), event))
+            event["callback"](*event["args"])
+            fired += 1
+        self.events_fired += fired
+        self._time = max(self._time, target)
+        return fired
+
+    def run_next(self) -> bool:
+        """Jumps to the next scheduled event and fires it (and anything due at the same instant)"""
+        when = self.next_event_time()
+        if when is None:
+            return False
+        self.run_until(when)
+        return True
+
+    def set_time(self, new_time: datetime):
+        # Moving forward fires the events in between; moving back just rewinds
+        if new_time >= self._time:
+            self.run_until(new_time)
+        else:
+            self._time = new_time
+
+    def advance_seconds(self, seconds: float):
+        self.run_until(self._time + timedelta(seconds=seconds))
+
+    def sleep(self, seconds: float) -> None:
+        self.slept += seconds
+        self.advance_seconds(seconds)
@@ -3,6 +3,8 @@ import time
 from schwab.client import Client
 import logging
 
+from library.db_modules.sql_dialect import insert_ignore
+
 class ContributionManager:
     def __init__(self, db_handler, schwab_manager):
         self.db = db_handler
@@ -219,8 +221,8 @@ class ContributionManager:
         return final_txs
 
     def _save_transactions(self, acct_num, txs):
-        sql = """
-            INSERT IGNORE INTO contribution_history 
+        sql = f"""
+            {insert_ignore(self.db.dialect)} INTO contribution_history 
             (account_number, activity_id, transaction_date, type, amount, description)
             VALUES (%s, %s, %s, %s, %s, %s)
         """
@@ -251,3 +253,8 @@ class ContributionManager:
         if data:
             self.db.execute_many(sql, data)
             print(f"  Saved {len(data)} transactions.")
+
+            # Refresh per-account / per-day aggregates read by the dashboard
+            dates = [row[2] for row in data]
+            since = min(dates) if all(isinstance(d, datetime.datetime) for d in dates) else None
+            self.db.refresh_contribution_aggregates([acct_num], since)
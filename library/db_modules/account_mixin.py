@@ -9,14 +9,13 @@ class AccountMixin:
     
     def get_accounts(self, use_dynamic_contribution=True):
         if use_dynamic_contribution:
+            # contribution_totals는 contribution_history 적재 시점에 갱신되는 계좌별 합계
             sql = """
             SELECT 
                 a.*,
-                COALESCE(
-                    (SELECT SUM(amount) FROM contribution_history WHERE account_number = a.account_number),
-                    0
-                ) as dynamic_contribution
+                COALESCE(ct.total_amount, 0) as dynamic_contribution
             FROM accounts a 
+            LEFT JOIN contribution_totals ct ON ct.account_number = a.account_number
             ORDER BY a.id
             """
         else:
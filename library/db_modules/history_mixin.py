@@ -1,16 +1,21 @@
 from sqlalchemy import text
 from typing import List, Dict, Optional
 import decimal
+import time
+
+from library.db_modules.sql_dialect import upsert_clause, current_date
 
 class HistoryMixin:
     """
     Mixin for History and Analytics-related database operations.
-    Assumes access to self.engine from the main DatabaseHandler class.
+    Assumes access to self.engine, self.dialect, self._history_version and
+    self._allocation_cache from the main DatabaseHandler class.
     """
+    allocation_cache_seconds = 60  # 다른 프로세스의 스냅샷이 대시보드에 반영되기까지 최대 지연
 
     def get_trade_today(self, rule_id: int):
-        sql = """select sum(used_money) as total_money from trade_history where trading_rule_id=:rule_id
-                    AND DATE(trade_date) = CURRENT_DATE()"""
+        sql = f"""select sum(used_money) as total_money from trade_history where trading_rule_id=:rule_id
+                    AND DATE(trade_date) = {current_date(self.dialect)}"""
         with self.engine.connect() as conn:
             result = conn.execute(text(sql), {"rule_id": rule_id})
             row = result.fetchone()
@@ -65,177 +70,205 @@ class HistoryMixin:
                     (record_date, account_id, symbol, amount, quantity)
                     VALUES (:today, :account_id, :symbol, :amount, :quantity)
                 """
-        with self.engine.connect() as conn:
-            conn.execute(text(sql), {
-                "today": today,
-                "account_id": account_id,
-                "symbol": "cash",
-                "amount": cash_balance,
-                "quantity": None
-            })
-            conn.commit()
-        with self.engine.connect() as conn:
-            conn.execute(text(sql), {
-                "today": today,
-                "account_id": account_id,
-                "symbol": "total",
-                "amount": total_value,
-                "quantity": None
-            })
-            conn.commit()
+        rows = [
+            {"today": today, "account_id": account_id, "symbol": "cash", "amount": cash_balance, "quantity": None},
+            {"today": today, "account_id": account_id, "symbol": "total", "amount": total_value, "quantity": None},
+        ]
         for etf in etfs:
             etf_data = etfs[etf]
             etf_quantity = float(etf_data['quantity'])
             etf_price = float(etf_data['last_price'])
             etf_value = etf_quantity * etf_price
-            with self.engine.connect() as conn:
-                conn.execute(text(sql), {
-                    "today": today,
-                    "account_id": account_id,
-                    "symbol": etf,
-                    "amount": etf_value,
-                    "quantity": float(etf_data['quantity'])
-                })
-                conn.commit()
+            rows.append({
+                "today": today,
+                "account_id": account_id,
+                "symbol": etf,
+                "amount": etf_value,
+                "quantity": etf_quantity
+            })
 
-    def get_consolidated_portfolio_allocation(self):
-        """모든 계좌의 종목들을 합쳐서 종목별 비중 조회 (계좌 상관없이 종목별로 합산)"""
-        # 최신 날짜 찾기
-        latest_date_sql = """
-            SELECT MAX(record_date) as latest_date 
+        # 스냅샷과 롤업을 한 트랜잭션으로 기록 (대시보드가 반쯤 기록된 날짜를 보지 않도록)
+        with self.engine.begin() as conn:
+            conn.execute(text(sql), rows)
+            self._upsert_daily_portfolio_total(conn, today, account_id, total_value)
+        self._bump_history_version()
+
+    def _upsert_daily_portfolio_total(self, conn, record_date, account_id, total_value):
+        """daily_portfolio_totals 롤업 갱신 (호출자의 트랜잭션 안에서 실행)"""
+        sql = f"""
+            INSERT INTO daily_portfolio_totals (record_date, account_id, total_value)
+            VALUES (:record_date, :account_id, :total_value)
+            {upsert_clause(self.dialect, ['record_date', 'account_id'], {'total_value': ':total_value'})}
+        """
+        conn.execute(text(sql), {
+            "record_date": record_date,
+            "account_id": account_id,
+            "total_value": total_value
+        })
+
+    def rebuild_daily_portfolio_totals(self) -> int:
+        """
+        daily_records의 'total' 행으로 daily_portfolio_totals 롤업을 다시 생성.
+        최초 마이그레이션이나 수동 SQL 수정 후 정합성 복구용.
+        Returns:
+            int: 롤업에 기록된 행 수
+        """
+        delete_sql = "DELETE FROM daily_portfolio_totals"
+        insert_sql = """
+            INSERT INTO daily_portfolio_totals (record_date, account_id, total_value)
+            SELECT record_date, account_id, SUM(amount)
             FROM daily_records
+            WHERE symbol = 'total'
+            GROUP BY record_date, account_id
         """
+        with self.engine.begin() as conn:
+            conn.execute(text(delete_sql))
+            result = conn.execute(text(insert_sql))
+        self._bump_history_version()
+        return result.rowcount
 
-        with self.engine.connect() as conn:
-            # 최신 날짜 조회
-            latest_date_result = conn.execute(text(latest_date_sql))
-            latest_date = latest_date_result.fetchone().latest_date
+    def _bump_history_version(self):
+        """daily_records 쓰기 후 호출 - 프로세스 내 집계 캐시 무효화"""
+        self._history_version += 1
 
-            if not latest_date:
-                return None, None
-            
-            # 이전 날짜 찾기 (어제 데이터를 위함)
-            prev_date_sql = """
-                SELECT MAX(record_date) as prev_date 
-                FROM daily_records
-                WHERE record_date < :latest_date
-            """
-            prev_date_result = conn.execute(text(prev_date_sql), {"latest_date": latest_date})
-            prev_date_row = prev_date_result.fetchone()
-            prev_date = prev_date_row.prev_date if prev_date_row else None
+    def _latest_snapshot(self):
+        """(최신 record_date, 그 날짜의 총 자산) - 롤업 테이블만 읽는 가벼운 변경 확인용"""
+        sql = """
+            SELECT record_date, SUM(total_value) as total_value
+            FROM daily_portfolio_totals
+            WHERE record_date = (SELECT MAX(record_date) FROM daily_portfolio_totals)
+            GROUP BY record_date
+        """
+        with self.engine.connect() as conn:
+            row = conn.execute(text(sql)).fetchone()
+        if row is None:
+            return None, 0.0
+        return str(row.record_date), round(float(row.total_value or 0), 2)
 
-            # ---------------------------------------------------------
-            # 1. 최신 데이터 조회
-            # ---------------------------------------------------------
+    def _cached_allocation(self):
+        """
+        캐시된 포트폴리오 배분 (없거나 바뀌었으면 None).
+        이 프로세스의 daily_records 쓰기는 _history_version으로 즉시 무효화된다.
+        다른 프로세스(trader)의 쓰기는 allocation_cache_seconds마다 최신 스냅샷(날짜, 총액)만
+        확인해서, 새 스냅샷이 없으면 다시 계산하지 않고 캐시를 연장한다.
+        """
+        cached = self._allocation_cache
+        if cached is None or cached[0] != self._history_version:
+            return None
+        version, loaded_at, snapshot, result = cached
+        if time.monotonic() - loaded_at > self.allocation_cache_seconds:
+            if self._latest_snapshot() != snapshot:
+                return None
+            self._allocation_cache = (version, time.monotonic(), snapshot, result)
+        return result
 
-            # 해당 날짜의 모든 total 종목 가져오기 (전체 자금 계산용)
-            total_sql = """
-                SELECT SUM(amount) as total_value
-                FROM daily_records
-                WHERE record_date = :target_date AND symbol = 'total'
-            """
-            
-            # 해당 날짜의 모든 종목별 평가금액 합산 (계좌 상관없이 symbol로 그룹화)
-            consolidated_sql = """
-                SELECT symbol, SUM(amount) as total_value, SUM(quantity) as total_quantity
-                FROM daily_records
-                WHERE record_date = :target_date AND symbol != 'total'
-                GROUP BY symbol
-                ORDER BY total_value DESC
-            """
+    def get_consolidated_portfolio_allocation(self):
+        """모든 계좌의 종목들을 합쳐서 종목별 비중 조회 (계좌 상관없이 종목별로 합산)"""
+        cached = self._cached_allocation()
+        if cached is not None:
+            return cached
+        version, loaded_at = self._history_version, time.monotonic()
 
-            # 전체 자금 조회 (최신)
-            total_result = conn.execute(text(total_sql), {"target_date": latest_date})
-            total_value = total_result.fetchone().total_value
+        # 최신/이전 날짜의 종목별 합계를 한 번에 조회 (date_rank 1 = 최신, 2 = 이전)
+        snapshot_sql = """
+            WITH recent_dates AS (
+                SELECT record_date, date_rank
+                FROM (
+                    SELECT record_date,
+                           ROW_NUMBER() OVER (ORDER BY record_date DESC) as date_rank
+                    FROM daily_portfolio_totals
+                    GROUP BY record_date
+                ) ranked
+                WHERE date_rank <= 2
+            )
+            SELECT rd.date_rank, rd.record_date, dr.symbol,
+                   SUM(dr.amount) as total_value, SUM(dr.quantity) as total_quantity
+            FROM recent_dates rd
+            JOIN daily_records dr ON dr.record_date = rd.record_date
+            GROUP BY rd.date_rank, rd.record_date, dr.symbol
+        """
 
-            if not total_value:
-                return None, None
-            
-            total_value = float(total_value)
+        with self.engine.connect() as conn:
+            result = conn.execute(text(snapshot_sql))
 
-            # 종목별 합산 데이터 조회 (최신)
-            consolidated_result = conn.execute(text(consolidated_sql), {"target_date": latest_date})
-            
-            # 딕셔너리 형태로 변환하여 쉽게 접근
-            current_data = {}
-            for row in consolidated_result:
+            # date_rank별로 분리: total 행은 전체 자금, 나머지는 종목별 합산
+            totals = {1: 0.0, 2: 0.0}
+            snapshots = {1: {}, 2: {}}
+            ranks_seen = set()
+            latest_date = None
+            for row in result:
                 d = dict(row._mapping)
-                if 'total_quantity' in d and isinstance(d['total_quantity'], decimal.Decimal):
+                rank = d.pop('date_rank')
+                record_date = str(d.pop('record_date'))
+                if rank == 1:
+                    latest_date = record_date
+                ranks_seen.add(rank)
+                if isinstance(d['total_quantity'], decimal.Decimal):
                     d['total_quantity'] = float(d['total_quantity'])
-                if 'total_value' in d and isinstance(d['total_value'], decimal.Decimal):
+                if isinstance(d['total_value'], decimal.Decimal):
                     d['total_value'] = float(d['total_value'])
-                current_data[d['symbol']] = d
-            
-            # ---------------------------------------------------------
-            # 2. 이전 데이터 조회 (데이터가 있을 경우에만)
-            # ---------------------------------------------------------
-            prev_data = {}
-            prev_total_value = 0
-            
-            if prev_date:
-                # 전체 자금 조회 (이전)
-                pt_result = conn.execute(text(total_sql), {"target_date": prev_date})
-                pt_row = pt_result.fetchone()
-                if pt_row and pt_row.total_value:
-                    prev_total_value = float(pt_row.total_value)
-                
-                # 종목별 합산 데이터 조회 (이전)
-                pc_result = conn.execute(text(consolidated_sql), {"target_date": prev_date})
-                for row in pc_result:
-                    d = dict(row._mapping)
-                    if 'total_quantity' in d and isinstance(d['total_quantity'], decimal.Decimal):
-                        d['total_quantity'] = float(d['total_quantity'])
-                    if 'total_value' in d and isinstance(d['total_value'], decimal.Decimal):
-                        d['total_value'] = float(d['total_value'])
-                    prev_data[d['symbol']] = d
-
-            # ---------------------------------------------------------
-            # 3. 데이터 병합 및 변화량 계산
-            # ---------------------------------------------------------
-            allocations = []
-            
-            # 현재 데이터 순회
-            for symbol, curr in current_data.items():
-                allocation = curr.copy()
-                
-                # 현재 비중 계산
-                curr_percentage = (allocation['total_value'] / total_value) * 100
-                allocation['percentage'] = curr_percentage
-                
-                # 이전 데이터와 비교
-                if prev_date and symbol in prev_data:
-                    prev = prev_data[symbol]
-                    prev_percentage = (prev['total_value'] / prev_total_value) * 100 if prev_total_value > 0 else 0
-                    
-                    allocation['diff_quantity'] = (allocation['total_quantity'] or 0) - (prev['total_quantity'] or 0)
-                    allocation['diff_value'] = float(allocation['total_value']) - float(prev['total_value'])
-                    allocation['diff_percentage'] = curr_percentage - prev_percentage
+                if d['symbol'] == 'total':
+                    totals[rank] = float(d['total_value'] or 0)
                 else:
-                    # 이전 데이터가 없으면 변화량은 0 또는 신규 진입으로 볼 수 있음 (여기선 0이나 None 처리)
-                    # 신규 진입인 경우 변화량 = 현재값
-                    if prev_date: # 이전 날짜 데이터는 있는데 이 종목만 없는 경우 (New Entry)
-                        allocation['diff_quantity'] = allocation.get('total_quantity', 0)
-                        allocation['diff_value'] = float(allocation['total_value'])
-                        allocation['diff_percentage'] = curr_percentage
-                    else: # 아예 이전 날짜 기록이 없는 경우
-                        allocation['diff_quantity'] = 0
-                        allocation['diff_value'] = 0
-                        allocation['diff_percentage'] = 0
+                    snapshots[rank][d['symbol']] = d
+
+        total_value = totals[1]
+        snapshot = (latest_date, round(total_value, 2))  # _latest_snapshot()과 같은 형태
+        if not total_value:
+            self._allocation_cache = (version, loaded_at, snapshot, (None, None))
+            return None, None
+
+        current_data = snapshots[1]
+        prev_data = snapshots[2]
+        prev_total_value = totals[2]
+        has_prev = 2 in ranks_seen
+
+        # ---------------------------------------------------------
+        # 데이터 병합 및 변화량 계산
+        # ---------------------------------------------------------
+        allocations = []
+
+        # 현재 데이터 순회
+        for symbol, curr in current_data.items():
+            allocation = curr.copy()
+
+            # 현재 비중 계산
+            curr_percentage = (allocation['total_value'] / total_value) * 100
+            allocation['percentage'] = curr_percentage
+
+            # 이전 데이터와 비교
+            if has_prev and symbol in prev_data:
+                prev = prev_data[symbol]
+                prev_percentage = (prev['total_value'] / prev_total_value) * 100 if prev_total_value > 0 else 0
+
+                allocation['diff_quantity'] = (allocation['total_quantity'] or 0) - (prev['total_quantity'] or 0)
+                allocation['diff_value'] = float(allocation['total_value']) - float(prev['total_value'])
+                allocation['diff_percentage'] = curr_percentage - prev_percentage
+            else:
+                # 신규 진입인 경우 변화량 = 현재값
+                if has_prev: # 이전 날짜 데이터는 있는데 이 종목만 없는 경우 (New Entry)
+                    allocation['diff_quantity'] = allocation.get('total_quantity', 0)
+                    allocation['diff_value'] = float(allocation['total_value'])
+                    allocation['diff_percentage'] = curr_percentage
+                else: # 아예 이전 날짜 기록이 없는 경우
+                    allocation['diff_quantity'] = 0
+                    allocation['diff_value'] = 0
+                    allocation['diff_percentage'] = 0
 
-                allocations.append(allocation)
+            allocations.append(allocation)
 
-            # 정렬 (비중 내림차순)
-            allocations.sort(key=lambda x: x['percentage'], reverse=True)
+        # 정렬 (비중 내림차순)
+        allocations.sort(key=lambda x: x['percentage'], reverse=True)
 
-            return allocations, total_value
+        self._allocation_cache = (version, loaded_at, snapshot, (allocations, total_value))
+        return allocations, total_value
 
     def get_daily_total_values(self, max_points=50):
-        """날짜별 총 자산 가치 조회 (스마트 샘플링)"""
+        """날짜별 총 자산 가치 조회 (스마트 샘플링, daily_portfolio_totals 롤업 기반)"""
         # 먼저 전체 데이터 개수 확인
         count_sql = """
             SELECT COUNT(DISTINCT record_date) as total_days
-            FROM daily_records
-            WHERE symbol = 'total'
+            FROM daily_portfolio_totals
         """
 
         with self.engine.connect() as conn:
@@ -247,9 +280,8 @@ class HistoryMixin:
                 sql = """
                     SELECT 
                         record_date,
-                        SUM(amount) as total_value
-                    FROM daily_records
-                    WHERE symbol = 'total'
+                        SUM(total_value) as total_value
+                    FROM daily_portfolio_totals
                     GROUP BY record_date
                     ORDER BY record_date ASC
                 """
@@ -262,10 +294,9 @@ class HistoryMixin:
                     WITH ranked_data AS (
                         SELECT 
                             record_date,
-                            SUM(amount) as total_value,
+                            SUM(total_value) as total_value,
                             ROW_NUMBER() OVER (ORDER BY record_date) as rn
-                        FROM daily_records
-                        WHERE symbol = 'total'
+                        FROM daily_portfolio_totals
                         GROUP BY record_date
                     )
                     SELECT record_date, total_value
@@ -282,7 +313,7 @@ class HistoryMixin:
             for row in result:
                 row_dict = dict(row._mapping)
                 # 날짜를 문자열로 변환
-                row_dict['record_date'] = row_dict['record_date'].strftime('%Y-%m-%d')
+                row_dict['record_date'] = str(row_dict['record_date'])
                 # Decimal을 float으로 변환
                 if isinstance(row_dict['total_value'], decimal.Decimal):
                     row_dict['total_value'] = float(row_dict['total_value'])
@@ -291,17 +322,16 @@ class HistoryMixin:
             return data
 
     def get_daily_contributions(self) -> Dict[str, float]:
-        """날짜별 전체 계좌의 기여금/인출금 합산 조회 (contribution_history 기반)"""
+        """날짜별 전체 계좌의 기여금/인출금 합산 조회 (contribution_daily_totals 기반)"""
         # contribution_history 테이블이 존재하는지 확인 필요하지만, 
         # 일단 try-except로 감싸거나 테이블이 있다고 가정 (US는 확실, KR은 불확실하지만 쿼리 시도)
         try:
             sql = """
                 SELECT 
-                    DATE(transaction_date) as t_date, 
-                    SUM(amount) as total_amount
-                FROM contribution_history
-                GROUP BY DATE(transaction_date)
-                ORDER BY t_date ASC
+                    transaction_day as t_date, 
+                    total_amount
+                FROM contribution_daily_totals
+                ORDER BY transaction_day ASC
             """
             with self.engine.connect() as conn:
                 result = conn.execute(text(sql))
@@ -320,6 +350,57 @@ class HistoryMixin:
             print(f"Warning: Failed to fetch daily contributions ({e})")
             return {}
 
+    def refresh_contribution_aggregates(self, account_numbers: List[str], since=None) -> None:
+        """
+        contribution_history 적재 후 집계 테이블 갱신.
+        - contribution_totals: 지정 계좌의 합계를 다시 계산
+        - contribution_daily_totals: since 이후 날짜만 다시 계산 (None이면 전체)
+        INSERT IGNORE로 중복이 건너뛰어질 수 있으므로 증분 대신 영향 범위만 재계산한다.
+        이력이 모두 지워진 계좌도 예전 합계가 남지 않도록 지정 계좌의 행을 먼저 삭제한다.
+        """
+        delete_account_sql = "DELETE FROM contribution_totals WHERE account_number = :account_number"
+        account_sql = """
+            INSERT INTO contribution_totals (account_number, total_amount)
+            SELECT account_number, SUM(amount)
+            FROM contribution_history
+            WHERE account_number = :account_number
+            GROUP BY account_number
+        """
+        if since is None:
+            delete_daily_sql = "DELETE FROM contribution_daily_totals"
+            daily_sql = """
+                INSERT INTO contribution_daily_totals (transaction_day, total_amount)
+                SELECT DATE(transaction_date), SUM(amount)
+                FROM contribution_history
+                GROUP BY DATE(transaction_date)
+            """
+            params = {}
+        else:
+            delete_daily_sql = "DELETE FROM contribution_daily_totals WHERE transaction_day >= DATE(:since)"
+            daily_sql = """
+                INSERT INTO contribution_daily_totals (transaction_day, total_amount)
+                SELECT DATE(transaction_date), SUM(amount)
+                FROM contribution_history
+                WHERE transaction_date >= DATE(:since)
+                GROUP BY DATE(transaction_date)
+            """
+            params = {"since": since}
+
+        with self.engine.begin() as conn:
+            for account_number in account_numbers:
+                conn.execute(text(delete_account_sql), {"account_number": account_number})
+                conn.execute(text(account_sql), {"account_number": account_number})
+            conn.execute(text(delete_daily_sql), params)
+            conn.execute(text(daily_sql), params)
+
+    def rebuild_contribution_aggregates(self) -> None:
+        """contribution_history 전체로 집계 테이블 재생성 (최초 마이그레이션/수동 수정 후)"""
+        sql = "SELECT DISTINCT account_number FROM contribution_history"
+        with self.engine.begin() as conn:
+            account_numbers = [row.account_number for row in conn.execute(text(sql))]
+            conn.execute(text("DELETE FROM contribution_totals"))
+        self.refresh_contribution_aggregates(account_numbers)
+
     def get_daily_records_by_date(self, date_str: str, symbol: str = 'total') -> list:
         """
         특정 날짜와 심볼에 해당하는 daily_records 조회
@@ -383,8 +464,8 @@ class HistoryMixin:
             
             sql = f"""
                 SELECT record_date
-                FROM daily_records
-                WHERE record_date {op} :date_str AND symbol = 'total'
+                FROM daily_portfolio_totals
+                WHERE record_date {op} :date_str
                 ORDER BY record_date {order}
                 LIMIT 1
             """
@@ -400,29 +481,38 @@ class HistoryMixin:
 
     def update_daily_record(self, record_id: int, amount: float):
         """
-        특정 daily_record 업데이트
+        특정 daily_record 업데이트 ('total' 행이면 롤업도 함께 갱신)
         """
         try:
+            select_sql = """
+                SELECT record_date, account_id, symbol
+                FROM daily_records
+                WHERE id = :record_id
+            """
             sql = """
                 UPDATE daily_records
                 SET amount = :amount
                 WHERE id = :record_id
             """
             with self.engine.begin() as conn:
+                record = conn.execute(text(select_sql), {"record_id": record_id}).fetchone()
                 conn.execute(text(sql), {"amount": amount, "record_id": record_id})
+                if record and record.symbol == 'total':
+                    self._upsert_daily_portfolio_total(conn, record.record_date, record.account_id, amount)
+            self._bump_history_version()
         except Exception as e:
             print(f"Error updating daily record {record_id}: {e}")
             raise
 
     def upsert_daily_record(self, date_str: str, account_id: str, amount: float, symbol: str = 'total') -> int:
         """
-        daily_record 추가 또는 업데이트 (Upsert)
+        daily_record 추가 또는 업데이트 (Upsert, 'total'이면 롤업도 함께 갱신)
         """
         try:
-            sql = """
+            sql = f"""
                 INSERT INTO daily_records (record_date, account_id, symbol, amount)
                 VALUES (:date_str, :account_id, :symbol, :amount)
-                ON DUPLICATE KEY UPDATE amount = :amount
+                {upsert_clause(self.dialect, ['record_date', 'account_id', 'symbol'], {'amount': ':amount'})}
             """
             with self.engine.begin() as conn:
                 result = conn.execute(text(sql), {
@@ -431,8 +521,11 @@ class HistoryMixin:
                     "symbol": symbol, 
                     "amount": amount
                 })
-                # lastrowid might be 0 for updates in some drivers, but good enough for confirmation
-                return result.lastrowid 
+                if symbol == 'total':
+                    self._upsert_daily_portfolio_total(conn, date_str, account_id, amount)
+            self._bump_history_version()
+            # lastrowid might be 0 for updates in some drivers, but good enough for confirmation
+            return result.lastrowid
         except Exception as e:
             print(f"Error upserting daily record: {e}")
             raise
@@ -0,0 +1,75 @@
+"""
+Schema bootstrap from db_schema.sql.
+The file is written for MySQL (US section, then KR section after the '-----kr' marker);
+for SQLite the DDL is translated to an equivalent portable form.
+"""
+import re
+from pathlib import Path
+from typing import List
+
+from library.db_modules.sql_dialect import SQLITE
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent.parent / 'db_schema.sql'
+
+# 서버/계정 관리 구문은 DB 단위 부트스트랩에서 제외
+_SKIP_PREFIXES = ('CREATE USER', 'CREATE DATABASE', 'USE ', 'GRANT ')
+_INLINE_INDEX = re.compile(r',\s*INDEX\s+(\w+)\s*\(([^)]*)\)', re.IGNORECASE)
+
+
+def _split_sections(sql: str):
+    lines = sql.splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().startswith('---') and line.strip().lstrip('-').strip().lower() == 'kr':
+            return "\n".join(lines[:i]), "\n".join(lines[i + 1:])
+    return sql, ""
+
+
+def _strip_comments(statement: str) -> str:
+    kept = [line for line in statement.splitlines() if not line.strip().startswith('--')]
+    return "\n".join(kept).strip()
+
+
+def _to_sqlite(statement: str) -> List[str]:
+    extra = []
+    table_match = re.match(r'CREATE TABLE\s+(\w+)', statement, re.IGNORECASE)
+
+    # 테이블 정의 내부 INDEX는 별도 CREATE INDEX로 분리
+    if table_match:
+        table = table_match.group(1)
+        for name, columns in _INLINE_INDEX.findall(statement):
+            extra.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        statement = _INLINE_INDEX.sub('', statement)
+
+    statement = re.sub(r'\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT',
+                       statement, flags=re.IGNORECASE)
+    statement = re.sub(r'\bENUM\s*\([^)]*\)', 'TEXT', statement, flags=re.IGNORECASE)
+    statement = re.sub(r'\s+ON UPDATE CURRENT_TIMESTAMP', '', statement, flags=re.IGNORECASE)
+    statement = re.sub(r'DEFAULT CURRENT_TIMESTAMP', "DEFAULT (datetime('now', 'localtime'))",
+                       statement, flags=re.IGNORECASE)
+    statement = re.sub(r'UNIQUE KEY\s*(\w+\s*)?\(', 'UNIQUE (', statement, flags=re.IGNORECASE)
+    statement = re.sub(r'^CREATE TABLE\s+', 'CREATE TABLE IF NOT EXISTS ', statement, flags=re.IGNORECASE)
+    statement = re.sub(r'^CREATE (UNIQUE )?INDEX\s+', lambda m: f"CREATE {m.group(1) or ''}INDEX IF NOT EXISTS ",
+                       statement, flags=re.IGNORECASE)
+    return [statement] + extra
+
+
+def load_schema_statements(market: str = 'us', dialect: str = 'mysql', path: Path = SCHEMA_PATH) -> List[str]:
+    """
+    db_schema.sql에서 해당 시장(us/kr)의 DDL 목록을 dialect에 맞게 반환.
+    """
+    with open(path, encoding='utf-8') as f:
+        us_sql, kr_sql = _split_sections(f.read())
+    section = kr_sql if market == 'kr' else us_sql
+
+    statements = []
+    for raw in section.split(';'):
+        statement = _strip_comments(raw)
+        if not statement or statement.upper().startswith(_SKIP_PREFIXES):
+            continue
+        # helper_db.daily_records -> daily_records (연결된 DB 기준으로 생성)
+        statement = re.sub(r'\b(TABLE|ON)\s+\w+\.(\w+)', r'\1 \2', statement, flags=re.IGNORECASE)
+        if dialect == SQLITE:
+            statements.extend(_to_sqlite(statement))
+        else:
+            statements.append(statement)
+    return statements
@@ -0,0 +1,40 @@
+"""
+Dialect-aware SQL fragments for the statements that differ between MySQL and SQLite.
+Mixins call these with self.dialect (engine.dialect.name) instead of hard-coding MySQL syntax.
+"""
+from typing import Dict, Sequence
+
+MYSQL = 'mysql'
+SQLITE = 'sqlite'
+
+
+def upsert_clause(dialect: str, conflict_columns: Sequence[str], updates: Dict[str, str]) -> str:
+    """
+    INSERT 문 뒤에 붙는 upsert 절.
+    updates: {column: SQL expression} (e.g. {"amount": ":amount"})
+    """
+    assignments = ", ".join(f"{column} = {expr}" for column, expr in updates.items())
+    if dialect == SQLITE:
+        return f"ON CONFLICT ({', '.join(conflict_columns)}) DO UPDATE SET {assignments}"
+    return f"ON DUPLICATE KEY UPDATE {assignments}"
+
+
+def insert_ignore(dialect: str) -> str:
+    """중복 키를 건너뛰는 INSERT 키워드"""
+    if dialect == SQLITE:
+        return "INSERT OR IGNORE"
+    return "INSERT IGNORE"
+
+
+def current_date(dialect: str) -> str:
+    """DB 서버 로컬 기준 오늘 날짜"""
+    if dialect == SQLITE:
+        return "DATE('now', 'localtime')"
+    return "CURRENT_DATE()"
+
+
+def format_paramstyle(dialect: str, sql: str) -> str:
+    """raw DB-API 커서용 SQL의 %s placeholder를 드라이버 paramstyle에 맞게 변환"""
+    if dialect == SQLITE:
+        return sql.replace("%s", "?")
+    return sql
@@ -104,11 +104,28 @@ class TradingRuleMixin:
             })
             conn.commit()
 
+    def update_high_prices(self, highs: Dict[str, float]) -> None:
+        """
+        장중 고가 일괄 반영 ({symbol: high}, IntradayTracker.drain_highs).
+        high_price가 이미 추적 중인(> 0) high_percent 규칙만, 기존 값보다 높을 때만 올린다.
+        """
+        if not highs:
+            return
+        sql = """
+            UPDATE trading_rules
+            SET high_price = :high_price
+            WHERE symbol = :symbol AND limit_type = 'high_percent'
+                AND status = 'ACTIVE' AND high_price > 0 AND high_price < :high_price
+        """
+        with self.engine.connect() as conn:
+            conn.execute(text(sql), [{"symbol": symbol, "high_price": high} for symbol, high in highs.items()])
+            conn.commit()
+
     def update_rule_field(self, rule_id, field, value):
         with self.engine.connect() as conn:
             if field not in ['limit_value', 'limit_type', 'target_amount', 'daily_money', 'cash_only']:
                 raise ValueError('Invalid field for update')
-            sql = f"UPDATE trading_rules SET {field} = :value, last_updated = NOW() WHERE id = :rule_id"
+            sql = f"UPDATE trading_rules SET {field} = :value, last_updated = CURRENT_TIMESTAMP WHERE id = :rule_id"
             conn.execute(text(sql), {"value": value, "rule_id": rule_id})
             conn.commit()
 
@@ -121,15 +138,15 @@ class TradingRuleMixin:
                 SET average_price = :average_price,
                     high_price = :high_price,
                     target_amount = :target_amount,
-                    current_quantity = :current_quantity,
-                    updated_at = NOW()
+                    current_holding = :current_holding,
+                    last_updated = CURRENT_TIMESTAMP
                     WHERE id = :rule_id
             """
             conn.execute(text(sql), {
                 "average_price": new_avg_price,
                 "high_price": new_high_price,
                 "target_amount": new_target_amount,
-                "current_quantity": new_current_quantity,
+                "current_holding": new_current_quantity,
                 "rule_id": rule_id
             })
             conn.commit()
@@ -0,0 +1,55 @@
+"""
+In-memory intraday high/low per symbol.
+
+TradingSystem feeds every price it polls into observe(), so the high_percent evaluator
+sees a new high on the tick it happens instead of after the next update_result at close.
+Symbols whose high rose since the last flush are kept in `dirty`. drain_highs() hands
+those highs to TradingRuleMixin.update_high_prices, which writes them to trading_rules in
+one batch. The loop drains every high_flush_every cycles and once more before close.
+Lows are tracked for trailing logic but are not persisted (trading_rules has no column).
+"""
+
+
+class IntradayTracker:
+    __slots__ = ('highs', 'lows', 'dirty', 'observed')
+
+    def __init__(self):
+        self.highs = {}  # {symbol: session high}
+        self.lows = {}  # {symbol: session low}
+        self.dirty = set()  # symbols whose high rose since the last drain
+        self.observed = 0
+
+    def observe(self, symbol, price):
+        """Records one polled price; returns the session high for symbol"""
+        self.observed += 1
+        high = self.highs.get(symbol)
+        if high is None:
+            self.highs[symbol] = self.lows[symbol] = price
+            self.dirty.add(symbol)
+            return price
+        if price > high:
+            self.highs[symbol] = price
+            self.dirty.add(symbol)
+            return price
+        if price < self.lows[symbol]:
+            self.lows[symbol] = price
+        return high
+
+    def high(self, symbol, default=0.0):
+        return self.highs.get(symbol, default)
+
+    def low(self, symbol, default=None):
+        return self.lows.get(symbol, default)
+
+    def drain_highs(self):
+        """{symbol: high} for every symbol whose high rose since the last drain; clears dirty"""
+        highs = {symbol: self.highs[symbol] for symbol in self.dirty}
+        self.dirty.clear()
+        return highs
+
+    def reset(self):
+        """Forget the session (call at the start of each trading day)"""
+        self.highs.clear()
+        self.lows.clear()
+        self.dirty.clear()
+        self.observed = 0
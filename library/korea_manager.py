@@ -5,7 +5,6 @@ import logging
 from datetime import datetime
 import json
 from typing import Dict, Optional, Tuple
-import time
 from math import ceil
 import requests
 
@@ -50,7 +49,7 @@ class KoreaManager:
                 print("Exception by First")
         return self.token
     def IsTodayOpenCheck(self):
-        time.sleep(0.2)
+        self.clock.sleep(0.2)
 
         now_time = self.clock.now(ZoneInfo('Asia/Seoul'))
         formattedDate = now_time.strftime("%Y%m%d")
@@ -145,7 +144,7 @@ class KoreaManager:
 
         # 드물지만 보유종목이 많으면 연속조회를 위한 반복 처리
         while True:
-            time.sleep(0.2)
+            self.clock.sleep(0.2)
 
             headers = self._get_base_headers("TTTC8434R", include_custtype=True)
             headers["tr_cont"] = tr_cont
@@ -200,7 +199,7 @@ class KoreaManager:
 
         # 드물지만 보유종목이 많으면 연속조회를 위한 반복 처리
         while True:
-            time.sleep(0.2)
+            self.clock.sleep(0.2)
 
             headers = self._get_base_headers("TTTC8434R", include_custtype=True)
             headers["tr_cont"] = tr_cont
@@ -253,7 +252,7 @@ class KoreaManager:
 
         return positions
     def get_cash(self, account: str) -> float:
-        time.sleep(0.2)
+        self.clock.sleep(0.2)
         PATH = "uapi/domestic-stock/v1/trading/inquire-psbl-order"
         URL = f"{secret.KR_REAL_URL}/{PATH}"
 
@@ -277,7 +276,7 @@ class KoreaManager:
             print("Error Code : " + str(res.status_code) + " | " + res.text)
             return res.json()["msg_cd"]
     def get_account_result(self, account: str) -> float:
-        time.sleep(0.2)
+        self.clock.sleep(0.2)
         PATH = "uapi/domestic-stock/v1/trading/inquire-balance"
         URL = f"{secret.KR_REAL_URL}/{PATH}"
 
@@ -362,7 +361,7 @@ class KoreaManager:
 
     def place_limit_buy_order(self, account: str, stockcode: str, quantity: int, price: float) -> bool:
         """Place limit buy order"""
-        time.sleep(0.2)
+        self.clock.sleep(0.2)
 
         PATH = "uapi/domestic-stock/v1/trading/order-cash"
         URL = f"{secret.KR_REAL_URL}/{PATH}"
@@ -383,7 +382,7 @@ class KoreaManager:
             return False
     def place_limit_sell_order(self, account: str, stockcode: str, quantity: int, price: float) -> bool:
         """Place limit buy order"""
-        time.sleep(0.2)
+        self.clock.sleep(0.2)
 
         PATH = "uapi/domestic-stock/v1/trading/order-cash"
         URL = f"{secret.KR_REAL_URL}/{PATH}"
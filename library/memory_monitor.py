@@ -0,0 +1,103 @@
+"""
+Periodic memory sampling for long trading sessions.
+
+TradingSystem calls MemoryMonitor.on_cycle() after every cycle. Every `every` cycles it
+records the current RSS (/proc/self/statm) and peak RSS, the GC generation counts,
+tracemalloc's traced memory when tracing is on (e.g. with --profile), and the sizes of
+what the loop holds for the whole session (position caches, rules in the last cycle,
+recorder queue depth, QueryProfiler summaries).
+
+Samples live in a bounded deque. When RSS grows more than growth_warn_mb above the first
+sample, a warning is logged once per step of that size. A sample costs a file read and
+a few len() calls, so sampling stays on by default.
+"""
+import gc
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+
+def rss_mb():
+    """(current, peak) resident set size in MB (current is None where /proc is unavailable)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        current = None
+    # Linux reports kilobytes, macOS bytes
+    return current, peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class MemoryMonitor:
+    def __init__(self, every=300, max_samples=500, growth_warn_mb=200.0, logger=None):
+        self.every = every
+        self.samples = deque(maxlen=max_samples)
+        self.growth_warn_mb = growth_warn_mb
+        self.logger = logger
+        self._baseline = None
+        self._warned_steps = 0
+
+    def on_cycle(self, cycle, system):
+        if self.every and cycle % self.every == 0:
+            return self.sample(cycle, system)
+        return None
+
+    def sample(self, cycle, system=None):
+        current, peak = rss_mb()
+        sample = {
+            "ts": time.time(),
+            "cycle": cycle,
+            "rss_mb": None if current is None else round(current, 1),
+            "peak_rss_mb": round(peak, 1),
+            "gc_counts": gc.get_count(),
+        }
+        if tracemalloc.is_tracing():
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            sample["traced_mb"] = round(traced / 1e6, 3)
+            sample["traced_peak_mb"] = round(traced_peak / 1e6, 3)
+        if system is not None:
+            sample["sizes"] = self._sizes(system)
+        self.samples.append(sample)
+        self._check_growth(sample)
+        return sample
+
+    @staticmethod
+    def _sizes(system):
+        sizes = {
+            "positions": sum(len(p) for p in system.positions_by_account.values()),
+            "positions_result": sum(len(p) for p in system.positions_result_by_account.values()),
+            "rules": system.last_rule_count,
+        }
+        if system.recorder is not None:
+            sizes["recorder_queue"] = len(system.recorder.queue.queue)
+        if system.query_profiler is not None:
+            sizes["sql_summaries"] = len(system.query_profiler.summaries)
+        return sizes
+
+    def _check_growth(self, sample):
+        if sample["rss_mb"] is None:
+            return
+        if self._baseline is None:
+            self._baseline = sample["rss_mb"]
+            return
+        growth = sample["rss_mb"] - self._baseline
+        steps = int(growth // self.growth_warn_mb) if self.growth_warn_mb else 0
+        if steps > self._warned_steps:
+            self._warned_steps = steps
+            if self.logger:
+                self.logger.warning(f"[Memory] RSS grew {growth:.0f}MB since cycle {self.samples[0]['cycle']} "
+                                    f"({self._baseline:.0f}MB -> {sample['rss_mb']:.0f}MB): {sample.get('sizes')}")
+
+    def summary(self):
+        rss = [s["rss_mb"] for s in self.samples if s["rss_mb"] is not None]
+        return {
+            "samples": len(self.samples),
+            "first_rss_mb": rss[0] if rss else None,
+            "last_rss_mb": rss[-1] if rss else None,
+            "max_rss_mb": max(rss) if rss else None,
+            "peak_rss_mb": self.samples[-1]["peak_rss_mb"] if self.samples else None,
+        }
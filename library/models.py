@@ -0,0 +1,174 @@
+"""
+Compact records the trading loop keeps for the whole session.
+
+They use __slots__ instead of a per-row dict, but read like the dicts they replace
+(row['field'], row.get('field'), 'field' in row), so existing callers such as
+StateIntegrityGuard and HistoryMixin.add_daily_result keep working unchanged.
+"""
+SELL, BUY = 0, 1  # trader.OrderType
+_INF = float('inf')
+
+
+class _SlotRecord:
+    """
+    Dict-style access over _fields. Fields listed in _optional only count as present when
+    they are not None (e.g. stock_name exists on KR rules only), and columns outside
+    _fields are kept in `extra` so nothing from the row is lost.
+    """
+    __slots__ = ('extra',)
+    _fields = ()
+    _optional = ()
+
+    def _has(self, key):
+        if key in self._fields:
+            return key not in self._optional or getattr(self, key) is not None
+        return self.extra is not None and key in self.extra
+
+    def __getitem__(self, key):
+        if key in self._fields and self._has(key):
+            return getattr(self, key)
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return self[key] if self._has(key) else default
+
+    def __contains__(self, key):
+        return self._has(key)
+
+    def keys(self):
+        keys = [key for key in self._fields if self._has(key)]
+        return keys + list(self.extra) if self.extra else keys
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, _SlotRecord):
+            return self.items() == other.items()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f"{key}={value!r}" for key, value in self.items())
+        return f"{type(self).__name__}({fields})"
+
+
+class Position(_SlotRecord):
+    """One broker position from get_positions_result (values kept as the manager returned them)"""
+    __slots__ = ('quantity', 'average_price', 'last_price')
+    _fields = __slots__
+
+    def __init__(self, quantity=0, average_price=0.0, last_price=0.0):
+        self.extra = None
+        self.quantity = quantity
+        self.average_price = average_price
+        self.last_price = last_price
+
+    @classmethod
+    def from_mapping(cls, data):
+        return cls(data.get('quantity', 0), data.get('average_price', 0.0), data.get('last_price', 0.0))
+
+
+def compact_positions(positions):
+    """{symbol: {quantity, average_price, last_price}} -> {symbol: Position}"""
+    return {symbol: Position.from_mapping(data) for symbol, data in positions.items()}
+
+
+class Rule(_SlotRecord):
+    """
+    One row of get_active_trading_rules, built once per load.
+
+    Numerics are converted once (limit_value / daily_money / prices to float, target_amount /
+    current_holding to int), and the trigger thresholds are precomputed, so evaluating a tick is
+    `price <= rule.buy_below` or `price >= rule.sell_above` with no dict lookups or Decimal math:
+        price / weekly / monthly / percent(avg 0) BUY -> buy_below (inf = buy at any price)
+        percent -> average_price * (1 -/+ limit_value / 100)
+        high_percent BUY -> high_price * (1 - limit_value / 100) (never while high_price is 0)
+    Rules that can never trigger on a side get -inf / inf there.
+    """
+    _fields = ('id', 'account_id', 'symbol', 'stock_name', 'trade_action', 'limit_value', 'limit_type',
+               'target_amount', 'daily_money', 'cash_only', 'current_holding', 'average_price', 'last_price',
+               'high_price', 'last_updated', 'status', 'user_id', 'hash_value', 'description')
+    _optional = ('stock_name',)
+    __slots__ = _fields + ('buy_below', 'sell_above')
+
+    _FLOATS = ('limit_value', 'daily_money', 'last_price', 'high_price')
+    _INTS = ('target_amount', 'current_holding', 'trade_action', 'cash_only')
+
+    @classmethod
+    def from_row(cls, row):
+        rule = cls.__new__(cls)
+        extra = None
+        for key, value in row.items():
+            if key in cls._fields:
+                setattr(rule, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        rule.extra = extra
+        for key in cls._fields:
+            if not hasattr(rule, key):
+                setattr(rule, key, None)
+        for key in cls._FLOATS:
+            value = getattr(rule, key)
+            setattr(rule, key, float(value) if value is not None else 0.0)
+        for key in cls._INTS:
+            value = getattr(rule, key)
+            setattr(rule, key, int(value) if value is not None else 0)
+        if rule.average_price is not None:
+            rule.average_price = float(rule.average_price)  # None stays None (no average yet)
+        rule.refresh_thresholds()
+        return rule
+
+    def refresh_thresholds(self, high_price=None):
+        """Recomputes buy_below / sell_above (high_price overrides the stored one for high_percent)"""
+        buy, sell = -_INF, _INF
+        limit_type = self.limit_type
+        if limit_type in ('weekly', 'monthly'):
+            buy = _INF
+        elif limit_type == 'percent':
+            if not self.average_price:
+                buy = _INF  # no average yet: buy at the current price, never sell
+            else:
+                buy = self.average_price * (1 - self.limit_value / 100)
+                sell = self.average_price * (1 + self.limit_value / 100)
+        elif limit_type == 'high_percent':
+            high = self.high_price if high_price is None else high_price
+            if high > 0:
+                buy = high * (1 - self.limit_value / 100)
+        else:
+            buy = sell = self.limit_value
+        self.buy_below = buy if self.trade_action == BUY else -_INF
+        self.sell_above = sell if self.trade_action == SELL else _INF
+
+    @property
+    def display_symbol(self):
+        return self.stock_name if self.stock_name is not None else self.symbol
+
+
+def load_rules(rows, cache):
+    """
+    Rule objects for rows, reusing the cached Rule of every row that is unchanged since the
+    last load (the loop re-reads the active rules each cycle, but most rows never change).
+    cache is {rule_id: (row values, Rule)} and is replaced by this load's rules.
+    """
+    fresh = {}
+    rules = []
+    for row in rows:
+        signature = tuple(row.values())
+        cached = cache.get(row['id'])
+        rule = cached[1] if cached is not None and cached[0] == signature else Rule.from_row(row)
+        fresh[row['id']] = (signature, rule)
+        rules.append(rule)
+    cache.clear()
+    cache.update(fresh)
+    return rules
@@ -1,32 +1,68 @@
+import os
 from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
 import pymysql.cursors
-from library import secret
 from library.db_modules.account_mixin import AccountMixin
 from library.db_modules.trading_rule_mixin import TradingRuleMixin
 from library.db_modules.history_mixin import HistoryMixin
+from library.db_modules.schema import load_schema_statements
+from library.db_modules.sql_dialect import MYSQL, SQLITE, format_paramstyle
 
 pymysql.install_as_MySQLdb()
 
 class DatabaseHandler(AccountMixin, TradingRuleMixin, HistoryMixin):
-    def __init__(self, db_name):
+    """
+    backend:
+        'mysql'  - db_name은 MySQL 스키마 이름 (기본값, library/secret.py 접속 정보 사용)
+        'sqlite' - db_name은 SQLite 파일 경로 또는 ':memory:' (오프라인 테스트/벤치마크용)
+    지정하지 않으면 환경변수 DB_BACKEND, 없으면 'mysql'.
+    """
+    def __init__(self, db_name, backend=None):
         self.db_name = db_name
+        self.backend = backend or os.getenv('DB_BACKEND', MYSQL)
+        # 프로세스 내 집계 캐시 (HistoryMixin) - daily_records 쓰기 시 버전 증가로 무효화
+        self._history_version = 0
+        self._allocation_cache = None
         self.setup_db_names()
 
 
     def setup_db_names(self):
-        self.engine = self.create_engine_for_db(self.db_name)
+        self.engine = self.create_engine_for_db(self.db_name, backend=self.backend)
+        self.dialect = self.engine.dialect.name
 
-        self.db_conn = pymysql.connect(host=secret.db_ip, port=int(secret.db_port), user=secret.db_id, password=secret.db_passwd,
-                                       charset='utf8')
+        if self.backend == MYSQL:
+            from library import secret
+            self.db_conn = pymysql.connect(host=secret.db_ip, port=int(secret.db_port), user=secret.db_id, password=secret.db_passwd,
+                                           charset='utf8')
+        else:
+            self.db_conn = None
 
     @staticmethod
-    def create_engine_for_db(db_name, pool_size=5):
+    def create_engine_for_db(db_name, pool_size=5, backend=MYSQL):
+        if backend == SQLITE:
+            if db_name == ':memory:':
+                # 모든 커넥션이 같은 인메모리 DB를 보도록 단일 커넥션 공유
+                return create_engine("sqlite://", poolclass=StaticPool,
+                                     connect_args={"check_same_thread": False})
+            return create_engine(f"sqlite:///{db_name}", connect_args={"check_same_thread": False})
+        if backend != MYSQL:
+            raise ValueError(f"Unsupported database backend: {backend}")
+
+        from library import secret
         return create_engine(
             f"mysql+mysqldb://{secret.db_id}:{secret.db_passwd}@{secret.db_ip}:{secret.db_port}/{db_name}", pool_size=pool_size,
             max_overflow=10, pool_recycle=3600)
 
+    def bootstrap_schema(self, market: str = 'us') -> None:
+        """db_schema.sql의 시장별(us/kr) 테이블을 현재 DB에 생성"""
+        with self.engine.begin() as conn:
+            for statement in load_schema_statements(market, self.dialect):
+                conn.execute(text(statement))
 
     def is_database_exist(self):
+        if self.backend == SQLITE:
+            return self.db_name == ':memory:' or os.path.exists(self.db_name)
+
         sql = "SELECT 1 FROM Information_schema.SCHEMATA WHERE SCHEMA_NAME = '%s'"
         with self.engine.connect() as conn:
             rows = conn.execute(text(sql % (self.db_name))).fetchall()
@@ -39,7 +75,7 @@ class DatabaseHandler(AccountMixin, TradingRuleMixin, HistoryMixin):
         try:
             cursor = conn.cursor()
             try:
-                cursor.executemany(sql, args)
+                cursor.executemany(format_paramstyle(self.dialect, sql), args)
                 conn.commit()
             finally:
                 cursor.close()
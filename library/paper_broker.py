@@ -0,0 +1,334 @@
+"""
+In-memory paper broker with the SchwabManager / KoreaManager interface.
+
+PaperExchange holds every account, cash balance, position and resting order plus the
+price source; PaperBroker is the per-user manager that TradingSystem talks to (through
+strategies.paper_strategy.PaperMarketStrategy). Limit orders fill at the current price
+when marketable and otherwise rest until a later price crosses them; open orders are DAY
+orders and are cancelled by end_of_day().
+
+Latency (seconds, or a (min, max) range) is spent through the clock, so with MockClock it
+only moves virtual time. error_rate injects failures: reads raise PaperBrokerError and
+orders come back with is_success False, as a broker outage would look to the loop.
+"""
+import itertools
+import random
+import threading
+from datetime import time as dtime
+from math import ceil
+from typing import Dict, Optional
+
+from library.clock import Clock
+
+READ_METHODS = ('get_hashs', 'get_positions', 'get_positions_result', 'get_cash', 'get_account_result',
+                'get_last_price', 'get_market_hours')
+ORDER_METHODS = ('place_limit_buy_order', 'place_limit_sell_order', 'place_market_sell_order')
+CASH_ETFS = ['BIL', 'SGOV']
+
+
+class PaperBrokerError(Exception):
+    pass
+
+
+class PaperOrder:
+    """Order response (is_success / order_id like the objects the real managers return)"""
+
+    def __init__(self, is_success, order_id=None, symbol=None, side=None, quantity=0, limit_price=None,
+                 status='REJECTED', reason=None):
+        self.is_success = is_success
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.limit_price = limit_price
+        self.status = status  # OPEN / FILLED / CANCELED / REJECTED
+        self.fill_price = None
+        self.reason = reason
+
+    def to_dict(self):
+        return {"is_success": self.is_success, "order_id": self.order_id, "status": self.status,
+                "fill_price": self.fill_price, "reason": self.reason}
+
+    def __repr__(self):
+        return (f"PaperOrder({self.order_id}, {self.side} {self.quantity} {self.symbol} "
+                f"@ {self.limit_price}, {self.status})")
+
+
+class PaperAccount:
+    def __init__(self, user_id, account_number, hash_value, cash):
+        self.user_id = user_id
+        self.account_number = account_number
+        self.hash_value = hash_value
+        self.cash = float(cash)
+        self.positions = {}  # {symbol: [quantity, average_price]}
+        self.reserved_cash = 0.0
+        self.reserved_shares = {}
+
+
+class PaperExchange:
+    def __init__(self, price_source, clock: Clock = None, latency=0.0, error_rate=0.0,
+                 error_methods=None, seed=None, session=(dtime(9, 30), dtime(16, 0)), tz=None):
+        """
+        price_source: {symbol: price} or callable(symbol, now) -> price (None: no quote)
+        session: (open, close) local times on weekdays, or a callable(now) -> bool
+        error_methods: method names error_rate applies to (default: all)
+        """
+        self.price_source = price_source
+        self.clock = clock or Clock()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_methods = set(error_methods) if error_methods else None
+        self.rng = random.Random(seed)
+        self.session = session
+        self.tz = tz
+        self.accounts = {}  # {hash_value: PaperAccount}
+        self.open_orders = {}  # {symbol: [PaperOrder]}
+        self.orders = {}  # {order_id: (hash_value, PaperOrder)}
+        self.fills = []
+        self.calls = {}
+        self._order_ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    # --- setup ---
+    def add_account(self, user_id, account_number, hash_value, cash=0.0, positions=None):
+        """positions: {symbol: quantity or (quantity, average_price)}"""
+        account = PaperAccount(user_id, account_number, hash_value, cash)
+        for symbol, value in (positions or {}).items():
+            quantity, avg = value if isinstance(value, (tuple, list)) else (value, 0.0)
+            if quantity:
+                account.positions[symbol] = [quantity, float(avg)]
+        self.accounts[hash_value] = account
+        return account
+
+    def load_accounts(self, db_handler, cash=100000.0):
+        """
+        One paper account per row of the accounts table. Positions come from the trading rules'
+        current_holding / average_price so StateIntegrityGuard sees matching broker state.
+        """
+        for user_id in db_handler.get_users():
+            for row in db_handler.get_user_accounts(user_id):
+                hash_value = row.get('hash_value') or f"paper-{row['account_number']}"
+                if hash_value not in self.accounts:
+                    self.add_account(user_id, row['account_number'], hash_value,
+                                     cash(row) if callable(cash) else cash)
+        for rule in db_handler.get_all_trading_rules():
+            account = self.accounts.get(rule.get('hash_value'))
+            holding = float(rule.get('current_holding') or 0)
+            if account and holding > 0 and rule['symbol'] not in account.positions:
+                account.positions[rule['symbol']] = [holding, float(rule.get('average_price') or 0)]
+        return len(self.accounts)
+
+    # --- behaviour knobs ---
+    def _call(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = self.rng.uniform(*latency)
+        if latency:
+            self.clock.sleep(latency)
+        if self.error_rate and (self.error_methods is None or method in self.error_methods):
+            return self.rng.random() < self.error_rate
+        return False
+
+    def quote(self, symbol):
+        if callable(self.price_source):
+            price = self.price_source(symbol, self.clock.now(self.tz))
+        else:
+            price = self.price_source.get(symbol)
+        if price is not None:
+            self._match(symbol, price)
+        return price
+
+    def is_open(self):
+        now = self.clock.now(self.tz)
+        if callable(self.session):
+            return bool(self.session(now))
+        open_time, close_time = self.session
+        return now.weekday() < 5 and open_time <= now.time() < close_time
+
+    # --- orders ---
+    def place(self, hash_value, symbol, side, quantity, limit_price=None):
+        with self._lock:
+            account = self.accounts.get(hash_value)
+            if account is None:
+                return PaperOrder(False, symbol=symbol, side=side, quantity=quantity, reason='Unknown account')
+            if quantity <= 0:
+                return PaperOrder(False, symbol=symbol, side=side, quantity=quantity, reason='Invalid quantity')
+            order = PaperOrder(True, order_id=f"paper-{next(self._order_ids)}", symbol=symbol, side=side,
+                               quantity=quantity, limit_price=limit_price, status='OPEN')
+
+            if side == 'BUY':
+                cost = quantity * limit_price
+                if cost > account.cash - account.reserved_cash + 1e-9:
+                    order.is_success, order.status, order.reason = False, 'REJECTED', 'Insufficient cash'
+                    return order
+                account.reserved_cash += cost
+            else:
+                held = account.positions.get(symbol, [0, 0.0])[0] - account.reserved_shares.get(symbol, 0)
+                if quantity > held:
+                    order.is_success, order.status, order.reason = False, 'REJECTED', 'Insufficient shares'
+                    return order
+                account.reserved_shares[symbol] = account.reserved_shares.get(symbol, 0) + quantity
+
+            self.orders[order.order_id] = (hash_value, order)
+            self.open_orders.setdefault(symbol, []).append(order)
+            price = self.quote(symbol)
+            if price is None and limit_price is None:
+                self.cancel(order.order_id)
+                order.is_success, order.reason = False, 'No quote'
+            return order
+
+    def _match(self, symbol, price):
+        with self._lock:
+            resting = self.open_orders.get(symbol)
+            if not resting:
+                return
+            still_open = []
+            for order in resting:
+                marketable = (order.limit_price is None
+                              or (order.side == 'BUY' and price <= order.limit_price)
+                              or (order.side == 'SELL' and price >= order.limit_price))
+                if marketable:
+                    self._fill(order, price)
+                else:
+                    still_open.append(order)
+            self.open_orders[symbol] = still_open
+
+    def _fill(self, order, price):
+        hash_value, _ = self.orders[order.order_id]
+        account = self.accounts[hash_value]
+        quantity, symbol = order.quantity, order.symbol
+        position = account.positions.setdefault(symbol, [0, 0.0])
+        if order.side == 'BUY':
+            account.reserved_cash -= quantity * order.limit_price
+            account.cash -= quantity * price
+            position[1] = (position[0] * position[1] + quantity * price) / (position[0] + quantity)
+            position[0] += quantity
+        else:
+            account.reserved_shares[symbol] -= quantity
+            account.cash += quantity * price
+            position[0] -= quantity
+            if position[0] <= 0:
+                del account.positions[symbol]
+        order.status, order.fill_price = 'FILLED', price
+        self.fills.append({"order_id": order.order_id, "hash_value": hash_value, "symbol": symbol,
+                           "side": order.side, "quantity": quantity, "price": price,
+                           "at": self.clock.now(self.tz)})
+
+    def cancel(self, order_id):
+        with self._lock:
+            hash_value, order = self.orders[order_id]
+            if order.status != 'OPEN':
+                return False
+            account = self.accounts[hash_value]
+            if order.side == 'BUY':
+                account.reserved_cash -= order.quantity * order.limit_price
+            else:
+                account.reserved_shares[order.symbol] -= order.quantity
+            self.open_orders[order.symbol].remove(order)
+            order.status = 'CANCELED'
+            return True
+
+    def end_of_day(self):
+        """Cancel every resting DAY order; returns how many were cancelled"""
+        with self._lock:
+            open_ids = [o.order_id for orders in self.open_orders.values() for o in orders]
+            for order_id in open_ids:
+                self.cancel(order_id)
+            return len(open_ids)
+
+    def split(self, symbol, ratio):
+        """Stock split (ratio > 1) or reverse split (< 1): quantities * ratio, average price / ratio"""
+        with self._lock:
+            for account in self.accounts.values():
+                if symbol in account.positions:
+                    quantity, avg = account.positions[symbol]
+                    account.positions[symbol] = [int(quantity * ratio), avg / ratio]
+
+    def account_value(self, hash_value):
+        account = self.accounts[hash_value]
+        value = account.cash
+        for symbol, (quantity, avg) in account.positions.items():
+            price = self.quote(symbol)
+            value += quantity * (price if price is not None else avg)
+        return value
+
+
+class PaperBroker:
+    """Manager for one user (same method names and return shapes as SchwabManager)"""
+
+    def __init__(self, user_id: str, exchange: PaperExchange):
+        self.user_id = user_id
+        self.exchange = exchange
+        self.clock = exchange.clock
+
+    def _account(self, hash_value):
+        account = self.exchange.accounts.get(hash_value)
+        if account is None or account.user_id != self.user_id:
+            raise PaperBrokerError(f"Unknown account {hash_value} for {self.user_id}")
+        return account
+
+    def _read(self, method):
+        if self.exchange._call(method):
+            raise PaperBrokerError(f"Injected failure in {method}")
+
+    def get_hashs(self):
+        self._read('get_hashs')
+        return {a.account_number: a.hash_value for a in self.exchange.accounts.values() if a.user_id == self.user_id}
+
+    def get_market_hours(self):
+        self._read('get_market_hours')
+        return self.exchange.is_open()
+
+    def get_positions(self, hash_value: str) -> Dict[str, float]:
+        self._read('get_positions')
+        return {symbol: quantity for symbol, (quantity, _) in self._account(hash_value).positions.items()}
+
+    def get_positions_result(self, hash_value: str) -> Dict[str, Dict[str, float]]:
+        self._read('get_positions_result')
+        positions = {}
+        for symbol, (quantity, avg) in self._account(hash_value).positions.items():
+            price = self.exchange.quote(symbol)
+            positions[symbol] = {"quantity": quantity, "average_price": avg,
+                                 "last_price": price if price is not None else avg}
+        return positions
+
+    def get_cash(self, hash_value: str) -> float:
+        self._read('get_cash')
+        account = self._account(hash_value)
+        return account.cash - account.reserved_cash
+
+    def get_account_result(self, hash_value: str):
+        self._read('get_account_result')
+        account = self._account(hash_value)
+        return account.cash - account.reserved_cash, self.exchange.account_value(hash_value)
+
+    def get_last_price(self, symbol: str) -> Optional[float]:
+        self._read('get_last_price')
+        return self.exchange.quote(symbol)
+
+    def _order(self, method, hash_value, symbol, side, quantity, price=None):
+        if self.exchange._call(method):
+            return PaperOrder(False, symbol=symbol, side=side, quantity=quantity, limit_price=price,
+                              reason=f"Injected failure in {method}")
+        self._account(hash_value)
+        return self.exchange.place(hash_value, symbol, side, quantity, price)
+
+    def place_limit_buy_order(self, hash_value: str, symbol: str, quantity: int, price: float):
+        return self._order('place_limit_buy_order', hash_value, symbol, 'BUY', quantity, price)
+
+    def place_limit_sell_order(self, hash_value: str, symbol: str, quantity: int, price: float):
+        return self._order('place_limit_sell_order', hash_value, symbol, 'SELL', quantity, price)
+
+    def place_market_sell_order(self, hash_value: str, symbol: str, quantity: int):
+        return self._order('place_market_sell_order', hash_value, symbol, 'SELL', quantity)
+
+    def sell_etf_for_cash(self, hash_value: str, required_cash: float, positions: Dict[str, float]):
+        """Sell SGOV or BIL to get required cash (same selection as SchwabManager)"""
+        for etf in CASH_ETFS:
+            if etf in positions and positions[etf] > 0:
+                current_price = self.get_last_price(etf)
+                shares_to_sell = min(positions[etf], ceil(required_cash / current_price))
+                if shares_to_sell > 0:
+                    return self.place_market_sell_order(hash_value, etf, shares_to_sell)
+        return None
@@ -0,0 +1,199 @@
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# 호출자 탐색 시 DB 계층으로 간주하는 모듈
+_DB_MODULE_PREFIXES = ('library.db_modules', 'library.mysql_helper')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_statement(statement: str) -> str:
+    """공백을 정리해 같은 SQL을 하나의 키로 묶음"""
+    return _WHITESPACE_RE.sub(' ', statement).strip()
+
+
+def _find_db_caller():
+    """SQL을 실행한 mixin 메서드 이름 (예: 'history_mixin.get_daily_total_values')"""
+    frame = sys._getframe(2)
+    caller = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith(_DB_MODULE_PREFIXES):
+            code = frame.f_code
+            name = getattr(code, 'co_qualname', code.co_name)
+            # 가장 바깥쪽 DB 계층 메서드를 호출자로 사용 (헬퍼 내부 호출 제외)
+            caller = f"{module.rsplit('.', 1)[-1]}.{name}"
+        elif caller is not None:
+            break
+        frame = frame.f_back
+    return caller or 'unknown'
+
+
+class _ProfileUnit:
+    """하나의 트레이딩 사이클 또는 Flask 요청 동안의 쿼리 통계"""
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.statements = {}  # {normalized_sql: stats}
+        self.query_count = 0
+        self.total_ms = 0.0
+
+    def add(self, statement: str, caller: str, elapsed_ms: float, rowcount: int, executemany: bool):
+        stats = self.statements.get(statement)
+        if stats is None:
+            stats = self.statements[statement] = {
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+                'callers': {}, 'executemany': executemany,
+            }
+        stats['count'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        if rowcount is not None and rowcount >= 0:
+            stats['rows'] += rowcount
+        stats['callers'][caller] = stats['callers'].get(caller, 0) + 1
+        self.query_count += 1
+        self.total_ms += elapsed_ms
+
+    def summary(self, n_plus_one_threshold: int) -> dict:
+        statements = sorted(
+            ({'sql': sql, **stats} for sql, stats in self.statements.items()),
+            key=lambda s: s['total_ms'], reverse=True
+        )
+        for stats in statements:
+            stats['total_ms'] = round(stats['total_ms'], 3)
+            stats['max_ms'] = round(stats['max_ms'], 3)
+        n_plus_one = [
+            {'sql': s['sql'], 'count': s['count'], 'callers': s['callers']}
+            for s in statements if s['count'] > n_plus_one_threshold
+        ]
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round((time.perf_counter() - self._start) * 1000, 3),
+            'query_count': self.query_count,
+            'query_ms': round(self.total_ms, 3),
+            'distinct_statements': len(statements),
+            'statements': statements,
+            'n_plus_one': n_plus_one,
+        }
+
+
+class QueryProfiler:
+    """
+    DatabaseHandler.engine에 SQLAlchemy 이벤트 리스너를 붙여
+    쿼리별 지연시간/행 수/호출 mixin 메서드를 단위(사이클, 요청)별로 집계.
+
+    사용 예:
+        profiler = QueryProfiler(n_plus_one_threshold=5)
+        profiler.attach(db_handler.engine)
+        with profiler.unit('cycle', 'cycle-1'):
+            ...
+        profiler.to_json()
+
+    활성 단위가 없는 스레드에서 실행된 쿼리는 집계하지 않음.
+    """
+
+    def __init__(self, n_plus_one_threshold: int = 5, max_summaries: int = 500, logger=None):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.summaries = deque(maxlen=max_summaries)
+        self.logger = logger or logging.getLogger("query_profiler")
+        self._engines = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # --- engine hooks ---
+    def attach(self, engine) -> None:
+        if engine in self._engines:
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._engines.append(engine)
+
+    def detach(self) -> None:
+        for engine in self._engines:
+            event.remove(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.remove(engine, 'after_cursor_execute', self._after_cursor_execute)
+        self._engines = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.current_unit is None:
+            return
+        conn.info.setdefault('query_profiler_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        unit = self.current_unit
+        starts = conn.info.get('query_profiler_start')
+        if unit is None or not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        unit.add(normalize_statement(statement), _find_db_caller(), elapsed_ms,
+                 getattr(cursor, 'rowcount', None), executemany)
+
+    # --- units ---
+    @property
+    def current_unit(self):
+        return getattr(self._local, 'unit', None)
+
+    def start_unit(self, kind: str, name: str) -> None:
+        self._local.unit = _ProfileUnit(kind, name)
+
+    def end_unit(self):
+        """현재 단위를 종료하고 요약을 반환 (N+1 패턴은 경고 로그)"""
+        unit = self.current_unit
+        if unit is None:
+            return None
+        self._local.unit = None
+
+        summary = unit.summary(self.n_plus_one_threshold)
+        with self._lock:
+            self.summaries.append(summary)
+
+        for pattern in summary['n_plus_one']:
+            self.logger.warning(
+                f"[SQL N+1] {unit.kind} '{unit.name}': statement ran {pattern['count']} times "
+                f"(threshold {self.n_plus_one_threshold}) from {pattern['callers']}: {pattern['sql'][:200]}"
+            )
+        self.logger.debug(
+            f"[SQL] {unit.kind} '{unit.name}': {summary['query_count']} queries, "
+            f"{summary['query_ms']:.1f}ms in DB, {summary['duration_ms']:.1f}ms total"
+        )
+        return summary
+
+    @contextmanager
+    def unit(self, kind: str, name: str):
+        self.start_unit(kind, name)
+        try:
+            yield
+        finally:
+            self.end_unit()
+
+    # --- export ---
+    def to_dict(self) -> dict:
+        with self._lock:
+            summaries = list(self.summaries)
+        return {
+            'n_plus_one_threshold': self.n_plus_one_threshold,
+            'units': len(summaries),
+            'total_queries': sum(s['query_count'] for s in summaries),
+            'total_query_ms': round(sum(s['query_ms'] for s in summaries), 3),
+            'n_plus_one_units': sum(1 for s in summaries if s['n_plus_one']),
+            'summaries': summaries,
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), default=str, **kwargs)
+
+    def dump(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json(indent=2))
@@ -1,19 +1,151 @@
 import json
 import time
 import functools
+import itertools
 import threading
 import queue
 import atexit
 import logging
 import os
+import re
+import gzip
+import shutil
+import struct
 import subprocess
+import tempfile
 from datetime import datetime
 from library import secret
+from library.recording_io import open_writer, is_compressed, json_default, new_session_id, _ends_mid_line
+from library.recording_index import OffsetIndexWriter, entry_key
 
-def backup_databases(stage, logger=None):
+BACKUP_DIR = "records"
+DUMP_TRAILER = b"-- Dump completed"  # mysqldump writes this comment as its last line
+_BACKUP_NAME_RE = re.compile(r'^backup_(?P<db>.+)_(?P<date>\d{8})_(?P<time>\d{6})_(?P<stage>[a-z]+)\.sql(\.gz)?$')
+
+def _find_mysqldump():
+    mysqldump_cmd = "mysqldump"
+    # Auto-detect mysqldump if not in PATH
+    if not shutil.which(mysqldump_cmd):
+        possible_paths = [
+            "/opt/homebrew/bin/mysqldump", 
+            "/usr/local/bin/mysqldump", 
+            "/usr/bin/mysqldump",
+            "/usr/local/opt/mysql-client/bin/mysqldump",
+            "/usr/local/opt/mysql@8.4/bin/mysqldump",
+            "/opt/homebrew/opt/mysql-client/bin/mysqldump"
+        ]
+        for path in possible_paths:
+            if os.path.exists(path):
+                mysqldump_cmd = path
+                break
+    return mysqldump_cmd
+
+def _dump_database(cmd, env, filename, db_name, logger, started_event=None, compresslevel=6):
+    """
+    Streams mysqldump stdout through gzip into filename (written as .part, renamed on success).
+    The dump is kept only if mysqldump exits 0, produced output and ends with its trailer.
+    """
+    result = {"db": db_name, "path": filename, "ok": False, "raw_bytes": 0, "bytes": 0, "seconds": 0.0}
+    part = filename + ".part"
+    start = time.monotonic()
+    try:
+        with tempfile.TemporaryFile() as err:
+            # stderr goes to a file so a chatty dump can never block on a full pipe
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err, env=env)
+            tail = b""
+            sink = gzip.open(part, 'wb', compresslevel=compresslevel) if filename.endswith('.gz') else open(part, 'wb')
+            with sink:
+                while True:
+                    chunk = proc.stdout.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    if started_event is not None:
+                        started_event.set()
+                    sink.write(chunk)
+                    result["raw_bytes"] += len(chunk)
+                    tail = (tail + chunk)[-512:]
+            returncode = proc.wait()
+            err.seek(0)
+            stderr = err.read().decode(errors='replace').strip()
+
+        if returncode != 0:
+            logger.error(f"Failed to backup {db_name}: {stderr}")
+        elif result["raw_bytes"] == 0:
+            logger.error(f"Backup created but empty: {filename}")
+        elif DUMP_TRAILER not in tail:
+            logger.error(f"Backup incomplete (no '{DUMP_TRAILER.decode()}' trailer): {filename}")
+        else:
+            os.replace(part, filename)
+            result["ok"] = True
+            result["bytes"] = os.path.getsize(filename)
+    except Exception as e:
+        logger.error(f"Error during backup of {db_name}: {e}")
+    finally:
+        if started_event is not None:
+            started_event.set()
+        if os.path.exists(part):
+            os.remove(part)  # Clean up empty/partial file
+        result["seconds"] = round(time.monotonic() - start, 3)
+    if result["ok"]:
+        ratio = result["raw_bytes"] / result["bytes"] if result["bytes"] else 0
+        logger.info(f"Database backup successful: {filename} ({result['raw_bytes']:,} -> {result['bytes']:,} bytes, "
+                    f"{ratio:.1f}x, {result['seconds']}s)")
+    return result
+
+class BackupJob:
+    """Handle for the dumps started by backup_databases; wait() reports and applies retention"""
+
+    def __init__(self, stage, backup_dir, keep_days, keep_weeks, logger):
+        self.stage = stage
+        self.backup_dir = backup_dir
+        self.keep_days = keep_days
+        self.keep_weeks = keep_weeks
+        self.logger = logger
+        self.threads = []
+        self.started_events = []
+        self.results = []
+        self.started_at = time.monotonic()
+        self._finished = False
+
+    def start(self, cmd, env, filename, db_name):
+        started = threading.Event()
+        thread = threading.Thread(
+            target=lambda: self.results.append(_dump_database(cmd, env, filename, db_name, self.logger, started)),
+            name=f"backup-{db_name}", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        self.started_events.append(started)
+
+    def wait_started(self, timeout=30.0):
+        """Wait until every dump has started streaming (its consistent snapshot is open)"""
+        deadline = time.monotonic() + timeout
+        return all(event.wait(max(0.0, deadline - time.monotonic())) for event in self.started_events)
+
+    def done(self):
+        return not any(thread.is_alive() for thread in self.threads)
+
+    def wait(self):
+        for thread in self.threads:
+            thread.join()
+        if not self._finished:
+            self._finished = True
+            elapsed = time.monotonic() - self.started_at
+            ok = [r for r in self.results if r["ok"]]
+            self.logger.info(f"Backup '{self.stage}' finished in {elapsed:.1f}s: {len(ok)}/{len(self.results)} databases, "
+                             f"{sum(r['bytes'] for r in ok):,} bytes on disk")
+            if self.keep_days is not None:
+                prune_backups(self.backup_dir, keep_days=self.keep_days, keep_weeks=self.keep_weeks, logger=self.logger)
+        return self.results
+
+def backup_databases(stage, logger=None, backup_dir=BACKUP_DIR, compress=True, wait=True,
+                     keep_days=7, keep_weeks=4):
     """
     Backs up the US and KR databases using mysqldump.
     stage: 'start' or 'end'
+    Both dumps run in parallel and are streamed through gzip (backup_*.sql.gz); a dump is kept
+    only if it ends with the mysqldump trailer. After the dumps, old backups are pruned
+    (see prune_backups; keep_days=None disables retention).
+    wait=False returns a BackupJob immediately instead of the list of per-database results.
     """
     if logger is None:
         logger = logging.getLogger("recorder")
@@ -25,33 +157,19 @@ def backup_databases(stage, logger=None):
     
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_dir = "records"
     os.makedirs(backup_dir, exist_ok=True)
     
     env = os.environ.copy()
     env['MYSQL_PWD'] = secret.db_passwd
 
-    import shutil
-    mysqldump_cmd = "mysqldump"
-    # Auto-detect mysqldump if not in PATH
-    if not shutil.which(mysqldump_cmd):
-        possible_paths = [
-            "/opt/homebrew/bin/mysqldump", 
-            "/usr/local/bin/mysqldump", 
-            "/usr/bin/mysqldump",
-            "/usr/local/opt/mysql-client/bin/mysqldump",
-            "/usr/local/opt/mysql@8.4/bin/mysqldump",
-            "/opt/homebrew/opt/mysql-client/bin/mysqldump"
-        ]
-        for path in possible_paths:
-            if os.path.exists(path):
-                mysqldump_cmd = path
-                break
+    mysqldump_cmd = _find_mysqldump()
+    suffix = ".sql.gz" if compress else ".sql"
+    job = BackupJob(stage, backup_dir, keep_days, keep_weeks, logger)
 
     for db_name in targets:
         if not db_name: continue
         
-        filename = f"{backup_dir}/backup_{db_name}_{timestamp}_{stage}.sql"
+        filename = f"{backup_dir}/backup_{db_name}_{timestamp}_{stage}{suffix}"
         cmd = [
             mysqldump_cmd,
             "-h", secret.db_ip,
@@ -61,35 +179,247 @@ def backup_databases(stage, logger=None):
             "--quick",
             db_name
         ]
-        
-        try:
-            with open(filename, 'w') as f:
-                subprocess.run(cmd, stdout=f, stderr=subprocess.PIPE, env=env, check=True)
-            
-            # Verify file size (Empty file means failure usually, as dump has headers)
-            if os.path.getsize(filename) == 0:
-                logger.error(f"Backup created but empty: {filename}")
-                if os.path.exists(filename):
-                    os.remove(filename)  # Clean up empty file
-            else:
-                logger.info(f"Database backup successful: {filename}")
+        job.start(cmd, env, filename, db_name)
 
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to backup {db_name}: {e.stderr.decode()}")
-            if os.path.exists(filename):
-                os.remove(filename) # Clean up empty/partial file
-        except Exception as e:
-            logger.error(f"Error during backup of {db_name}: {e}")
-            if os.path.exists(filename):
-                os.remove(filename) # Clean up empty file
+    if not wait:
+        return job
+    return job.wait()
+
+def prune_backups(backup_dir=BACKUP_DIR, keep_days=7, keep_weeks=4, now=None, logger=None):
+    """
+    Retention for backup_*.sql[.gz]: keep every file from the last keep_days days, plus the
+    newest day's files of each of the last keep_weeks ISO weeks (per database). Delete the rest.
+    Returns (deleted paths, bytes freed, bytes remaining).
+    """
+    if logger is None:
+        logger = logging.getLogger("recorder")
+    today = (now or datetime.now()).date()
+
+    by_db = {}
+    for name in os.listdir(backup_dir):
+        match = _BACKUP_NAME_RE.match(name)
+        if not match:
+            continue
+        day = datetime.strptime(match.group('date'), '%Y%m%d').date()
+        by_db.setdefault(match.group('db'), []).append((day, name))
+
+    deleted, freed, remaining = [], 0, 0
+    for db_name, files in by_db.items():
+        weekly_days = {}  # {(iso year, week): newest day}
+        for day, _ in files:
+            week = day.isocalendar()[:2]
+            weekly_days[week] = max(weekly_days.get(week, day), day)
+        kept_weeks = sorted(weekly_days, reverse=True)[:keep_weeks]
+        keep_weekly = {weekly_days[week] for week in kept_weeks}
+
+        for day, name in files:
+            path = os.path.join(backup_dir, name)
+            size = os.path.getsize(path)
+            if (today - day).days < keep_days or day in keep_weekly:
+                remaining += size
+                continue
+            os.remove(path)
+            deleted.append(path)
+            freed += size
+
+    if deleted:
+        logger.info(f"Pruned {len(deleted)} old backups ({freed:,} bytes freed)")
+    logger.info(f"Backup directory usage: {remaining:,} bytes")
+    return deleted, freed, remaining
+
+# --- Tick channel ---
+# get_last_price 결과만 별도 바이너리 파일에 가격이 바뀔 때만 기록.
+# Record: ts(float64), symbol_id(uint16), seq(uint32, 해당 심볼의 get_last_price 호출 순번), price(float64)
+# seq 덕분에 중복 가격을 생략해도 replay가 k번째 호출의 가격을 정확히 재현할 수 있음.
+# seq는 세션(recorder open)마다 0부터 다시 시작하므로, 열 때마다 .ticks.sym에 세션 경계
+# ({"session_id", "offset"}: 해당 세션 첫 레코드의 .ticks 바이트 오프셋)를 남긴다.
+TICK_METHOD = 'get_last_price'
+TICK_STRUCT = struct.Struct('<dHId')
+
+def tick_paths(record_path):
+    """records/market_data_x.jsonl[.gz] -> (records/market_data_x.ticks, records/market_data_x.ticks.sym)"""
+    base = record_path
+    for suffix in ('.gz', '.jsonl'):
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+    return base + '.ticks', base + '.ticks.sym'
+
+def _read_symbol_file(sym_path):
+    """({symbol: id}, [(session_id, tick byte offset)]) from a .ticks.sym file"""
+    symbols, sessions = {}, []
+    if os.path.exists(sym_path):
+        with open(sym_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partial line left by a crash
+                if 'symbol' in item:
+                    symbols[item['symbol']] = item['id']
+                elif 'session_id' in item:
+                    sessions.append((item['session_id'], item['offset']))
+    return symbols, sessions
+
+def _load_symbol_dict(sym_path):
+    return _read_symbol_file(sym_path)[0]
+
+class TickWriter:
+    """
+    Append-only fixed-width tick file plus symbol dictionary (JSON lines: {"id", "symbol"}).
+    Every open also appends a session boundary ({"session_id", "offset"}) to the dictionary.
+    """
+
+    def __init__(self, record_path, session_id=None):
+        self.path, self.sym_path = tick_paths(record_path)
+        self.symbols = _load_symbol_dict(self.sym_path)
+        self.f = open(self.path, 'ab')
+        # Drop a partially written record left by a crash so records stay aligned
+        misaligned = self.f.tell() % TICK_STRUCT.size
+        if misaligned:
+            self.f.truncate(self.f.tell() - misaligned)
+            self.f.seek(0, os.SEEK_END)
+        head = "\n" if _ends_mid_line(self.sym_path) else ""
+        self.sym_f = open(self.sym_path, 'a', encoding='utf-8')
+        self.sym_f.write(head + json.dumps({"session_id": session_id or new_session_id(),
+                                            "offset": self.f.tell()}) + "\n")
+        self.sym_f.flush()
+
+    def _symbol_id(self, symbol):
+        symbol_id = self.symbols.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbols[symbol] = symbol_id
+            self.sym_f.write(json.dumps({"id": symbol_id, "symbol": symbol}) + "\n")
+            self.sym_f.flush()
+        return symbol_id
+
+    def write_ticks(self, ticks):
+        """ticks: [(ts, symbol, seq, price)] -> one write()"""
+        data = b"".join(TICK_STRUCT.pack(ts, self._symbol_id(symbol), seq, price)
+                        for ts, symbol, seq, price in ticks)
+        self.f.write(data)
+        self.f.flush()
+        return len(data)
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+        self.sym_f.close()
+
+def read_ticks(record_path):
+    """
+    [(session_id, {symbol: [(seq, ts, price), ...]}), ...] in file order, one item per session
+    (seq restarts at 0 in each). Ticks written before session boundaries existed form one
+    session with session_id None. Missing files -> [].
+    """
+    path, sym_path = tick_paths(record_path)
+    if not os.path.exists(path):
+        return []
+    symbols, boundaries = _read_symbol_file(sym_path)
+    names = {symbol_id: symbol for symbol, symbol_id in symbols.items()}
+    with open(path, 'rb') as f:
+        data = f.read()
+    usable = len(data) - len(data) % TICK_STRUCT.size
+    if not boundaries or boundaries[0][1] > 0:
+        boundaries.insert(0, (None, 0))
+    sessions = []
+    for i, (session_id, start) in enumerate(boundaries):
+        end = boundaries[i + 1][1] if i + 1 < len(boundaries) else usable
+        ticks = {}
+        for ts, symbol_id, seq, price in TICK_STRUCT.iter_unpack(data[start:min(end, usable)]):
+            symbol = names.get(symbol_id)
+            if symbol is not None:
+                ticks.setdefault(symbol, []).append((seq, ts, price))
+        sessions.append((session_id, ticks))
+    return sessions
+
+FSYNC_NONE = 'none'          # OS page cache에 맡김 (flush만)
+FSYNC_BATCH = 'batch'        # 배치마다 fsync
+FSYNC_INTERVAL = 'interval'  # fsync_interval 초마다 fsync
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_BATCH, FSYNC_INTERVAL)
+
+# Backpressure: 큐가 가득 찼을 때의 처리 방식
+BACKPRESSURE_DROP_NEWEST = 'drop_newest'    # 새 엔트리 버림 (기존 동작)
+BACKPRESSURE_DROP_OLDEST = 'drop_oldest'    # 가장 오래된 엔트리를 버리고 새 엔트리 저장
+BACKPRESSURE_SAMPLE_TICKS = 'sample_ticks'  # 큐가 tick_shed_fraction 이상 차면 get_last_price만 버림
+BACKPRESSURE_BLOCK_ORDERS = 'block_orders'  # 주문 메서드는 block_timeout 초까지 대기, 나머지는 drop_newest
+BACKPRESSURE_POLICIES = (BACKPRESSURE_DROP_NEWEST, BACKPRESSURE_DROP_OLDEST,
+                         BACKPRESSURE_SAMPLE_TICKS, BACKPRESSURE_BLOCK_ORDERS)
+ORDER_METHODS = ('place_limit_buy_order', 'place_limit_sell_order', 'place_market_sell_order', 'sell_etf_for_cash')
 
 class AsyncDataRecorder:
 
-    def __init__(self, filename):
-        self.queue = queue.Queue(maxsize=10000) # Prevent Memory Overflow
+    def __init__(self, filename, batch_max_entries=500, batch_max_bytes=256 * 1024, batch_max_ms=200,
+                 fsync_policy=FSYNC_NONE, fsync_interval=5.0, frame_options=None, tick_channel=False,
+                 offset_index=False, queue_size=10000, backpressure=BACKPRESSURE_DROP_NEWEST,
+                 block_timeout=0.5, tick_shed_fraction=0.8, heartbeat_interval=60.0):
+        """
+        Writer thread drains the queue in batches (group commit) and writes each batch
+        with a single write+flush. A batch closes when any bound is hit:
+        batch_max_entries, batch_max_bytes, or batch_max_ms since its first entry.
+        On crash, loss is bounded to one batch window (plus un-fsynced data per fsync_policy).
+        A filename ending in '.gz' selects the compressed, seekable frame format;
+        frame_options (frame_max_bytes, frame_max_seconds, compresslevel) tune it, and a crash
+        then loses at most the unflushed tail frame.
+        tick_channel=True moves successful get_last_price results into a compact binary tick
+        file (see TickWriter), written only when a symbol's price changes.
+        offset_index=True maintains a (method, key, minute) -> byte offset sidecar
+        (library/recording_index.py) for plain JSONL; '.gz' files are indexed after the fact.
+        When the queue is full, backpressure selects what is lost (see BACKPRESSURE_*).
+        JSONL entries carry a 'seq' number, and a heartbeat meta record with the health counters
+        is written every heartbeat_interval seconds plus a 'session_end' trailer on close,
+        so a reader can tell whether the recording is complete.
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync_policy: {fsync_policy}")
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.queue = queue.Queue(maxsize=queue_size) # Prevent Memory Overflow
         self.stop_event = threading.Event()
         self.filename = filename
         self.logger = logging.getLogger("recorder")
+        self.batch_max_entries = batch_max_entries
+        self.batch_max_bytes = batch_max_bytes
+        self.batch_max_ms = batch_max_ms
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.frame_options = frame_options or {}
+        self.tick_channel = tick_channel
+        self.offset_index = offset_index
+        if offset_index and is_compressed(filename):
+            self.logger.warning("offset_index is only maintained for plain JSONL; use build_offset_index() for .gz")
+            self.offset_index = False
+        self._tick_calls = {}   # {symbol: get_last_price 호출 수}
+        self._tick_prices = {}  # {symbol: 마지막으로 기록한 가격}
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self._tick_shed_depth = max(1, int(queue_size * tick_shed_fraction))
+        self.heartbeat_interval = heartbeat_interval
+        self._seq = itertools.count()  # JSONL entry 번호 (drop된 것도 소비 -> replay에서 gap 검출)
+        self._seq_issued = 0
+        self.call_counters = []  # [(method, {args: calls})] from on_change / sampled wrappers
+        self.stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "dropped_orders": 0,
+            "queue_high_water": 0,
+            "max_write_ms": 0.0,
+            "heartbeats": 0,
+            "entries": 0,
+            "batches": 0,
+            "bytes": 0,
+            "fsyncs": 0,
+            "write_seconds": 0.0,
+            "max_batch_entries": 0,
+            "ticks": 0,
+            "tick_bytes": 0,
+            "ticks_skipped": 0,
+        }
+        self._started_at = time.time()
+        self._stats_logged = False  # close() can run twice: explicitly and from atexit
+        self.session_id = new_session_id()  # session_start / heartbeat / session_end에 기록
         
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(filename), exist_ok=True)
@@ -101,26 +431,138 @@ class AsyncDataRecorder:
         # Ensure file closes safely on program exit
         atexit.register(self.close)
 
-    def record(self, method_name, args, kwargs, result=None, error=None):
+    def record(self, method_name, args, kwargs, result=None, error=None, call_no=None):
+        """
+        call_no: per-(method, args) call number, passed by on_change / 1-in-N wrappers
+        (see apply_patches) so replay can serve the calls that were not recorded.
+        """
         try:
             # Timestamp must record 'call time' accurately (not Queue processing time)
+            ts = time.time()
+            tick_seq = None
+            if self.tick_channel and method_name == TICK_METHOD and len(args) == 1 and not kwargs:
+                symbol = args[0]
+                if call_no is None:
+                    tick_seq = self._tick_calls.get(symbol, 0)
+                    self._tick_calls[symbol] = tick_seq + 1
+                else:
+                    tick_seq = call_no
+                if error is None and isinstance(result, (int, float)) and not isinstance(result, bool):
+                    if self._tick_prices.get(symbol) == result:
+                        self.stats["ticks_skipped"] += 1
+                        return # Unchanged price: replay reuses the previous tick
+                    self._tick_prices[symbol] = result
+                    if not self._enqueue((ts, symbol, tick_seq, float(result)), method_name):
+                        # Dropped tick: forget the price so the next call is written again
+                        self._tick_prices.pop(symbol, None)
+                    return
+
+            seq = next(self._seq)
+            self._seq_issued = seq + 1
             entry = {
-                "ts": time.time(),
+                "ts": ts,
+                "seq": seq,
                 "method": method_name,
                 "args": list(args), # Convert tuple to list for JSON serialization
                 "kwargs": kwargs,
                 "result": self._serialize(result),
                 "error": str(error) if error else None
             }
-            # Non-blocking: If queue is full, drop log rather than stopping main logic (block=False)
-            self.queue.put_nowait(entry)
-        except queue.Full:
-            # Extreme case: Disk I/O too slow -> Queue full -> Drop log, prioritize trading
-            self.logger.error("Recorder queue full! Dropping log entry.")
+            if tick_seq is not None:
+                # Failed/None price lookups stay in JSONL with their call sequence
+                entry["tick_seq"] = tick_seq
+            elif call_no is not None:
+                entry["call_no"] = call_no
+            self._enqueue(entry, method_name)
         except Exception as e:
             # Logging failure should not crash the app, but we want to know about it
             self.logger.error(f"Failed to enqueue log: {e}")
 
+    def _enqueue(self, item, method_name):
+        """
+        Non-blocking put (block_orders waits up to block_timeout for order methods).
+        A full queue is handled per backpressure policy. Returns False if the item was dropped.
+        """
+        try:
+            if (self.backpressure == BACKPRESSURE_SAMPLE_TICKS and method_name == TICK_METHOD
+                    and self.queue.qsize() >= self._tick_shed_depth):
+                # Shed price ticks early so the remaining headroom is kept for account/order entries
+                self._drop(method_name)
+                return False
+            if self.backpressure == BACKPRESSURE_BLOCK_ORDERS and method_name in ORDER_METHODS:
+                self.queue.put(item, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(item)
+        except queue.Full:
+            if self.backpressure != BACKPRESSURE_DROP_OLDEST:
+                # Extreme case: Disk I/O too slow -> Queue full -> Drop log, prioritize trading
+                self._drop(method_name)
+                return False
+            try:
+                oldest = self.queue.get_nowait()
+                self.queue.task_done()
+                if isinstance(oldest, tuple):
+                    self._tick_prices.pop(oldest[1], None)
+                    self._drop(TICK_METHOD)
+                else:
+                    self._drop(oldest.get("method"))
+                self.queue.put_nowait(item)
+            except (queue.Empty, queue.Full):
+                self._drop(method_name)
+                return False
+        self.stats["enqueued"] += 1
+        depth = len(self.queue.queue)  # Lock-free read of the underlying deque (qsize() takes the mutex)
+        if depth > self.stats["queue_high_water"]:
+            self.stats["queue_high_water"] = depth
+        return True
+
+    def _drop(self, method_name):
+        self.stats["dropped"] += 1
+        if method_name in ORDER_METHODS:
+            self.stats["dropped_orders"] += 1
+        # Log the first drop and then every 1000th, not every entry
+        if self.stats["dropped"] % 1000 == 1:
+            self.logger.error(f"Recorder queue full! Dropping log entries ({self.backpressure}, "
+                              f"dropped={self.stats['dropped']}, last={method_name})")
+
+    def health(self):
+        """Counters written into heartbeat/trailer records and exposed to TradingSystem"""
+        written = self.stats["entries"] + self.stats["ticks"]
+        return {
+            "enqueued": self.stats["enqueued"],
+            "written": written,
+            "dropped": self.stats["dropped"],
+            "dropped_orders": self.stats["dropped_orders"],
+            "queue_depth": self.queue.qsize(),
+            "queue_high_water": self.stats["queue_high_water"],
+            "max_write_ms": round(self.stats["max_write_ms"], 3),
+            "avg_write_ms": round(self.stats["write_seconds"] * 1000 / self.stats["batches"], 3)
+                            if self.stats["batches"] else 0.0,
+            "seq_issued": self._seq_issued,
+            "backpressure": self.backpressure,
+        }
+
+    def _call_counts(self):
+        """[[method, args, calls]] for sparsely recorded methods, so replay knows the total call count"""
+        counts = []
+        for method_name, calls in self.call_counters:
+            for args, n in list(calls.items()):
+                counts.append([method_name, list(args), n])
+        return counts
+
+    def _write_meta(self, writer, meta_type):
+        """Heartbeat / trailer record (skipped by iter_recording unless include_meta=True)"""
+        meta = {"type": meta_type, "ts": time.time(), "session_id": self.session_id, "recorder": self.health()}
+        if meta_type == "session_end" and self.call_counters:
+            meta["call_counts"] = self._call_counts()
+        if meta_type == "session_end" and self.tick_channel:
+            # get_last_price calls per symbol, so replay knows where the next session's tick seq starts
+            meta["tick_calls"] = dict(list(self._tick_calls.items()))
+        line = json.dumps({"meta": meta}, default=str) + "\n"
+        writer.write_batch(line, None, None, 0)
+        if meta_type == "heartbeat":
+            self.stats["heartbeats"] += 1
+
     def _serialize(self, obj):
         # Handle objects not serializable like Order object
         if hasattr(obj, 'is_success'):
@@ -139,40 +581,158 @@ class AsyncDataRecorder:
 
     def _write_loop(self):
         """Background Worker"""
-        # Open file in append mode. 
-        # buffering=1 (line buffering) might not perfectly work with binary modes or some systems, 
-        # but for text files it's usually fine. We'll use default buffering but flush periodically or on writes.
+        # Sink opens in append mode; each batch is written with one write() + flush().
+        # '*.jsonl.gz' files are written as independently decompressible gzip frames (library/recording_io.py).
         try:
-            with open(self.filename, 'a', encoding='utf-8') as f:
-                # Basic metadata at start of session if file is empty
-                if f.tell() == 0:
-                    meta = {
-                        "meta": {
-                            "created_at": datetime.now().isoformat(),
-                            "type": "session_start"
-                        }
-                    }
-                    f.write(json.dumps(meta) + "\n")
-
+            # The index also covers this session's meta lines, from the session_start header on
+            start_offset = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+            writer = open_writer(self.filename, session_id=self.session_id, **self.frame_options)
+            tick_writer = TickWriter(self.filename, session_id=self.session_id) if self.tick_channel else None
+            index_writer = OffsetIndexWriter(self.filename, start_offset) if self.offset_index else None
+            try:
+                last_fsync = last_heartbeat = time.monotonic()
                 while not self.stop_event.is_set() or not self.queue.empty():
                     try:
-                        # 1s timeout to induce stop_event check
-                        entry = self.queue.get(timeout=1)
-                        f.write(json.dumps(entry, default=str) + "\n") # Handle datetime with default=str
-                        f.flush() # Ensure data is written to disk
-                        self.queue.task_done()
-                    except queue.Empty:
-                        continue
+                        if time.monotonic() - last_heartbeat >= self.heartbeat_interval:
+                            self._write_meta(writer, "heartbeat")
+                            last_heartbeat = time.monotonic()
+                        lines, ticks, first_ts, last_ts, keys = self._collect_batch()
+                        if ticks:
+                            self._write_ticks(tick_writer, ticks)
+                        if lines:
+                            base_offset = writer.offset if index_writer else None
+                            self._write_batch(writer, lines, first_ts, last_ts)
+                            if index_writer:
+                                index_writer.add_batch(base_offset, lines, keys)
+                        # A frame of a .jsonl.gz file ages out even while no new batch arrives
+                        frame_emitted = writer.flush_if_due()
+                        if not lines and not ticks and not frame_emitted:
+                            continue
+                        if self.fsync_policy == FSYNC_BATCH or (
+                                self.fsync_policy == FSYNC_INTERVAL
+                                and time.monotonic() - last_fsync >= self.fsync_interval):
+                            self._fsync(writer, tick_writer)
+                            last_fsync = time.monotonic()
                     except Exception as e:
                         self.logger.error(f"File Write Error: {e}")
+            finally:
+                try:
+                    self._write_meta(writer, "session_end")
+                except Exception as e:
+                    self.logger.error(f"Failed to write recorder trailer: {e}")
+                writer.flush()
+                if self.fsync_policy != FSYNC_NONE:
+                    self._fsync(writer, tick_writer)
+                writer.close()
+                if tick_writer:
+                    tick_writer.close()
+                if index_writer:
+                    index_writer.close(writer.offset)
         except Exception as e:
             self.logger.critical(f"FATAL: Recorder thread crashed. Logging stopped. Error: {e}")
 
+    def _fsync(self, writer, tick_writer=None):
+        os.fsync(writer.fileno())
+        if tick_writer:
+            os.fsync(tick_writer.fileno())
+        self.stats["fsyncs"] += 1
+
+    def _collect_batch(self):
+        """Drain queue into serialized lines (and raw ticks) until count/bytes/time bound is reached"""
+        try:
+            # 1s timeout to induce stop_event check
+            entry = self.queue.get(timeout=1)
+        except queue.Empty:
+            return [], [], None, None, []
+
+        deadline = time.monotonic() + self.batch_max_ms / 1000.0
+        lines = []
+        ticks = []
+        keys = []  # (method, key, ts) per line, only for offset_index
+        size = 0
+        first_ts = last_ts = None
+        while True:
+            try:
+                if isinstance(entry, tuple):
+                    ticks.append(entry)
+                    size += TICK_STRUCT.size
+                else:
+                    line = json.dumps(entry, default=json_default) + "\n" # Decimal/datetime -> tagged values
+                    lines.append(line)
+                    size += len(line)
+                    ts = entry.get("ts")
+                    if ts is not None:
+                        first_ts = ts if first_ts is None else first_ts
+                        last_ts = ts
+                    if self.offset_index:
+                        keys.append((entry.get("method"), entry_key(entry.get("args")), ts))
+            except Exception as e:
+                self.logger.error(f"Failed to serialize entry: {e}")
+            finally:
+                self.queue.task_done()
+
+            if len(lines) + len(ticks) >= self.batch_max_entries or size >= self.batch_max_bytes:
+                break
+            try:
+                entry = self.queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.stop_event.is_set():
+                    break
+                try:
+                    entry = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+        return lines, ticks, first_ts, last_ts, keys
+
+    def _write_batch(self, writer, lines, first_ts=None, last_ts=None):
+        start = time.perf_counter()
+        data = "".join(lines)
+        writer.write_batch(data, first_ts, last_ts, len(lines)) # One syscall per batch
+        elapsed = time.perf_counter() - start
+        self.stats["write_seconds"] += elapsed
+        self.stats["max_write_ms"] = max(self.stats["max_write_ms"], elapsed * 1000)
+        self.stats["entries"] += len(lines)
+        self.stats["batches"] += 1
+        self.stats["bytes"] += len(data)
+        self.stats["max_batch_entries"] = max(self.stats["max_batch_entries"], len(lines))
+
+    def _write_ticks(self, tick_writer, ticks):
+        start = time.perf_counter()
+        written = tick_writer.write_ticks(ticks)
+        elapsed = time.perf_counter() - start
+        self.stats["write_seconds"] += elapsed
+        self.stats["max_write_ms"] = max(self.stats["max_write_ms"], elapsed * 1000)
+        self.stats["ticks"] += len(ticks)
+        self.stats["tick_bytes"] += written
+
+    def get_stats(self):
+        """Writer throughput: entries/bytes per second of wall time and per second spent in write()"""
+        stats = dict(self.stats)
+        elapsed = max(time.time() - self._started_at, 1e-9)
+        write_seconds = max(stats["write_seconds"], 1e-9)
+        stats["elapsed_seconds"] = elapsed
+        stats["entries_per_sec"] = stats["entries"] / elapsed
+        stats["write_entries_per_sec"] = stats["entries"] / write_seconds if stats["entries"] else 0.0
+        stats["write_mb_per_sec"] = stats["bytes"] / write_seconds / 1e6 if stats["bytes"] else 0.0
+        stats["avg_batch_entries"] = stats["entries"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
     def close(self):
         """Graceful Shutdown"""
         self.stop_event.set()
         if self.worker_thread.is_alive():
             self.worker_thread.join(timeout=5) # Wait max 5s then exit
+        if (self.stats["entries"] or self.stats["ticks"]) and not self._stats_logged:
+            self._stats_logged = True
+            stats = self.get_stats()
+            self.logger.info(
+                f"Recorder wrote {stats['entries']} entries in {stats['batches']} batches "
+                f"(avg {stats['avg_batch_entries']:.1f}/batch, {stats['bytes']} bytes, "
+                f"{stats['write_entries_per_sec']:.0f} entries/s in write, fsyncs={stats['fsyncs']}); "
+                f"ticks written={stats['ticks']} ({stats['tick_bytes']} bytes), unchanged skipped={stats['ticks_skipped']}; "
+                f"dropped={stats['dropped']} (orders {stats['dropped_orders']}), queue high-water={stats['queue_high_water']}"
+            )
 
 def recordable(recorder):
     """
@@ -222,25 +782,164 @@ def recordable(recorder):
         return wrapper
     return decorator
 
-def apply_patches(recorder, classes_to_patch):
+# --- Per-method recording policy (apply_patches) ---
+RECORD_ALWAYS = 'always'        # 모든 호출 기록 (기본값)
+RECORD_ON_CHANGE = 'on_change'  # 같은 인자의 결과가 이전과 다를 때만 기록
+RECORD_OFF = 'off'              # 패치하지 않음 (오버헤드 0)
+# 정수 N: 같은 인자 호출 N번 중 1번만 기록 (1-in-N 샘플링)
+
+PATCH_TARGET_METHODS = [
+    'get_last_price', 'get_positions', 'get_positions_result',
+    'get_hashs', 'get_cash', 'get_account_result',
+    'get_market_hours', 'sell_etf_for_cash',
+    'place_limit_buy_order', 'place_limit_sell_order', 'place_market_sell_order',
+    'get_current_price'
+]
+
+_MISSING = object()
+
+def parse_record_policy(value):
+    """
+    'always' / 'on_change' / 'off' / 'N' or '1/N' (1-in-N sampling) -> policy.
+    Replay serves the calls 1/N skipped with the last sampled value, so a sampled method
+    replays approximately; use 'on_change' for methods a replay has to reproduce exactly.
+    """
+    if isinstance(value, int):
+        n = value
+    elif value in (RECORD_ALWAYS, RECORD_ON_CHANGE, RECORD_OFF):
+        return value
+    else:
+        try:
+            n = int(str(value).split('/', 1)[-1])
+        except ValueError:
+            raise ValueError(f"Unknown record policy: {value}")
+    if n < 1:
+        raise ValueError(f"Sampling rate must be >= 1: {value}")
+    return RECORD_ALWAYS if n == 1 else n
+
+def _make_recording_wrapper(recorder, func, method_name, policy):
+    """
+    Wrapper specialized per policy so the hot path only does what the policy needs:
+    no 'self' detection (patched methods always receive self), no argument copies.
+    Errors are always recorded.
     """
-    Applies the recordable decorator to a standard set of methods on the given classes.
+    record = recorder.record
+
+    if policy == RECORD_ALWAYS:
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception as e:
+                record(method_name, args, kwargs, error=e)
+                raise
+            record(method_name, args, kwargs, result=result)
+            return result
+        return wrapper
+
+    calls = {}  # {args: call count} - per-key call_no lets replay serve the skipped calls
+    recorder.call_counters.append((method_name, calls))
+
+    if policy == RECORD_ON_CHANGE:
+        last = {}
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if kwargs:
+                call_no = None
+            else:
+                try:
+                    call_no = calls.get(args, 0)
+                    calls[args] = call_no + 1
+                except TypeError:  # Unhashable args (e.g. positions dict): record every call
+                    call_no = None
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception as e:
+                if call_no is not None:
+                    last.pop(args, None)
+                record(method_name, args, kwargs, error=e, call_no=call_no)
+                raise
+            if call_no is not None:
+                if last.get(args, _MISSING) == result:
+                    return result
+                last[args] = result
+            record(method_name, args, kwargs, result=result, call_no=call_no)
+            return result
+        return wrapper
+
+    every = policy
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if kwargs:
+            call_no = None
+        else:
+            try:
+                call_no = calls.get(args, 0)
+                calls[args] = call_no + 1
+            except TypeError:
+                call_no = None
+        try:
+            result = func(self, *args, **kwargs)
+        except Exception as e:
+            record(method_name, args, kwargs, error=e, call_no=call_no)
+            raise
+        if call_no is None or call_no % every == 0:
+            record(method_name, args, kwargs, result=result, call_no=call_no)
+        return result
+    return wrapper
+
+def apply_patches(recorder, classes_to_patch, policies=None):
+    """
+    Wraps a standard set of manager methods on the given classes with recording wrappers.
+    policies: {method_name: 'always' | 'on_change' | 'off' | N} (default 'always').
+    'off' leaves the method unpatched.
     returns: Number of methods patched
     """
-    target_methods = [
-        'get_last_price', 'get_positions', 'get_positions_result', 
-        'get_hashs', 'get_cash', 'get_account_result', 
-        'get_market_hours', 'sell_etf_for_cash',
-        'place_limit_buy_order', 'place_limit_sell_order', 'place_market_sell_order',
-        'get_current_price'
-    ]
-    
+    policies = {name: parse_record_policy(policy) for name, policy in (policies or {}).items()}
     patched_count = 0
     for ManagerClass in classes_to_patch:
-        for method_name in target_methods:
-            if hasattr(ManagerClass, method_name):
-                original_method = getattr(ManagerClass, method_name)
-                # Apply decorator
-                setattr(ManagerClass, method_name, recordable(recorder)(original_method))
-                patched_count += 1
+        for method_name in PATCH_TARGET_METHODS:
+            policy = policies.get(method_name, RECORD_ALWAYS)
+            if policy == RECORD_OFF or not hasattr(ManagerClass, method_name):
+                continue
+            original_method = getattr(ManagerClass, method_name)
+            setattr(ManagerClass, method_name, _make_recording_wrapper(recorder, original_method, method_name, policy))
+            patched_count += 1
     return patched_count
+
+
+# --- DB read / clock capture (optional, same recording stream) ---
+DB_METHOD_PREFIX = 'db.'
+DB_READ_METHODS = [
+    'get_users', 'get_user_accounts', 'get_hash_value',
+    'get_active_trading_rules', 'get_all_trading_rules', 'get_periodic_rules',
+    'get_trade_today'
+]
+CLOCK_METHOD = 'clock.now'
+
+def capture_db_reads(recorder, db_classes, policies=None):
+    """
+    Records the DatabaseHandler reads TradingSystem depends on as 'db.<method>' entries,
+    so a replay can run without restoring the mysqldump backups.
+    policies: {method_name: policy} as in apply_patches (e.g. get_active_trading_rules='on_change').
+    returns: Number of methods patched
+    """
+    policies = {name: parse_record_policy(policy) for name, policy in (policies or {}).items()}
+    patched_count = 0
+    for db_class in db_classes:
+        for method_name in DB_READ_METHODS:
+            policy = policies.get(method_name, RECORD_ALWAYS)
+            if policy == RECORD_OFF or not hasattr(db_class, method_name):
+                continue
+            original_method = getattr(db_class, method_name)
+            setattr(db_class, method_name,
+                    _make_recording_wrapper(recorder, original_method, DB_METHOD_PREFIX + method_name, policy))
+            patched_count += 1
+    return patched_count
+
+def capture_clock(recorder, clock_class):
+    """Records clock_class.now() results as 'clock.now' entries (args: [tz] when given)"""
+    clock_class.now = _make_recording_wrapper(recorder, clock_class.now, CLOCK_METHOD, RECORD_ALWAYS)
+    return 1
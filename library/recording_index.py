@@ -0,0 +1,243 @@
+"""
+Sidecar offset index for recordings (`*.jsonl.oidx`, `*.jsonl.gz.oidx`).
+
+Each line maps one (method, key, minute) group to the byte offsets where matching
+entries start:
+    {"method": "get_cash", "key": "hash_a", "minute": 28409534, "offsets": [1234, 5678]}
+- key: first positional argument (symbol / account hash) when it is a scalar, else null
+- minute: int(ts // 60), unix minutes
+- offsets: line offsets in a plain JSONL file, or gzip frame offsets in a framed `.gz`
+  file (the frame is decompressed and filtered on read)
+
+AsyncDataRecorder(offset_index=True) appends one line per group per batch while
+writing plain JSONL; build_offset_index() creates the same file after the fact.
+Groups for the same key may repeat across batches; load_offset_index() merges them.
+
+Coverage lines record which byte ranges of the recording have been indexed:
+    {"range": [start, end]}
+A recording that keeps growing (or was indexed while still being written) has uncovered
+ranges; update_offset_index() indexes just those, and query_recording() calls it first.
+"""
+import json
+import os
+from collections import defaultdict
+
+from library.recording_io import is_compressed, iter_frames, _parse_line, _ends_mid_line
+
+OFFSET_INDEX_SUFFIX = '.oidx'
+
+
+def offset_index_path(path):
+    return path + OFFSET_INDEX_SUFFIX
+
+
+def entry_key(args):
+    """First positional argument if it is a plain scalar (symbol, hash), else None"""
+    if args and isinstance(args[0], (str, int, float)) and not isinstance(args[0], bool):
+        return args[0]
+    return None
+
+
+def _group(items):
+    """[(method, key, ts, offset)] -> index lines (str) grouped by (method, key, minute)"""
+    groups = defaultdict(list)
+    for method, key, ts, offset in items:
+        if method is None or ts is None:
+            continue
+        offsets = groups[(method, key, int(ts // 60))]
+        if not offsets or offsets[-1] != offset:
+            offsets.append(offset)
+    return [json.dumps({"method": m, "key": k, "minute": minute, "offsets": offsets}) + "\n"
+            for (m, k, minute), offsets in groups.items()]
+
+
+def _range_line(start, end):
+    return json.dumps({"range": [start, end]}) + "\n"
+
+
+def _count(items):
+    return sum(1 for method, _, ts, _ in items if method is not None and ts is not None)
+
+
+class OffsetIndexWriter:
+    """
+    Incremental index for a plain JSONL recording, fed batch by batch by the recorder.
+    start_offset: file size when the recorder opened it; the coverage lines then also span the
+    meta lines the recorder writes around its batches (header, heartbeats, trailer).
+    """
+
+    def __init__(self, record_path, start_offset=None):
+        self.path = offset_index_path(record_path)
+        self.indexed_to = start_offset
+        head = "\n" if _ends_mid_line(self.path) else ""
+        self.f = open(self.path, 'a', encoding='utf-8')
+        self.f.write(head)
+
+    def add_batch(self, base_offset, lines, keys):
+        """
+        base_offset: file size before the batch was written
+        lines / keys: serialized lines and their (method, key, ts), same order
+        json.dumps escapes non-ASCII, so len(line) is its byte length.
+        """
+        items = []
+        offset = base_offset
+        for line, (method, key, ts) in zip(lines, keys):
+            items.append((method, key, ts, offset))
+            offset += len(line)
+        start = base_offset if self.indexed_to is None else self.indexed_to
+        self.f.write("".join(_group(items)) + _range_line(start, offset))
+        self.f.flush()
+        self.indexed_to = offset
+
+    def close(self, end_offset=None):
+        """end_offset: file size after the recorder's last write (covers the trailer)"""
+        if end_offset is not None and self.indexed_to is not None and end_offset > self.indexed_to:
+            self.f.write(_range_line(self.indexed_to, end_offset))
+        self.f.close()
+
+
+def _scan(path, start=0, end=None):
+    """
+    (items, scanned_to) for the entries that start in [start, end): complete lines of a
+    plain JSONL file, or complete gzip frames. scanned_to is where the next scan resumes.
+    """
+    items = []
+    with open(path, 'rb') as f:
+        f.seek(start)
+        offset = start
+        if is_compressed(path):
+            for frame_offset, size, raw in iter_frames(f):
+                if end is not None and frame_offset >= end:
+                    break
+                for line in raw.decode('utf-8').splitlines():
+                    entry = _parse_line(line)
+                    if entry and 'meta' not in entry:
+                        items.append((entry.get('method'), entry_key(entry.get('args')), entry.get('ts'), frame_offset))
+                offset = frame_offset + size
+        else:
+            for raw_line in f:
+                if (end is not None and offset >= end) or not raw_line.endswith(b"\n"):
+                    break  # End of the range, or a line that is still being written
+                entry = _parse_line(raw_line.decode('utf-8', errors='replace'))
+                if entry and 'meta' not in entry:
+                    items.append((entry.get('method'), entry_key(entry.get('args')), entry.get('ts'), offset))
+                offset += len(raw_line)
+    return items, offset
+
+
+def build_offset_index(path):
+    """(Re)build the sidecar index by scanning the recording. Returns the number of indexed entries."""
+    items, scanned_to = _scan(path)
+    tmp_path = offset_index_path(path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("".join(_group(items)) + _range_line(0, scanned_to))
+    os.replace(tmp_path, offset_index_path(path))
+    return _count(items)
+
+
+def _read_sidecar(path):
+    """({(method, key, minute): [offsets...]}, [(start, end) covered byte ranges])"""
+    index = defaultdict(list)
+    ranges = []
+    with open(offset_index_path(path), 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial line left by a crash
+            if 'range' in item:
+                ranges.append(tuple(item['range']))
+            else:
+                index[(item['method'], item['key'], item['minute'])].extend(item['offsets'])
+    return index, ranges
+
+
+def load_offset_index(path):
+    """{(method, key, minute): [offsets...]} merged across batches (ignores a partial line)"""
+    return _read_sidecar(path)[0]
+
+
+def update_offset_index(path):
+    """
+    Bring the sidecar up to date with the recording and return the number of newly indexed
+    entries. Only the byte ranges no coverage line mentions are scanned (a grown file, or the
+    meta lines between recorder batches). A missing sidecar, one without coverage lines
+    (written before they existed) or one covering more than the file holds (the recording
+    was replaced) is rebuilt.
+    """
+    index_path = offset_index_path(path)
+    if not os.path.exists(index_path):
+        return build_offset_index(path)
+    _, ranges = _read_sidecar(path)
+    size = os.path.getsize(path)
+    if not ranges or max(end for _, end in ranges) > size:
+        return build_offset_index(path)
+
+    gaps = []
+    covered = 0
+    for start, end in sorted(ranges):
+        if start > covered:
+            gaps.append((covered, start))
+        covered = max(covered, end)
+    if covered < size:
+        gaps.append((covered, None))
+
+    lines = []
+    added = 0
+    for start, end in gaps:
+        items, scanned_to = _scan(path, start, end)
+        if scanned_to > start:
+            lines.extend(_group(items))
+            lines.append(_range_line(start, scanned_to))
+            added += _count(items)
+    if lines:
+        head = "\n" if _ends_mid_line(index_path) else ""
+        with open(index_path, 'a', encoding='utf-8') as f:
+            f.write(head + "".join(lines))
+    return added
+
+
+def _read_at(f, path, offset):
+    """Entries starting at offset: one line for JSONL, the whole frame for .gz"""
+    f.seek(offset)
+    if not is_compressed(path):
+        entry = _parse_line(f.readline().decode('utf-8', errors='replace'))
+        return [entry] if entry else []
+    for _, _, raw in iter_frames(f):
+        return [e for e in map(_parse_line, raw.decode('utf-8').splitlines()) if e]
+    return []
+
+
+def query_recording(path, method, key=None, start_ts=None, end_ts=None, index=None):
+    """
+    Matching entries in file order, reading only the indexed offsets.
+    key=None matches any key. The sidecar is built on first use and extended over whatever
+    the recording gained since it was last indexed (update_offset_index).
+    """
+    if index is None:
+        update_offset_index(path)
+        index = load_offset_index(path)
+
+    lo = None if start_ts is None else int(start_ts // 60)
+    hi = None if end_ts is None else int(end_ts // 60)
+    offsets = set()
+    for (m, k, minute), group in index.items():
+        if m != method or (key is not None and k != key):
+            continue
+        if (lo is not None and minute < lo) or (hi is not None and minute > hi):
+            continue
+        offsets.update(group)
+
+    results = []
+    with open(path, 'rb') as f:
+        for offset in sorted(offsets):
+            for entry in _read_at(f, path, offset):
+                if entry.get('method') != method or 'meta' in entry:
+                    continue
+                if key is not None and entry_key(entry.get('args')) != key:
+                    continue
+                ts = entry.get('ts')
+                if ts is None or (start_ts is not None and ts < start_ts) or (end_ts is not None and ts > end_ts):
+                    continue
+                results.append(entry)
+    return results
@@ -0,0 +1,384 @@
+"""
+Recording file formats for AsyncDataRecorder.
+
+- JSONL (`*.jsonl`): one JSON entry per line (기존 포맷).
+- Framed gzip (`*.jsonl.gz`): 여러 엔트리를 하나의 gzip member(frame)로 압축해 이어 붙임.
+  각 frame은 독립적으로 해제 가능하므로 크래시 시 마지막 frame만 손실됨.
+  파일 전체는 일반 `gzip.open`/`zcat`으로도 그대로 읽힘 (concatenated members).
+  사이드카 인덱스(`*.jsonl.gz.idx`)에 frame별 offset/size/first_ts/last_ts를 JSONL로 기록해
+  하루치를 모두 해제하지 않고 특정 시각으로 seek 가능.
+"""
+import decimal
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+import zlib
+from datetime import date, datetime, time as dt_time
+
+GZIP_SUFFIX = '.gz'
+INDEX_SUFFIX = '.idx'
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+logger = logging.getLogger("recorder")
+
+
+# --- Value encoding ---
+# DB rows and Clock.now() results contain Decimal / datetime values. They are written as
+# single-key tagged objects so replay gets back the same types instead of str().
+_DECIMAL_TAG = '$decimal'
+_DATETIME_TAG = '$datetime'
+_DATE_TAG = '$date'
+_TIME_TAG = '$time'
+
+
+def json_default(obj):
+    """json.dumps default hook: tag Decimal/datetime/date/time, str() for anything else"""
+    if isinstance(obj, decimal.Decimal):
+        return {_DECIMAL_TAG: str(obj)}
+    if isinstance(obj, datetime):
+        return {_DATETIME_TAG: obj.isoformat()}
+    if isinstance(obj, date):
+        return {_DATE_TAG: obj.isoformat()}
+    if isinstance(obj, dt_time):
+        return {_TIME_TAG: obj.isoformat()}
+    return str(obj)
+
+
+def decode_value(value):
+    """Inverse of json_default on a parsed JSON value (recursive)"""
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            tag, raw = next(iter(value.items()))
+            if tag == _DECIMAL_TAG:
+                return decimal.Decimal(raw)
+            if tag == _DATETIME_TAG:
+                return datetime.fromisoformat(raw)
+            if tag == _DATE_TAG:
+                return date.fromisoformat(raw)
+            if tag == _TIME_TAG:
+                return dt_time.fromisoformat(raw)
+        return {k: decode_value(v) for k, v in value.items()}
+    return value
+
+
+def is_compressed(path):
+    return path.endswith(GZIP_SUFFIX)
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def session_meta(session_id=None):
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "type": "session_start",
+            "session_id": session_id or new_session_id()
+        }
+    }
+
+
+def _ends_mid_line(path):
+    """True if a non-empty file does not end with a newline (crash mid-write)"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+    except FileNotFoundError:
+        return False
+
+
+class JsonlWriter:
+    """
+    Plain JSONL sink (append mode, one write+flush per batch).
+    Every open starts with a session_start meta, so a restart that appends to the same
+    day's file is a separate session (its seq / call_no numbering starts again at 0).
+    """
+
+    def __init__(self, path, session_id=None):
+        self.path = path
+        self.session_id = session_id or new_session_id()
+        # Terminate a partial last line so the new header is not glued onto it
+        head = "\n" if _ends_mid_line(path) else ""
+        self.f = open(path, 'a', encoding='utf-8')
+        self.f.write(head + json.dumps(session_meta(self.session_id)) + "\n")
+        self.f.flush()
+        self.offset = os.path.getsize(path)  # Byte offset of the next batch (for the offset index)
+
+    def write_batch(self, data, first_ts, last_ts, entries):
+        self.f.write(data)
+        self.f.flush()
+        self.offset += len(data)  # json.dumps output is ASCII
+
+    def flush(self):
+        self.f.flush()
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def flush_if_due(self):
+        """Batches are written as they arrive: nothing is ever pending"""
+        return False
+
+    def close(self):
+        self.f.close()
+
+
+class FramedGzipWriter:
+    """
+    Batches are accumulated into a frame; a frame is emitted as one gzip member
+    once it reaches frame_max_bytes (uncompressed) or frame_max_seconds, or on close.
+    The age check runs on every write_batch and on flush_if_due(), which the recorder calls
+    on every writer loop iteration so an idle recorder still emits its pending frame.
+    Pending batches live only in memory: fsync covers emitted frames only.
+    After each frame, one index line is appended to the sidecar index.
+    The first frame of every open starts with a session_start meta (see JsonlWriter).
+    """
+
+    def __init__(self, path, frame_max_bytes=256 * 1024, frame_max_seconds=10.0, compresslevel=6,
+                 session_id=None):
+        self.path = path
+        self.session_id = session_id or new_session_id()
+        self.frame_max_bytes = frame_max_bytes
+        self.frame_max_seconds = frame_max_seconds
+        self.compresslevel = compresslevel
+        self.f = open(path, 'ab')
+        self.idx = open(index_path(path), 'a', encoding='utf-8')
+        self._reset_frame()
+        self.frames = 0
+        self.compressed_bytes = 0
+        self._pending.append(json.dumps(session_meta(self.session_id)) + "\n")
+        self._pending_bytes = len(self._pending[0])
+
+    def _reset_frame(self):
+        self._pending = []
+        self._pending_bytes = 0
+        self._pending_entries = 0
+        self._first_ts = None
+        self._last_ts = None
+        self._frame_started = time.monotonic()
+
+    def write_batch(self, data, first_ts, last_ts, entries):
+        if self._pending_entries == 0:
+            self._frame_started = time.monotonic()
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        self._pending_entries += entries
+        if first_ts is not None and self._first_ts is None:
+            self._first_ts = first_ts
+        if last_ts is not None:
+            self._last_ts = last_ts
+        if self._pending_bytes >= self.frame_max_bytes:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """Emit the pending frame once it is frame_max_seconds old. Returns True if a frame was written."""
+        if self._pending and time.monotonic() - self._frame_started >= self.frame_max_seconds:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """Emit pending batches as one independently decompressible frame"""
+        if not self._pending:
+            return
+        raw = "".join(self._pending).encode('utf-8')
+        frame = gzip.compress(raw, compresslevel=self.compresslevel, mtime=0)
+        offset = self.f.tell()
+        self.f.write(frame)
+        self.f.flush()
+        self.idx.write(json.dumps({
+            "offset": offset,
+            "size": len(frame),
+            "raw_size": len(raw),
+            "entries": self._pending_entries,
+            "first_ts": self._first_ts,
+            "last_ts": self._last_ts,
+        }) + "\n")
+        self.idx.flush()
+        self.frames += 1
+        self.compressed_bytes += len(frame)
+        self._reset_frame()
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+        self.idx.close()
+
+
+def open_writer(path, session_id=None, **frame_options):
+    if is_compressed(path):
+        return FramedGzipWriter(path, session_id=session_id, **frame_options)
+    return JsonlWriter(path, session_id=session_id)
+
+
+# --- Reading ---
+
+def read_index(path):
+    """Sidecar index entries, ignoring a partially written last line"""
+    entries = []
+    try:
+        with open(index_path(path), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    except FileNotFoundError:
+        return []
+    return entries
+
+
+def iter_frames(f, chunk_size=64 * 1024):
+    """
+    Yield (offset, size, raw_bytes) for each complete gzip member from the current position.
+    A truncated tail member (crash mid-write) is dropped with a warning.
+    """
+    offset = f.tell()
+    consumed = 0
+    d = zlib.decompressobj(_GZIP_WBITS)
+    pending = []
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        while chunk:
+            try:
+                pending.append(d.decompress(chunk))
+            except zlib.error as e:
+                logger.warning(f"Corrupt frame at offset {offset}: {e}")
+                return
+            if d.eof:
+                consumed += len(chunk) - len(d.unused_data)
+                yield offset, consumed, b"".join(pending)
+                offset += consumed
+                consumed = 0
+                chunk = d.unused_data
+                d = zlib.decompressobj(_GZIP_WBITS)
+                pending = []
+            else:
+                consumed += len(chunk)
+                chunk = b""
+    if consumed:
+        logger.warning(f"Dropping truncated tail frame at offset {offset} ({consumed} bytes)")
+
+
+def _parse_line(line):
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        # Partial last line (crash mid-write) - skip
+        return None
+
+
+def _iter_lines(path, start_ts):
+    if not is_compressed(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from f
+        return
+
+    start_offset = 0
+    if start_ts is not None:
+        frames = read_index(path)
+        for frame in frames:
+            if frame.get('last_ts') is not None and frame['last_ts'] >= start_ts:
+                start_offset = frame['offset']
+                break
+        else:
+            # All indexed frames end before start_ts - continue from the unindexed tail
+            if frames:
+                start_offset = frames[-1]['offset'] + frames[-1]['size']
+
+    with open(path, 'rb') as f:
+        f.seek(start_offset)
+        for _, _, raw in iter_frames(f):
+            yield from raw.decode('utf-8').splitlines()
+
+
+def iter_recording(path, start_ts=None, end_ts=None, include_meta=False):
+    """
+    Yield recorded entries (dict) in file order, optionally limited to [start_ts, end_ts].
+    For framed gzip files with an index, seeks directly to the first frame whose last_ts >= start_ts
+    instead of decompressing the whole day.
+    """
+    seek_ts = None if include_meta else start_ts
+    for line in _iter_lines(path, seek_ts):
+        entry = _parse_line(line)
+        if entry is None:
+            continue
+        if 'meta' in entry:
+            if include_meta:
+                yield entry
+            continue
+        ts = entry.get('ts')
+        if ts is not None:
+            if start_ts is not None and ts < start_ts:
+                continue
+            if end_ts is not None and ts > end_ts:
+                return
+        yield entry
+
+
+def build_index(path):
+    """Rebuild the sidecar index of a framed gzip file by scanning its members"""
+    count = 0
+    with open(path, 'rb') as f, open(index_path(path), 'w', encoding='utf-8') as idx:
+        for offset, size, raw in iter_frames(f):
+            entries = [_parse_line(line) for line in raw.decode('utf-8').splitlines()]
+            timestamps = [e['ts'] for e in entries if e and e.get('ts') is not None]
+            idx.write(json.dumps({
+                "offset": offset,
+                "size": size,
+                "raw_size": len(raw),
+                "entries": len(timestamps),
+                "first_ts": timestamps[0] if timestamps else None,
+                "last_ts": timestamps[-1] if timestamps else None,
+            }) + "\n")
+            count += 1
+    return count
+
+
+def convert_jsonl_to_framed(src, dst=None, frame_max_bytes=256 * 1024, compresslevel=6):
+    """Convert a plain JSONL recording into framed gzip (+ index). Returns (dst, frames)."""
+    dst = dst or src + GZIP_SUFFIX
+    for p in (dst, index_path(dst)):
+        if os.path.exists(p):
+            os.remove(p)
+
+    writer = FramedGzipWriter(dst, frame_max_bytes=frame_max_bytes, frame_max_seconds=float('inf'),
+                              compresslevel=compresslevel)
+    # Source file carries its own meta header - drop the one generated for the new file
+    writer._reset_frame()
+    with open(src, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if not line.endswith("\n"):
+                line += "\n"
+            try:
+                ts = json.loads(line).get('ts')
+            except json.JSONDecodeError:
+                continue
+            writer.write_batch(line, ts, ts, 0 if ts is None else 1)
+    writer.close()
+    return dst, writer.frames
@@ -0,0 +1,538 @@
+"""
+Deterministic session replay driven by recorder output (records/market_data_*.jsonl[.gz]).
+
+ReplaySession loads a recording and serves each manager call from it, keyed by
+(method, args, kwargs) in call order. ReplayManager exposes the SchwabManager/KoreaManager
+method surface on top of a session, and the session's MockClock jumps to each served
+entry's `ts` so TradingSystem sees recorded time without real sleeps.
+Orders placed during replay are compared against the recorded ones (diff_orders).
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+
+from library.clock import MockClock
+from library.recording_io import iter_recording, json_default, decode_value
+from library.recorder import TICK_METHOD, CLOCK_METHOD, DB_METHOD_PREFIX, read_ticks
+
+# place_market_sell_order는 sell_etf_for_cash 내부에서만 호출되므로 diff 대상에서 제외
+ORDER_METHODS = ('place_limit_buy_order', 'place_limit_sell_order', 'sell_etf_for_cash')
+
+
+class ReplayExhausted(Exception):
+    """Recording has no (more) response for this call"""
+
+
+class RecordingHealth:
+    """
+    Gap detection from recorder seq numbers and heartbeat/trailer meta records.
+    A recording is gapless when no entry seq is missing, no drop was counted and
+    every session ended with a 'session_end' trailer. seq restarts at 0 in each session of an
+    appended file; the gap check restarts at every session_start meta, and at a seq that drops
+    back to 0 (files appended to before every open wrote a session_start). The head (seq 0) and
+    the trailer are not checked when the replay is cut at start_ts / end_ts. Files written
+    before seq numbers existed report gapless=None (unknown).
+    """
+
+    def __init__(self, expect_head=True, expect_trailer=True):
+        self.expect_head = expect_head
+        self.expect_trailer = expect_trailer
+        self.sessions = 0
+        self.sequenced = False
+        self.seq_gaps = []  # [last seen seq, next seq] (next = seq_issued for a lost tail)
+        self.dropped = 0
+        self.unterminated = 0
+        self._last_seq = None
+        self._session_dropped = 0
+        self._session_ended = True
+
+    def _close_session(self):
+        self.dropped += self._session_dropped
+        if not self._session_ended and self.expect_trailer:
+            self.unterminated += 1
+
+    def start_session(self):
+        if self.sessions:
+            self._close_session()
+        self.sessions += 1
+        self._last_seq = None
+        self._session_dropped = 0
+        self._session_ended = False
+
+    def observe_meta(self, meta):
+        meta_type = meta.get('type')
+        if meta_type == 'session_start':
+            self.start_session()
+            return
+        counters = meta.get('recorder') or {}
+        self._session_dropped = max(self._session_dropped, counters.get('dropped', 0))
+        if meta_type == 'session_end':
+            self._session_ended = True
+            issued = counters.get('seq_issued')
+            if issued is not None and self._last_seq is not None and issued > self._last_seq + 1:
+                self.seq_gaps.append([self._last_seq, issued])
+
+    def observe_seq(self, seq):
+        """Returns True when seq starts a session that has no session_start meta"""
+        self.sequenced = True
+        implicit = seq == 0 and self._last_seq is not None
+        if implicit:
+            self.sessions = self.sessions or 1  # a headerless first session
+            self.start_session()
+        if self._last_seq is None:
+            if self.expect_head and self.sessions and seq != 0:
+                self.seq_gaps.append([-1, seq])  # Oldest entries evicted (drop_oldest)
+        elif seq != self._last_seq + 1:
+            self.seq_gaps.append([self._last_seq, seq])
+        self._last_seq = seq
+        return implicit
+
+    def to_dict(self):
+        self._close_session()
+        self._session_dropped = 0
+        self._session_ended = True
+        return {
+            "sessions": self.sessions,
+            "sequenced": self.sequenced,
+            "seq_gaps": self.seq_gaps,
+            "dropped": self.dropped,
+            "unterminated_sessions": self.unterminated,
+            "gapless": (not self.seq_gaps and not self.dropped and not self.unterminated) if self.sequenced else None,
+        }
+
+
+class ReplayOrder:
+    """Order response rebuilt from a recording (mirrors `is_success` of the real response)"""
+
+    def __init__(self, is_success, order_id=None, raw=None):
+        self.is_success = is_success
+        self.order_id = order_id
+        self.raw = raw
+
+    def to_dict(self):
+        return {"order_id": self.order_id, "replay": True}
+
+    def __repr__(self):
+        return f"ReplayOrder(is_success={self.is_success}, order_id={self.order_id})"
+
+
+def make_key(method, args, kwargs):
+    # json_default: live Decimal/datetime args produce the same JSON as their recorded (tagged) form
+    return (method, json.dumps(list(args), sort_keys=True, default=json_default),
+            json.dumps(kwargs or {}, sort_keys=True, default=json_default))
+
+
+def ts_to_datetime(ts):
+    # Local-time aware datetime, same wall clock the trader saw while recording
+    return datetime.fromtimestamp(ts).astimezone()
+
+
+class ReplayClock(MockClock):
+    """
+    MockClock that answers now() from recorded 'clock.now' entries (recorder capture_clock)
+    while they last, then falls back to the mocked time advanced by served entries.
+    """
+
+    def __init__(self, session, fixed_time):
+        super().__init__(fixed_time)
+        self.session = session
+
+    def mocked_now(self):
+        return MockClock.now(self)
+
+    def now(self, tz=None):
+        args = [tz] if tz is not None else []
+        if self.session.has_response(CLOCK_METHOD, args):
+            return self.session.serve(CLOCK_METHOD, args)
+        return super().now(tz)
+
+
+class ReplaySession:
+    def __init__(self, path, start_ts=None, end_ts=None, logger=None):
+        self.path = path
+        self.logger = logger or logging.getLogger("replay")
+        self.responses = defaultdict(deque)  # {key: deque(entry)}
+        # on_change / 1-in-N recorded methods: {key: ([call_no...], [entry...])}; the k-th call
+        # gets the latest entry with call_no <= k (same idea as the tick channel)
+        self.sparse = defaultdict(lambda: ([], []))
+        self._sparse_calls = Counter()
+        self._sparse_total = {}  # {key: total calls} from session_end call_counts
+        self._sparse_base = {}   # {key: call_no offset of the current session (appended files)}
+        self.recorded_orders = []
+        self.produced_orders = []
+        self.entry_count = 0
+        self.stats = Counter()
+        self.health = RecordingHealth(expect_head=start_ts is None, expect_trailer=end_ts is None)
+
+        first_ts = None
+        session_id = None
+        tick_calls = {}      # {session_id: {symbol: get_last_price calls}} from session_end trailers
+        failed_lookups = []  # [(session_id, entry)] get_last_price entries with a tick_seq
+        for entry in iter_recording(path, start_ts=start_ts, end_ts=end_ts, include_meta=True):
+            if 'meta' in entry:
+                meta = entry['meta']
+                self.health.observe_meta(meta)
+                self._observe_call_counts(meta)
+                if meta.get('type') == 'session_start':
+                    session_id = meta.get('session_id')
+                elif meta.get('type') == 'session_end' and session_id is not None:
+                    calls = dict(meta.get('tick_calls') or {})
+                    calls.update({args[0]: n for method, args, n in meta.get('call_counts', [])
+                                  if method == TICK_METHOD and len(args) == 1})
+                    tick_calls[session_id] = calls
+                continue
+            method = entry.get('method')
+            if method is None:
+                continue
+            if entry.get('seq') is not None and self.health.observe_seq(entry['seq']):
+                self._start_session()
+            self.entry_count += 1
+            if first_ts is None and entry.get('ts') is not None:
+                first_ts = entry['ts']
+            key = make_key(method, entry.get('args', []), entry.get('kwargs'))
+            if entry.get('call_no') is not None:
+                call_nos, entries = self.sparse[key]
+                call_nos.append(entry['call_no'] + self._sparse_base.get(key, 0))
+                entries.append(entry)
+            else:
+                self.responses[key].append(entry)
+            if entry.get('tick_seq') is not None:
+                failed_lookups.append((session_id, entry))
+            if method in ORDER_METHODS:
+                self.recorded_orders.append(entry)
+
+        self.recording_health = self.health.to_dict()
+        if self.recording_health['gapless'] is False:
+            self.logger.warning(f"[REPLAY] Recording has gaps: {self.recording_health}")
+
+        # Tick channel (recorder tick_channel=True): {symbol: [(seq, ts, price)]}, only price changes
+        self.ticks = {}
+        self._tick_limit = {}  # {symbol: total get_last_price calls}, known when the last session has a trailer
+        self._load_ticks(read_ticks(path), tick_calls, failed_lookups)
+        self._tick_seqs = {symbol: [seq for seq, _, _ in ticks] for symbol, ticks in self.ticks.items()}
+        self._price_calls = Counter()
+        if first_ts is None and self.ticks:
+            first_ts = min(ticks[0][1] for ticks in self.ticks.values())
+
+        self.db_methods = {key[0][len(DB_METHOD_PREFIX):] for key in list(self.responses) + list(self.sparse)
+                           if key[0].startswith(DB_METHOD_PREFIX)}
+        self.db_writes = []
+        self.clock = ReplayClock(self, ts_to_datetime(first_ts if first_ts is not None else time.time()))
+
+    def _load_ticks(self, sessions, tick_calls, failed_lookups):
+        """
+        Join the tick sessions into one call sequence per symbol. seq restarts at 0 in every
+        session, so each session is shifted by the calls of the sessions before it: the trailer's
+        tick_calls, or the last recorded seq + 1 for a session that has no trailer.
+        """
+        failed = defaultdict(list)
+        for session_id, entry in failed_lookups:
+            failed[session_id].append(entry)
+        offsets = Counter()
+        calls = {}
+        for session_id, ticks in sessions:
+            calls = tick_calls.get(session_id, {}) if session_id is not None else {}
+            last = {symbol: symbol_ticks[-1][0] for symbol, symbol_ticks in ticks.items()}
+            for entry in failed.pop(session_id, []):
+                symbol = entry['args'][0]
+                last[symbol] = max(last.get(symbol, -1), entry['tick_seq'])
+                entry['tick_seq'] += offsets[symbol]
+            for symbol, symbol_ticks in ticks.items():
+                offset = offsets[symbol]
+                self.ticks.setdefault(symbol, []).extend((seq + offset, ts, price) for seq, ts, price in symbol_ticks)
+            for symbol in set(last) | set(calls):
+                offsets[symbol] += calls.get(symbol, last.get(symbol, -1) + 1)
+        if calls:
+            self._tick_limit = {symbol: offsets[symbol] for symbol in self.ticks}
+
+    def _start_session(self):
+        # Next session in the same file restarts call_no at 0: its calls follow the previous session's
+        for key, (call_nos, _) in self.sparse.items():
+            self._sparse_base[key] = max(self._sparse_total.get(key, 0), call_nos[-1] + 1 if call_nos else 0)
+
+    def _observe_call_counts(self, meta):
+        if meta.get('type') == 'session_start':
+            self._start_session()
+        elif meta.get('type') == 'session_end':
+            for method, args, calls in meta.get('call_counts', []):
+                key = make_key(method, args, {})
+                self._sparse_total[key] = self._sparse_base.get(key, 0) + calls
+
+    def _sparse_limit(self, key):
+        # A session without a trailer (crash) still serves its own entries past the previous total
+        call_nos = self.sparse[key][0]
+        return max(self._sparse_total.get(key, 0), call_nos[-1] + 1 if call_nos else 0)
+
+    def _advance_clock(self, ts):
+        if ts is None:
+            return
+        target = ts_to_datetime(ts)
+        if target > self.clock.mocked_now():
+            self.clock.set_time(target)
+
+    def has_response(self, method, args, kwargs=None):
+        key = make_key(method, args, kwargs or {})
+        if key in self.sparse:
+            return self._sparse_calls[key] < self._sparse_limit(key)
+        return bool(self.responses.get(key))
+
+    def _next_sparse(self, key, method, args):
+        call_no = self._sparse_calls[key]
+        self._sparse_calls[key] += 1
+        call_nos, entries = self.sparse[key]
+        i = bisect_right(call_nos, call_no) - 1
+        if call_no >= self._sparse_limit(key) or i < 0:
+            self.stats['missing'] += 1
+            self.stats[f'missing:{method}'] += 1
+            raise ReplayExhausted(f"No recorded response for {method}{tuple(args)} at call {call_no}")
+        entry = entries[i]
+        if call_nos[i] == call_no:
+            self._advance_clock(entry.get('ts'))
+        self.stats['served'] += 1
+        return entry
+
+    def next_entry(self, method, args, kwargs):
+        """Pop the next recorded entry for this call (FIFO per key)"""
+        key = make_key(method, args, kwargs)
+        if key in self.sparse:
+            return self._next_sparse(key, method, args)
+        queue = self.responses.get(key)
+        if not queue:
+            self.stats['missing'] += 1
+            self.stats[f'missing:{method}'] += 1
+            raise ReplayExhausted(f"No recorded response for {method}{tuple(args)}")
+        entry = queue.popleft()
+        self.stats['served'] += 1
+        self._advance_clock(entry.get('ts'))
+        return entry
+
+    def serve(self, method, args, kwargs=None):
+        entry = self.next_entry(method, args, kwargs or {})
+        if entry.get('error'):
+            # Re-raise the recorded failure so the trader takes the same error path
+            raise Exception(entry['error'])
+        return decode_value(entry.get('result'))
+
+    def serve_price(self, symbol):
+        """
+        get_last_price from the tick channel: the k-th call for a symbol returns the latest
+        tick with seq <= k (seq counted across the sessions of an appended file), until the
+        trailer's call count runs out. Falls back to plain JSONL entries when no ticks were recorded.
+        """
+        if symbol not in self.ticks:
+            return self.serve(TICK_METHOD, [symbol])
+
+        call_no = self._price_calls[symbol]
+        self._price_calls[symbol] += 1
+        queue = self.responses.get(make_key(TICK_METHOD, [symbol], {}))
+        if queue and queue[0].get('tick_seq') == call_no:
+            # Failed / None lookup recorded in JSONL at this call
+            return self.serve(TICK_METHOD, [symbol])
+
+        i = bisect_right(self._tick_seqs[symbol], call_no) - 1
+        if i < 0 or call_no >= self._tick_limit.get(symbol, float('inf')):
+            self.stats['missing'] += 1
+            self.stats[f'missing:{TICK_METHOD}'] += 1
+            raise ReplayExhausted(f"No tick recorded for {symbol} at call {call_no}")
+        seq, ts, price = self.ticks[symbol][i]
+        if seq == call_no:
+            self._advance_clock(ts)
+        self.stats['served'] += 1
+        return price
+
+    def serve_order(self, method, args, kwargs=None):
+        """Serve the recorded order response, or a synthetic success if this order was not recorded"""
+        kwargs = kwargs or {}
+        self.produced_orders.append({
+            "ts": self.clock.mocked_now().timestamp(), "method": method,
+            "args": json.loads(json.dumps(list(args), default=str)), "kwargs": kwargs,
+        })
+        order_no = len(self.produced_orders)
+        try:
+            result = self.serve(method, args, kwargs)
+        except ReplayExhausted:
+            self.logger.warning(f"[REPLAY] Unrecorded order {method}{tuple(args)} - returning synthetic success")
+            return ReplayOrder(True, order_id=f"replay-{order_no}")
+
+        if isinstance(result, dict) and 'is_success' in result:
+            return ReplayOrder(result['is_success'], order_id=result.get('order_id', f"replay-{order_no}"), raw=result)
+        return result
+
+    def unserved_count(self):
+        unserved = sum(len(q) for q in self.responses.values())
+        for key, (call_nos, _) in self.sparse.items():
+            unserved += len(call_nos) - bisect_left(call_nos, self._sparse_calls[key])
+        return unserved
+
+    def diff_orders(self):
+        """Compare orders produced during replay with the recorded ones (method + args)"""
+        def order_key(o):
+            return o['method'], json.dumps(o.get('args', []), sort_keys=True, default=str), json.dumps(o.get('kwargs') or {}, sort_keys=True, default=str)
+
+        recorded = Counter(order_key(o) for o in self.recorded_orders)
+        produced = Counter(order_key(o) for o in self.produced_orders)
+        missing = recorded - produced
+        unexpected = produced - recorded
+
+        def expand(counter):
+            return [{"method": m, "args": json.loads(a), "kwargs": json.loads(k), "count": c}
+                    for (m, a, k), c in sorted(counter.items())]
+
+        in_order = [order_key(o) for o in self.recorded_orders] == [order_key(o) for o in self.produced_orders]
+        return {
+            "recorded": len(self.recorded_orders),
+            "produced": len(self.produced_orders),
+            "matched": sum((recorded & produced).values()),
+            "missing": expand(missing),
+            "unexpected": expand(unexpected),
+            "identical": not missing and not unexpected and in_order,
+        }
+
+    def report(self):
+        return {
+            "recording": self.path,
+            "entries": self.entry_count,
+            "served": self.stats['served'],
+            "missing_responses": self.stats['missing'],
+            "missing_by_method": {k.split(':', 1)[1]: v for k, v in self.stats.items() if k.startswith('missing:')},
+            "unserved": self.unserved_count(),
+            "recording_health": self.recording_health,
+            "db_writes": len(self.db_writes),
+            "orders": self.diff_orders(),
+        }
+
+
+class ReplayManager:
+    """Drop-in for SchwabManager/KoreaManager that answers from a ReplaySession"""
+
+    def __init__(self, user_id, session: ReplaySession):
+        self.user_id = user_id
+        self.session = session
+        self.clock = session.clock
+
+    def get_hashs(self):
+        return self.session.serve('get_hashs', [])
+
+    def get_market_hours(self):
+        if not self.session.has_response('get_market_hours', []):
+            # End of the recorded session -> market closed
+            return False
+        return self.session.serve('get_market_hours', [])
+
+    def get_positions(self, hash_value):
+        return self.session.serve('get_positions', [hash_value])
+
+    def get_positions_result(self, hash_value):
+        return self.session.serve('get_positions_result', [hash_value])
+
+    def get_cash(self, hash_value):
+        return self.session.serve('get_cash', [hash_value])
+
+    def get_account_result(self, hash_value):
+        return tuple(self.session.serve('get_account_result', [hash_value]))
+
+    def get_last_price(self, symbol):
+        return self.session.serve_price(symbol)
+
+    def get_current_price(self, symbol):
+        return self.session.serve('get_current_price', [symbol])
+
+    def place_limit_buy_order(self, hash_value, symbol, quantity, price):
+        return self.session.serve_order('place_limit_buy_order', [hash_value, symbol, quantity, price])
+
+    def place_limit_sell_order(self, hash_value, symbol, quantity, price):
+        return self.session.serve_order('place_limit_sell_order', [hash_value, symbol, quantity, price])
+
+    def place_market_sell_order(self, hash_value, symbol, quantity):
+        return self.session.serve_order('place_market_sell_order', [hash_value, symbol, quantity])
+
+    def sell_etf_for_cash(self, hash_value, required_cash, positions):
+        return self.session.serve_order('sell_etf_for_cash', [hash_value, required_cash, positions])
+
+
+class ReplayDatabaseHandler:
+    """
+    DatabaseHandler stand-in for recordings made with capture_db_reads: captured reads are
+    served from the session, everything else is treated as a write and collected in
+    session.db_writes (or passed to `fallback`, a real handler, when given).
+    """
+
+    def __init__(self, session: ReplaySession, fallback=None):
+        self.session = session
+        self.fallback = fallback
+        self.engine = getattr(fallback, 'engine', None)
+
+    def __getattr__(self, name):
+        if name in self.session.db_methods:
+            method = DB_METHOD_PREFIX + name
+
+            def read(*args, **kwargs):
+                return self.session.serve(method, args, kwargs)
+            return read
+        if self.fallback is not None:
+            return getattr(self.fallback, name)
+        if name.startswith('get_'):
+            raise ReplayExhausted(f"DB read {name} was not captured in the recording")
+
+        def write(*args, **kwargs):
+            self.session.db_writes.append({"method": name, "args": list(args), "kwargs": kwargs})
+        return write
+
+
+def prepare_replay_db(db_path, market='us'):
+    """
+    SQLite DB for a replay run. A file is copied to a temp path so every replay starts
+    from the same state; ':memory:' gives an empty bootstrapped schema.
+    Returns (DatabaseHandler, temp_path or None).
+    """
+    from library.mysql_helper import DatabaseHandler
+    from library.db_modules.sql_dialect import SQLITE
+
+    if db_path == ':memory:':
+        handler = DatabaseHandler(':memory:', backend=SQLITE)
+        handler.bootstrap_schema(market)
+        return handler, None
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Replay DB not found: {db_path}")
+    fd, temp_path = tempfile.mkstemp(suffix='.sqlite', prefix='replay_')
+    os.close(fd)
+    shutil.copyfile(db_path, temp_path)
+    return DatabaseHandler(temp_path, backend=SQLITE), temp_path
+
+
+def run_replay(trading_system_cls, record_path, db_handler=None, market_type='US', start_ts=None, end_ts=None):
+    """
+    Replay one recorded session through TradingSystem and return the report dict.
+    db_handler=None serves DB reads from the recording itself when it has captured them
+    (capture_db_reads), otherwise uses an empty bootstrapped in-memory SQLite DB.
+    """
+    from strategies.replay_strategy import ReplayMarketStrategy
+
+    started = time.perf_counter()
+    session = ReplaySession(record_path, start_ts=start_ts, end_ts=end_ts)
+    if db_handler is None:
+        if session.db_methods:
+            db_handler = ReplayDatabaseHandler(session)
+        else:
+            db_handler, _ = prepare_replay_db(':memory:', 'kr' if market_type == 'KR' else 'us')
+    strategy = ReplayMarketStrategy(session, db_handler, market_type=market_type)
+    trading_system = trading_system_cls(strategy, clock=session.clock)
+    alerts = []
+    trading_system.send_alert = alerts.append
+    # All replay managers share the session; registering one up front lets is_market_open()
+    # reach the recording (and stop at its end) even when the DB has no users.
+    trading_system.get_manager('replay')
+
+    trading_system.process_trading_rules()
+
+    report = session.report()
+    report["alerts"] = len(alerts)
+    report["cycles"] = trading_system.cycle_count
+    report["replay_seconds"] = round(time.perf_counter() - started, 3)
+    return report
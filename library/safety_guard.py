@@ -107,8 +107,8 @@ class StateIntegrityGuard:
             hash_val = rule['hash_value']
             
             # 2. Get DB State
-            db_qty = float(rule.get('current_holding', 0))
-            db_avg_price = float(rule.get('average_price', 0))
+            db_qty = float(rule.get('current_holding') or 0)
+            db_avg_price = float(rule.get('average_price') or 0)
             
             # 3. Get Broker State
             # positions_result_by_account structure: {hash_val: {symbol: {data}}}
@@ -47,7 +47,7 @@ class SchwabManager:
                     callback_timeout=300.0,
                     interactive=False
                 )
-                self.logger.info(f"Successfully authenticated user {self.user_id} at {datetime.now()}")
+                self.logger.info(f"Successfully authenticated user {self.user_id} at {self.clock.now()}")
 
             except Exception as e:
                 self.logger.error(f"Authentication failed for user {self.user_id}: {str(e)}")
@@ -0,0 +1,104 @@
+"""
+Parameter sweeps of the backtester across CPU cores.
+
+Each worker of the multiprocess.Pool opens the TickArchive once in its initializer
+(np.load mmap_mode='r'), so the tick arrays are shared through the OS page cache and
+never pickled: a task is just (point index, {field: value}).
+"""
+import csv
+import itertools
+import json
+
+import multiprocess as mp
+import numpy as np
+
+from library.backtester import run_backtest
+from library.tick_archive import TickArchive
+
+LOWER_IS_BETTER = {'max_drawdown_pct'}
+
+_worker = {}
+
+
+def parse_grid_spec(spec):
+    """
+    'limit_value=3:15:1' -> ('limit_value', [3.0, 4.0, ..., 15.0])   (start:stop:step, stop inclusive)
+    'daily_money=500,1000,2000' -> ('daily_money', [500.0, 1000.0, 2000.0])
+    """
+    if '=' not in spec:
+        raise ValueError(f"Grid spec must be FIELD=VALUES: {spec}")
+    field, values = spec.split('=', 1)
+    if ':' in values:
+        parts = [float(p) for p in values.split(':')]
+        if len(parts) != 3 or parts[2] <= 0:
+            raise ValueError(f"Range must be start:stop:step with step > 0: {spec}")
+        start, stop, step = parts
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return field, [round(start + i * step, 10) for i in range(max(count, 0))]
+    return field, [float(v) for v in values.split(',') if v]
+
+
+def expand_grid(grid):
+    """{field: [values]} -> [{field: value}, ...] (cartesian product, in field order)"""
+    fields = list(grid)
+    return [dict(zip(fields, combo)) for combo in itertools.product(*(grid[f] for f in fields))]
+
+
+def apply_params(rules, params, rule_ids=None):
+    """Copies of rules with params set on the selected rules (all rules if rule_ids is None)"""
+    selected = None if rule_ids is None else set(rule_ids)
+    return [dict(r, **params) if selected is None or r.get('id') in selected else dict(r) for r in rules]
+
+
+def _init_worker(archive_dir, rules, accounts, rule_ids, start_ts, end_ts, utc_offset):
+    archive = TickArchive(archive_dir)
+    symbols = {r['symbol'] for r in rules} & set(archive.symbols())
+    _worker.update(
+        ticks={s: archive.slice(s, start_ts, end_ts) for s in symbols},  # memmap views
+        rules=rules, accounts=accounts, rule_ids=rule_ids, utc_offset=utc_offset)
+
+
+def _run_point(task):
+    index, params = task
+    result = run_backtest(apply_params(_worker['rules'], params, _worker['rule_ids']), _worker['ticks'],
+                          accounts=_worker['accounts'], utc_offset=_worker['utc_offset'])
+    return {"point": index, **params, **result.summary()}
+
+
+def run_sweep(archive_dir, rules, grid, accounts=None, rule_ids=None, start_ts=None, end_ts=None,
+              processes=None, rank_by='return_pct', utc_offset=None):
+    """
+    Backtest every grid point and return the rows ranked by rank_by
+    (descending, except for LOWER_IS_BETTER metrics). processes=1 runs in-process.
+    """
+    tasks = list(enumerate(expand_grid(grid)))
+    initargs = (archive_dir, rules, accounts, rule_ids, start_ts, end_ts, utc_offset)
+    processes = processes or mp.cpu_count()
+
+    if processes == 1 or len(tasks) <= 1:
+        _init_worker(*initargs)
+        rows = [_run_point(task) for task in tasks]
+    else:
+        # Small chunks keep the cores busy when points differ a lot in cost
+        chunksize = max(1, len(tasks) // (processes * 8))
+        with mp.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+            rows = list(pool.imap_unordered(_run_point, tasks, chunksize=chunksize))
+
+    sign = 1 if rank_by in LOWER_IS_BETTER else -1
+    rows.sort(key=lambda row: (sign * row.get(rank_by, 0), row['point']))
+    for rank, row in enumerate(rows, 1):
+        row['rank'] = rank
+    return rows
+
+
+def write_results(rows, path):
+    """Ranked rows to .csv (one line per point) or .json"""
+    if path.endswith('.csv'):
+        fields = ['rank'] + [k for k in rows[0] if k != 'rank'] if rows else ['rank']
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
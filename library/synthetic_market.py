@@ -0,0 +1,219 @@
+"""
+Seeded synthetic market data for scale benchmarks.
+
+Prices follow a GBM with Merton jumps per symbol, generated one session at a time as a
+(symbols x ticks) NumPy array. Between sessions there is an overnight gap (its own
+return), and weekends are skipped. Prices are rounded the way each market quotes them:
+USD to cents, KRW to integers on the KRX tick-size grid. Split events divide the price
+from the open of their day so sync_split_and_merge_adjustments has something to find.
+
+Output goes either to recorder-format files (get_last_price entries written on price
+change with call_no, plus the session_end trailer, so replay serves every poll) or
+straight into a TickArchive.
+"""
+import json
+import os
+from datetime import date, datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from library.recorder import TICK_METHOD
+from library.recording_io import open_writer
+
+TRADING_SECONDS_PER_YEAR = 252 * 6.5 * 3600
+
+# KRX 호가가격단위 (2023.01 개편 기준): (가격 상한, 호가단위)
+KRX_TICK_TABLE = [(2000, 1), (5000, 5), (20000, 10), (50000, 50), (200000, 100), (500000, 500)]
+KRX_TOP_TICK = 1000
+
+MARKETS = {
+    'schwab': {"tz": 'America/New_York', "open": dtime(9, 30), "close": dtime(16, 0),
+               "price_median": 100.0, "price_spread": 1.0},
+    'korea': {"tz": 'Asia/Seoul', "open": dtime(9, 0), "close": dtime(15, 30),
+              "price_median": 50000.0, "price_spread": 1.2},
+}
+
+
+def krx_tick_size(price):
+    """KRX tick size for each price (vectorized)"""
+    price = np.asarray(price, dtype=np.float64)
+    bounds = np.array([b for b, _ in KRX_TICK_TABLE], dtype=np.float64)
+    ticks = np.array([t for _, t in KRX_TICK_TABLE] + [KRX_TOP_TICK], dtype=np.float64)
+    return ticks[np.searchsorted(bounds, price, side='right')]
+
+
+def round_to_market(price, market):
+    """USD: cents (min 0.01). KRW: nearest valid KRX tick (min 1)."""
+    price = np.asarray(price, dtype=np.float64)
+    if market == 'korea':
+        tick = krx_tick_size(price)
+        return np.maximum(np.round(price / tick) * tick, 1.0)
+    return np.maximum(np.round(price, 2), 0.01)
+
+
+class SyntheticMarket:
+    def __init__(self, market='schwab', n_symbols=100, start=date(2024, 1, 2), days=5, tick_seconds=1.0,
+                 seed=0, mu=0.05, sigma=(0.15, 0.6), jumps_per_day=1.0, jump_mean=0.0, jump_std=0.03,
+                 overnight_std=0.01, split_prob=0.0, splits=None, symbols=None):
+        """
+        sigma: annual volatility, one value or a (low, high) range drawn per symbol
+        jumps_per_day: Poisson jump intensity per symbol; jump sizes are N(jump_mean, jump_std) log-returns
+        split_prob: chance per symbol per day of a random split; splits: explicit
+                    [(symbol, date, ratio)] (ratio 10 = 1:10 split, 0.1 = 10:1 reverse split)
+        """
+        if market not in MARKETS:
+            raise ValueError(f"Unknown market: {market}")
+        self.market = market
+        self.spec = MARKETS[market]
+        self.tz = ZoneInfo(self.spec['tz'])
+        self.tick_seconds = tick_seconds
+        self.rng = np.random.default_rng(seed)
+        self.symbols = list(symbols) if symbols else self._symbol_names(n_symbols)
+        n = len(self.symbols)
+
+        self.trading_days = []
+        day = start
+        while len(self.trading_days) < days:
+            if day.weekday() < 5:
+                self.trading_days.append(day)
+            day += timedelta(days=1)
+
+        lo, hi = sigma if isinstance(sigma, (tuple, list)) else (sigma, sigma)
+        self.sigma = self.rng.uniform(lo, hi, n)
+        self.mu = mu
+        self.jumps_per_day = jumps_per_day
+        self.jump_mean = jump_mean
+        self.jump_std = jump_std
+        self.overnight_std = overnight_std
+        self.start_prices = np.exp(np.log(self.spec['price_median'])
+                                   + self.rng.normal(0, self.spec['price_spread'], n))
+        self.splits = self._plan_splits(splits or [], split_prob)
+        self._log_price = np.log(self.start_prices)
+
+    def _symbol_names(self, n):
+        if self.market == 'korea':
+            return [f"{900000 + i:06d}" for i in range(n)]  # 6자리 종목코드
+        return [f"SYN{i:04d}" for i in range(n)]
+
+    def _plan_splits(self, explicit, split_prob):
+        planned = {}
+        index = {s: i for i, s in enumerate(self.symbols)}
+        for symbol, day, ratio in explicit:
+            planned.setdefault(day, []).append((index[symbol], float(ratio)))
+        if split_prob:
+            hits = self.rng.random((len(self.trading_days), len(self.symbols))) < split_prob
+            for d, i in zip(*np.nonzero(hits)):
+                if d == 0:
+                    continue  # no split before the first session
+                ratio = float(self.rng.choice([2.0, 3.0, 5.0, 10.0, 0.5, 0.1]))
+                planned.setdefault(self.trading_days[d], []).append((int(i), ratio))
+        return planned
+
+    @property
+    def split_events(self):
+        return [{"symbol": self.symbols[i], "date": day.isoformat(), "ratio": ratio}
+                for day in sorted(self.splits) for i, ratio in self.splits[day]]
+
+    def session_bounds(self, day):
+        open_at = datetime.combine(day, self.spec['open'], self.tz).timestamp()
+        close_at = datetime.combine(day, self.spec['close'], self.tz).timestamp()
+        return open_at, close_at
+
+    def generate_day(self, day_index):
+        """
+        (ts, prices) for one session: ts is (ticks,) unix time, prices is (symbols, ticks) rounded.
+        Days must be generated in order (the path continues from the previous close).
+        """
+        day = self.trading_days[day_index]
+        open_at, close_at = self.session_bounds(day)
+        ts = np.arange(open_at, close_at, self.tick_seconds)
+        n, m = len(self.symbols), len(ts)
+        dt = self.tick_seconds / TRADING_SECONDS_PER_YEAR
+
+        if day_index > 0:
+            self._log_price += self.rng.normal(0, self.overnight_std, n)
+        for i, ratio in self.splits.get(day, []):
+            self._log_price[i] -= np.log(ratio)
+
+        steps = self.rng.standard_normal((n, m))
+        steps *= (self.sigma * np.sqrt(dt))[:, None]
+        steps += ((self.mu - 0.5 * self.sigma ** 2) * dt)[:, None]
+        if self.jumps_per_day:
+            counts = self.rng.poisson(self.jumps_per_day / m, (n, m))
+            rows, cols = np.nonzero(counts)
+            k = counts[rows, cols]
+            steps[rows, cols] += self.rng.normal(self.jump_mean * k, self.jump_std * np.sqrt(k))
+        steps[:, 0] += self._log_price
+        log_path = np.cumsum(steps, axis=1)
+        self._log_price = log_path[:, -1].copy()
+        return ts, round_to_market(np.exp(log_path), self.market)
+
+    def iter_days(self):
+        for d, day in enumerate(self.trading_days):
+            ts, prices = self.generate_day(d)
+            yield day, ts, prices
+
+    # --- output ---
+    def to_series(self, changes_only=True):
+        """{symbol: (ts, price)} for all days (the TickArchive layout)"""
+        parts = {s: ([], []) for s in self.symbols}
+        for _, ts, prices in self.iter_days():
+            for i, symbol in enumerate(self.symbols):
+                keep = _changes(prices[i]) if changes_only else slice(None)
+                parts[symbol][0].append(ts[keep])
+                parts[symbol][1].append(prices[i][keep])
+        return {s: (np.concatenate(t), np.concatenate(p)) for s, (t, p) in parts.items()}
+
+    def build_archive(self, archive):
+        """Write every day into a TickArchive; returns the number of ticks added"""
+        return archive.add_series(self.to_series(), source=f"synthetic_{self.market}")
+
+    def write_recordings(self, out_dir, compress=False):
+        """
+        One records/market_data_{market}_{YYYYMMDD}.jsonl[.gz] per day with get_last_price
+        entries for every symbol polled each tick_seconds, written on change (call_no = poll
+        number) and closed with a session_end trailer carrying call_counts.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for day, ts, prices in self.iter_days():
+            name = f"market_data_{self.market}_{day.strftime('%Y%m%d')}.jsonl" + (".gz" if compress else "")
+            path = os.path.join(out_dir, name)
+            self._write_day(path, ts, prices)
+            paths.append(path)
+        return paths
+
+    def _write_day(self, path, ts, prices, batch_lines=5000):
+        changed = np.ones(prices.shape, dtype=bool)
+        np.not_equal(prices[:, 1:], prices[:, :-1], out=changed[:, 1:])
+        ticks, syms = np.nonzero(changed.T)  # time-major, symbols in order within a tick
+        is_int = self.market == 'korea'
+
+        writer = open_writer(path)
+        seq = 0
+        try:
+            for start in range(0, len(ticks), batch_lines):
+                lines = []
+                for t, i in zip(ticks[start:start + batch_lines].tolist(), syms[start:start + batch_lines].tolist()):
+                    price = prices[i, t]
+                    lines.append(json.dumps({
+                        "ts": float(ts[t]) + i * 1e-6, "seq": seq, "method": TICK_METHOD,
+                        "args": [self.symbols[i]], "kwargs": {},
+                        "result": int(price) if is_int else float(price), "error": None, "call_no": t}))
+                    seq += 1
+                writer.write_batch("\n".join(lines) + "\n", float(ts[ticks[start]]),
+                                   float(ts[ticks[min(start + batch_lines, len(ticks)) - 1]]), len(lines))
+            trailer = {"meta": {"type": "session_end", "ts": float(ts[-1]),
+                                "recorder": {"enqueued": seq, "written": seq, "dropped": 0, "seq_issued": seq,
+                                             "synthetic": True},
+                                "call_counts": [[TICK_METHOD, [s], len(ts)] for s in self.symbols]}}
+            writer.write_batch(json.dumps(trailer) + "\n", None, None, 0)
+        finally:
+            writer.close()
+
+
+def _changes(row):
+    keep = np.ones(len(row), dtype=bool)
+    np.not_equal(row[1:], row[:-1], out=keep[1:])
+    return keep
@@ -0,0 +1,198 @@
+"""
+Per-symbol tick archive built from recorder output.
+
+Layout (one directory per market):
+    {archive_dir}/manifest.json
+    {archive_dir}/{symbol}.ts.npy      float64 unix timestamps (sorted)
+    {archive_dir}/{symbol}.price.npy   float64 prices
+
+Arrays are plain .npy files opened with np.load(mmap_mode='r'), so slicing a date
+range is a searchsorted + view: no JSON parsing and no copy.
+"""
+import json
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+
+from library.recorder import TICK_METHOD, read_ticks
+from library.recording_io import iter_recording
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+_RECORD_NAME_RE = re.compile(r'market_data_(?P<market>[a-z]+)_(?P<date>\d{8})')
+_UNSAFE_CHARS_RE = re.compile(r'[^0-9A-Za-z._-]')
+
+
+def market_of(record_path):
+    """records/market_data_schwab_20240109.jsonl -> 'schwab' (None if the name does not match)"""
+    match = _RECORD_NAME_RE.search(os.path.basename(record_path))
+    return match.group('market') if match else None
+
+
+def _symbol_file(symbol):
+    # '/' or spaces in symbols (e.g. 'BRK/B') must not escape the archive directory
+    return _UNSAFE_CHARS_RE.sub('_', symbol)
+
+
+def extract_ticks(record_path, changes_only=True):
+    """
+    {symbol: (ts ndarray, price ndarray)} from one recording: JSONL get_last_price entries
+    plus the binary tick channel if present. With changes_only, consecutive repeats are dropped.
+    """
+    series = {}
+    for entry in iter_recording(record_path):
+        if entry.get('method') != TICK_METHOD or entry.get('error') or not entry.get('args'):
+            continue
+        price = entry.get('result')
+        if isinstance(price, (int, float)) and not isinstance(price, bool):
+            series.setdefault(entry['args'][0], []).append((entry['ts'], float(price)))
+    for _, session_ticks in read_ticks(record_path):
+        for symbol, ticks in session_ticks.items():
+            series.setdefault(symbol, []).extend((ts, price) for _, ts, price in ticks)
+
+    result = {}
+    for symbol, pairs in series.items():
+        pairs.sort(key=lambda p: p[0])
+        data = np.array(pairs, dtype=np.float64).reshape(-1, 2)
+        ts, price = data[:, 0], data[:, 1]
+        if changes_only and len(price) > 1:
+            keep = np.empty(len(price), dtype=bool)
+            keep[0] = True
+            np.not_equal(price[1:], price[:-1], out=keep[1:])
+            ts, price = ts[keep], price[keep]
+        result[symbol] = (np.ascontiguousarray(ts), np.ascontiguousarray(price))
+    return result
+
+
+class TickArchive:
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.manifest_path = os.path.join(archive_dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {"version": MANIFEST_VERSION, "symbols": {}, "sources": {}}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _paths(self, symbol):
+        info = self.manifest['symbols'].get(symbol)
+        name = info['file'] if info else _symbol_file(symbol)
+        return (os.path.join(self.archive_dir, f"{name}.ts.npy"),
+                os.path.join(self.archive_dir, f"{name}.price.npy"))
+
+    # --- write ---
+    def add_recording(self, record_path, changes_only=True, force=False):
+        """
+        Merge one recording into the archive and return the number of ticks added.
+        Already ingested files (by name, tracked in the manifest) are skipped unless force;
+        a forced re-ingest replaces the ticks that file added before (e.g. a day file
+        ingested mid-day) instead of adding them twice.
+        """
+        source = os.path.basename(record_path)
+        if source in self.manifest['sources'] and not force:
+            return 0
+        return self.add_series(extract_ticks(record_path, changes_only), source)
+
+    def _check_file_names(self, symbols):
+        """Two symbols that map to the same .npy file (e.g. 'BRK/B' and 'BRK_B') must not be mixed"""
+        owners = {info['file']: symbol for symbol, info in self.manifest['symbols'].items()}
+        for symbol in symbols:
+            owner = owners.setdefault(_symbol_file(symbol), symbol)
+            if owner != symbol:
+                raise ValueError(f"Symbols {owner!r} and {symbol!r} share the archive file {_symbol_file(symbol)!r}")
+
+    def add_series(self, series, source=None):
+        """
+        Merge {symbol: (ts, price)} arrays (e.g. generated data) and return the number of ticks added.
+        Ticks from an earlier ingest of the same source are replaced: its [first_ts, last_ts] range
+        per symbol (kept in the manifest) is cut out first. Sources ingested before ranges were kept
+        only drop exact (ts, price) duplicates.
+        """
+        self._check_file_names(series)
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        previous = self.manifest['sources'].get(source) if source is not None else None
+        replaced = previous.get('ranges', {}) if previous else {}
+        dedupe = previous is not None and 'ranges' not in previous
+        ranges = {}
+        added = 0
+        for symbol in sorted(set(series) | set(replaced)):
+            ts, price = series.get(symbol, ((), ()))
+            ts = np.asarray(ts, dtype=np.float64)
+            price = np.asarray(price, dtype=np.float64)
+            if len(ts) == 0 and symbol not in replaced:
+                continue
+            ts_path, price_path = self._paths(symbol)
+            added += len(ts)
+            if len(ts):
+                ranges[symbol] = [float(ts.min()), float(ts.max())]
+            if os.path.exists(ts_path):
+                old_ts, old_price = np.load(ts_path), np.load(price_path)
+                if symbol in replaced:
+                    first_ts, last_ts = replaced[symbol]
+                    keep = (old_ts < first_ts) | (old_ts > last_ts)
+                    old_ts, old_price = old_ts[keep], old_price[keep]
+                ts = np.concatenate([old_ts, ts])
+                price = np.concatenate([old_price, price])
+                order = np.argsort(ts, kind='stable')
+                ts, price = ts[order], price[order]
+                if dedupe and len(ts) > 1:
+                    keep = np.ones(len(ts), dtype=bool)
+                    keep[1:] = (ts[1:] != ts[:-1]) | (price[1:] != price[:-1])
+                    ts, price = ts[keep], price[keep]
+            if len(ts) == 0:
+                # Every tick of this symbol came from the replaced source
+                for path in (ts_path, price_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self.manifest['symbols'].pop(symbol, None)
+                continue
+            # Write to temp files then rename so readers never see half-written arrays
+            for path, arr in ((ts_path, ts), (price_path, price)):
+                with open(path + '.tmp', 'wb') as f:
+                    np.save(f, arr)
+                os.replace(path + '.tmp', path)
+            self.manifest['symbols'][symbol] = {
+                "file": _symbol_file(symbol),
+                "count": int(len(ts)),
+                "first_ts": float(ts[0]),
+                "last_ts": float(ts[-1]),
+            }
+        if source is not None:
+            self.manifest['sources'][source] = {"ingested_at": datetime.now().isoformat(), "ranges": ranges}
+        self._save_manifest()
+        return added
+
+    # --- read ---
+    def symbols(self):
+        return sorted(self.manifest['symbols'])
+
+    def load(self, symbol):
+        """(ts, price) as read-only memmaps"""
+        if symbol not in self.manifest['symbols']:
+            raise KeyError(f"Symbol not in archive: {symbol}")
+        ts_path, price_path = self._paths(symbol)
+        return np.load(ts_path, mmap_mode='r'), np.load(price_path, mmap_mode='r')
+
+    def slice(self, symbol, start_ts=None, end_ts=None):
+        """Zero-copy views of [start_ts, end_ts]"""
+        ts, price = self.load(symbol)
+        lo = 0 if start_ts is None else int(np.searchsorted(ts, start_ts, side='left'))
+        hi = len(ts) if end_ts is None else int(np.searchsorted(ts, end_ts, side='right'))
+        return ts[lo:hi], price[lo:hi]
+
+    def price_at(self, symbol, when_ts):
+        """Last archived price at or before when_ts (None if before the first tick)"""
+        ts, price = self.load(symbol)
+        i = int(np.searchsorted(ts, when_ts, side='right')) - 1
+        return float(price[i]) if i >= 0 else None
@@ -1,8 +1,24 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from app_handlers import us_db_handler, kr_db_handler
+from app_handlers import us_db_handler, kr_db_handler, query_profiler
 
 bp = Blueprint('main', __name__)
 
+@bp.before_request
+def start_query_profile():
+    if query_profiler:
+        query_profiler.start_unit('request', f"{request.method} {request.path}")
+
+@bp.teardown_request
+def end_query_profile(exc=None):
+    if query_profiler:
+        query_profiler.end_unit()
+
+@bp.route('/api/sql-profile', methods=['GET'])
+def get_sql_profile():
+    if not query_profiler:
+        return jsonify({'error': 'SQL profiling is disabled (set SQL_PROFILE=1)'}), 404
+    return jsonify(query_profiler.to_dict())
+
 @bp.route('/')
 def index():
     market = request.args.get('market', 'us')  # 기본값 'us', 한국은 'kr'
@@ -0,0 +1,36 @@
+import sys
+import os
+import argparse
+from pathlib import Path
+
+# Add project root to sys.path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from library.tick_archive import TickArchive, market_of
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact recordings into per-symbol memory-mapped tick arrays')
+    parser.add_argument('paths', nargs='+', help='records/market_data_*.jsonl[.gz] files')
+    parser.add_argument('--archive', default=os.path.join(project_root, 'records', 'tick_archive'),
+                        help='Archive root; one sub-directory per market (default records/tick_archive)')
+    parser.add_argument('--keep-repeats', action='store_true', help='Keep consecutive identical prices')
+    parser.add_argument('--force', action='store_true', help='Re-ingest recordings already listed in the manifest')
+    args = parser.parse_args()
+
+    archives = {}
+    for path in sorted(args.paths):
+        market = market_of(path) or 'unknown'
+        if market not in archives:
+            archives[market] = TickArchive(os.path.join(args.archive, market))
+        added = archives[market].add_recording(path, changes_only=not args.keep_repeats, force=args.force)
+        print(f"{path} -> {market}: {added:,} ticks")
+
+    for market, archive in archives.items():
+        total = sum(info['count'] for info in archive.manifest['symbols'].values())
+        print(f"[{market}] {len(archive.symbols())} symbols, {total:,} ticks in {archive.archive_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import sys
+import os
+import argparse
+from pathlib import Path
+
+# Add project root to sys.path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from library.recording_io import convert_jsonl_to_framed, build_index, is_compressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert JSONL recordings to the compressed, seekable frame format')
+    parser.add_argument('paths', nargs='+', help='records/market_data_*.jsonl files (or *.jsonl.gz to rebuild the index)')
+    parser.add_argument('--frame-kb', type=int, default=256, help='Uncompressed frame size in KB (default 256)')
+    parser.add_argument('--remove-source', action='store_true', help='Delete the JSONL file after a successful conversion')
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if is_compressed(path):
+            frames = build_index(path)
+            print(f"Rebuilt index for {path}: {frames} frames")
+            continue
+
+        dst, frames = convert_jsonl_to_framed(path, frame_max_bytes=args.frame_kb * 1024)
+        src_size = os.path.getsize(path)
+        dst_size = os.path.getsize(dst)
+        ratio = src_size / dst_size if dst_size else 0
+        print(f"{path} -> {dst}: {frames} frames, {src_size:,} -> {dst_size:,} bytes ({ratio:.1f}x)")
+        if args.remove_source:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import sys
+import os
+import time
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to sys.path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from library.synthetic_market import SyntheticMarket
+from library.tick_archive import TickArchive
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate seeded synthetic market data for benchmarks')
+    parser.add_argument('--market', choices=['schwab', 'korea'], default='schwab')
+    parser.add_argument('--symbols', type=int, default=300, help='Number of symbols')
+    parser.add_argument('--days', type=int, default=5, help='Trading days (weekends are skipped)')
+    parser.add_argument('--start', default='2024-01-02', help='First day (YYYY-MM-DD)')
+    parser.add_argument('--tick-seconds', type=float, default=1.0, help='Seconds between polls')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--split-prob', type=float, default=0.001, help='Chance of a split per symbol per day')
+    parser.add_argument('--recordings', help='Write recorder-format files into this directory')
+    parser.add_argument('--compress', action='store_true', help='Write recordings as .jsonl.gz')
+    parser.add_argument('--archive', help='Tick archive directory to fill (e.g. records/tick_archive/synthetic)')
+    args = parser.parse_args()
+    if not args.recordings and not args.archive:
+        parser.error('--recordings and/or --archive is required')
+
+    def make():
+        return SyntheticMarket(args.market, n_symbols=args.symbols, days=args.days,
+                               start=datetime.strptime(args.start, '%Y-%m-%d').date(),
+                               tick_seconds=args.tick_seconds, seed=args.seed, split_prob=args.split_prob)
+
+    started = time.monotonic()
+    if args.recordings:
+        market = make()
+        paths = market.write_recordings(args.recordings, compress=args.compress)
+        size = sum(os.path.getsize(p) for p in paths)
+        print(f"[Synthetic] {len(paths)} recordings, {size / 1e6:.1f} MB in {args.recordings}")
+    if args.archive:
+        # Same seed -> same paths as the recordings
+        market = make()
+        added = market.build_archive(TickArchive(args.archive))
+        print(f"[Synthetic] {added:,} ticks for {len(market.symbols)} symbols in {args.archive}")
+    for event in market.split_events:
+        print(f"  split {event['symbol']} on {event['date']}: ratio {event['ratio']}")
+    print(f"[Synthetic] done in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import sys
+import os
+import json
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to sys.path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from library.recording_index import build_offset_index, offset_index_path, query_recording, update_offset_index
+
+
+def parse_time(value, base_date):
+    """'2024-01-09 10:14[:30]' or '10:14[:30]' (on the recording's date) -> unix ts"""
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            t = datetime.strptime(value, fmt).time()
+            return datetime.combine(base_date, t).timestamp()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Invalid time: {value}")
+
+
+def recording_date(path):
+    # records/market_data_schwab_20240109.jsonl -> 2024-01-09 (today if the name has no date)
+    for part in reversed(os.path.basename(path).split('.')[0].split('_')):
+        try:
+            return datetime.strptime(part, '%Y%m%d').date()
+        except ValueError:
+            continue
+    return datetime.now().date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Look up recorded calls via the sidecar offset index')
+    parser.add_argument('path', help='records/market_data_*.jsonl[.gz]')
+    parser.add_argument('--method', required=True, help='e.g. get_cash, get_last_price, place_limit_buy_order')
+    parser.add_argument('--key', help='First argument to match (symbol or account hash)')
+    parser.add_argument('--at', help="Time of interest ('10:14' or '2024-01-09 10:14')")
+    parser.add_argument('--window', type=int, default=1, help='Minutes around --at (default 1)')
+    parser.add_argument('--start', help='Range start (same formats as --at)')
+    parser.add_argument('--end', help='Range end (same formats as --at)')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index before querying')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        count = build_offset_index(args.path)
+    else:
+        # Also indexes whatever a growing recording gained since the sidecar was written
+        count = update_offset_index(args.path)
+    if count:
+        print(f"Indexed {count} entries -> {offset_index_path(args.path)}", file=sys.stderr)
+
+    base_date = recording_date(args.path)
+    start_ts = parse_time(args.start, base_date) if args.start else None
+    end_ts = parse_time(args.end, base_date) if args.end else None
+    if args.at:
+        at = datetime.fromtimestamp(parse_time(args.at, base_date))
+        start_ts = (at - timedelta(minutes=args.window)).timestamp()
+        end_ts = (at + timedelta(minutes=args.window)).timestamp()
+
+    for entry in query_recording(args.path, args.method, key=args.key, start_ts=start_ts, end_ts=end_ts):
+        print(json.dumps(entry, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from library.mysql_helper import DatabaseHandler
+from library import secret
+from sqlalchemy import text
+
+def main():
+    print("Initializing contribution aggregate tables...")
+    db = DatabaseHandler(secret.db_name)
+
+    statements = [
+        """
+        CREATE TABLE IF NOT EXISTS contribution_totals (
+            account_number VARCHAR(20) PRIMARY KEY,
+            total_amount DECIMAL(15, 2) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS contribution_daily_totals (
+            transaction_day DATE PRIMARY KEY,
+            total_amount DECIMAL(15, 2) NOT NULL DEFAULT 0
+        );
+        """
+    ]
+
+    try:
+        with db.engine.connect() as conn:
+            for sql in statements:
+                conn.execute(text(sql))
+            conn.commit()
+        print("Aggregate tables created successfully (if not existed).")
+
+        # Backfill from contribution_history
+        db.rebuild_contribution_aggregates()
+        print("Backfilled aggregates from contribution_history.")
+    except Exception as e:
+        print(f"Error initializing contribution aggregates: {e}")
+
+if __name__ == "__main__":
+    main()
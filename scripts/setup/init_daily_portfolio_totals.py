@@ -0,0 +1,42 @@
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from library.mysql_helper import DatabaseHandler
+from library import secret
+from sqlalchemy import text
+
+def init_db(db_name):
+    print(f"Initializing daily_portfolio_totals for {db_name}...")
+    db = DatabaseHandler(db_name)
+
+    sql = """
+    CREATE TABLE IF NOT EXISTS daily_portfolio_totals (
+        record_date DATE NOT NULL,
+        account_id VARCHAR(20) NOT NULL,
+        total_value DECIMAL(18, 2) NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (record_date, account_id)
+    );
+    """
+
+    try:
+        with db.engine.connect() as conn:
+            conn.execute(text(sql))
+            conn.commit()
+        print("Table daily_portfolio_totals created successfully (if not existed).")
+
+        # Backfill from daily_records ('total' rows)
+        count = db.rebuild_daily_portfolio_totals()
+        print(f"Backfilled {count} rows from daily_records.")
+    except Exception as e:
+        print(f"Error initializing daily_portfolio_totals: {e}")
+
+def main():
+    init_db(secret.db_name)
+    init_db(secret.db_name_kr)
+
+if __name__ == "__main__":
+    main()
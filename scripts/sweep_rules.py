@@ -0,0 +1,83 @@
+import sys
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to sys.path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from library.sweep import parse_grid_spec, run_sweep, write_results
+
+
+def load_from_db(market):
+    from library import secret
+    from library.mysql_helper import DatabaseHandler
+    db = DatabaseHandler(secret.db_name_kr if market == 'korea' else secret.db_name)
+    rules = [r for r in db.get_all_trading_rules() if r['status'] in ('ACTIVE', 'PROCESSED')]
+    accounts = {}
+    for user in db.get_users():
+        for account in db.get_user_accounts(user):
+            if account.get('hash_value'):
+                accounts[account['hash_value']] = float(account.get('cash_balance') or 0)
+    return rules, accounts
+
+
+def to_ts(date_str, end=False):
+    if not date_str:
+        return None
+    day = datetime.strptime(date_str, '%Y-%m-%d')
+    return day.timestamp() + (86400 - 1e-6 if end else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest a grid of rule parameters over the tick archive')
+    parser.add_argument('--market', choices=['schwab', 'korea'], default='schwab')
+    parser.add_argument('--archive', help='Tick archive directory (default records/tick_archive/{market})')
+    parser.add_argument('--rules', help='JSON file with a list of trading_rules rows')
+    parser.add_argument('--accounts', help='JSON file {hash_value: cash or {"cash": x, "etf": y}}')
+    parser.add_argument('--from-db', action='store_true', help='Load rules and account cash from the database')
+    parser.add_argument('--grid', action='append', required=True, metavar='FIELD=START:STOP:STEP|A,B,C',
+                        help='Rule field to sweep, e.g. limit_value=3:15:1 or daily_money=500,1000 (repeatable)')
+    parser.add_argument('--rule-id', type=int, action='append', help='Apply the grid only to these rule ids')
+    parser.add_argument('--start', help='First day (YYYY-MM-DD)')
+    parser.add_argument('--end', help='Last day (YYYY-MM-DD)')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--rank-by', default='return_pct',
+                        help='Summary field to rank by (return_pct, end_equity, max_drawdown_pct, trades, ...)')
+    parser.add_argument('--out', default='sweep_results.csv', help='Output file (.csv or .json)')
+    parser.add_argument('--top', type=int, default=10, help='Rows to print')
+    args = parser.parse_args()
+
+    if args.from_db:
+        rules, accounts = load_from_db(args.market)
+    elif args.rules:
+        with open(args.rules, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+        accounts = {}
+    else:
+        parser.error('--rules or --from-db is required')
+    if args.accounts:
+        with open(args.accounts, 'r', encoding='utf-8') as f:
+            accounts = json.load(f)
+
+    grid = dict(parse_grid_spec(spec) for spec in args.grid)
+    archive = args.archive or os.path.join(project_root, 'records', 'tick_archive', args.market)
+
+    started = time.monotonic()
+    rows = run_sweep(archive, rules, grid, accounts=accounts, rule_ids=args.rule_id,
+                     start_ts=to_ts(args.start), end_ts=to_ts(args.end, end=True),
+                     processes=args.processes, rank_by=args.rank_by)
+    write_results(rows, args.out)
+    print(f"[Sweep] {len(rows)} points in {time.monotonic() - started:.1f}s -> {args.out}")
+    for row in rows[:args.top]:
+        params = ', '.join(f"{field}={row[field]}" for field in grid)
+        print(f"  #{row['rank']:<4} {params}  return {row['return_pct']:.2f}%  "
+              f"drawdown {row['max_drawdown_pct']:.2f}%  trades {row['trades']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -68,6 +68,7 @@ def insert_manual_transaction():
                 "desc": target_description
             })
             conn.commit()
+        db.refresh_contribution_aggregates([target_account], target_date)
         print(f"  [SUCCESS] Inserted manual record. Activity ID: {pseudo_id}")
     except Exception as e:
         print(f"  [ERROR] Failed to insert: {e}")
@@ -0,0 +1,24 @@
+from library.paper_broker import PaperBroker, PaperExchange
+from strategies.market_strategy import MarketStrategy
+
+
+class PaperMarketStrategy(MarketStrategy):
+    """Strategy that trades against an in-memory PaperExchange (see library/paper_broker.py)"""
+
+    def __init__(self, exchange: PaperExchange, db_handler, market_type: str = 'US'):
+        self.exchange = exchange
+        self.db_handler = db_handler
+        self.market_type = market_type
+        self.managers = {}
+        self.clock = exchange.clock
+
+    def get_manager(self, user_id):
+        if user_id not in self.managers:
+            self.managers[user_id] = PaperBroker(user_id, self.exchange)
+        return self.managers[user_id]
+
+    def get_db_handler(self):
+        return self.db_handler
+
+    def extract_order_id(self, manager, hash_value, order):
+        return order.order_id
@@ -0,0 +1,24 @@
+from library.replay import ReplayManager, ReplaySession
+from strategies.market_strategy import MarketStrategy
+
+
+class ReplayMarketStrategy(MarketStrategy):
+    """Strategy that serves broker calls from a recorded session (see library/replay.py)"""
+
+    def __init__(self, session: ReplaySession, db_handler, market_type: str = 'US'):
+        self.session = session
+        self.db_handler = db_handler
+        self.market_type = market_type
+        self.managers = {}
+        self.clock = session.clock
+
+    def get_manager(self, user_id):
+        if user_id not in self.managers:
+            self.managers[user_id] = ReplayManager(user_id, self.session)
+        return self.managers[user_id]
+
+    def get_db_handler(self):
+        return self.db_handler
+
+    def extract_order_id(self, manager, hash_value, order):
+        return getattr(order, 'order_id', None)
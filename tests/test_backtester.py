@@ -0,0 +1,166 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+
+from library.backtester import run_backtest, trigger_bounds, _normalize_rule, BUY, SELL
+from library.tick_archive import TickArchive
+from library.trade_calculator import TradeCalculator
+
+DAY0 = datetime(2024, 1, 8, 14, 30, tzinfo=timezone.utc).timestamp()  # Monday
+
+
+def day_ticks(prices_by_day, step=60.0):
+    ts, price = [], []
+    for d, prices in enumerate(prices_by_day):
+        for k, p in enumerate(prices):
+            ts.append(DAY0 + d * 86400 + k * step)
+            price.append(p)
+    return np.array(ts), np.array(price)
+
+
+def rule(**kwargs):
+    base = {"id": 1, "hash_value": "hash_a", "symbol": "AAPL", "trade_action": BUY, "limit_type": "price",
+            "limit_value": 100.0, "target_amount": 10, "daily_money": 1000.0, "cash_only": True,
+            "status": "ACTIVE", "average_price": 0.0, "high_price": 0.0, "current_holding": 0}
+    base.update(kwargs)
+    return base
+
+
+def reference_backtest(rules, ticks, cash, positions):
+    """Tick-by-tick loop over every rule, written the way trader.py evaluates them"""
+    rules = [_normalize_rule(r) for r in rules]
+    holding = {(a, s): q for a, symbols in positions.items() for s, q in symbols.items()}
+    trades = []
+    days = sorted({int(t // 86400) for ts, _ in ticks.values() for t in ts})
+    for day in days:
+        traded = [0.0] * len(rules)
+        events = sorted((t, r['trade_action'], i, p)
+                        for i, r in enumerate(rules)
+                        for t, p in zip(*ticks[r['symbol']]) if int(t // 86400) == day)
+        lo, hi = trigger_bounds(rules)
+        for t, action, i, p in events:
+            r = rules[i]
+            key = (r['account'], r['symbol'])
+            if r['status'] != 'ACTIVE' or not (lo[i] <= p <= hi[i]):
+                continue
+            if action == BUY:
+                d = TradeCalculator.calculate_buy_quantity(int(r['target_amount']), holding[key], r['daily_money'],
+                                                           int(traded[i]), p, cash[r['account']], True)
+                if d.quantity <= 0:
+                    continue
+                if holding[key] + d.quantity >= r['target_amount']:
+                    r['status'] = 'COMPLETED'
+                holding[key] += d.quantity
+                cash[r['account']] -= d.quantity * p
+            else:
+                d = TradeCalculator.calculate_sell_quantity(int(r['target_amount']), holding[key], r['daily_money'],
+                                                            int(traded[i]), p)
+                if d.quantity <= 0:
+                    continue
+                if holding[key] - d.quantity <= r['target_amount']:
+                    r['status'] = 'COMPLETED'
+                holding[key] -= d.quantity
+                cash[r['account']] += d.quantity * p
+            traded[i] += d.quantity * p
+            trades.append((t, r['id'], d.quantity, p))
+    return trades
+
+
+class TestBacktester(unittest.TestCase):
+    def test_price_rule_respects_daily_money_and_target(self):
+        ticks = {"AAPL": day_ticks([[105.0, 99.0, 98.0, 97.0, 101.0], [96.0, 95.0, 110.0]])}
+        result = run_backtest([rule(daily_money=300.0)], ticks, accounts={"hash_a": 5000.0}, utc_offset=0)
+
+        # Day 1: 3 @ 99 (297 used), then 3 left < 98 -> nothing. Day 2: 3 @ 96, then 3 @ 95 is over budget
+        self.assertEqual([(t['date'], t['quantity'], t['price']) for t in result.trades],
+                         [('2024-01-08', 3, 99.0), ('2024-01-09', 3, 96.0)])
+        self.assertEqual(result.daily[-1]['accounts']['hash_a']['holdings'], {'AAPL': 6})
+        self.assertAlmostEqual(result.daily[-1]['cash'], 5000.0 - 297.0 - 288.0)
+        self.assertEqual(result.rules[0]['average_price'], (297.0 + 288.0) / 6)
+
+    def test_sell_and_completion(self):
+        ticks = {"AAPL": day_ticks([[100.0, 121.0, 125.0]])}
+        sell = rule(trade_action=SELL, limit_type='percent', limit_value=20.0, target_amount=5,
+                    average_price=100.0, current_holding=12, daily_money=10000.0)
+        result = run_backtest([sell], ticks, accounts={"hash_a": 0.0}, utc_offset=0)
+        self.assertEqual([(t['side'], t['quantity'], t['price']) for t in result.trades], [('SELL', 7, 121.0)])
+        self.assertEqual(result.rules[0]['status'], 'COMPLETED')
+        self.assertAlmostEqual(result.summary()['end_equity'], 7 * 121.0 + 5 * 125.0)
+
+    def test_high_percent_uses_previous_close_high(self):
+        # high_price is refreshed by update_result at the end of each day
+        ticks = {"AAPL": day_ticks([[100.0, 120.0], [110.0, 107.0]])}
+        hp = rule(limit_type='high_percent', limit_value=10.0, high_price=100.0, average_price=90.0,
+                  current_holding=1, target_amount=5, daily_money=200.0)
+        result = run_backtest([hp], ticks, accounts={"hash_a": 1000.0}, utc_offset=0)
+        # Day 1 band: <= 90; day 2 band: <= 108 (high 120)
+        self.assertEqual([(t['date'], t['price']) for t in result.trades], [('2024-01-09', 107.0)])
+        self.assertEqual(result.rules[0]['high_price'], 120.0)
+
+    def test_high_percent_follows_intraday_high(self):
+        # TradingSystem.intraday: a new high moves the band the same day, and is kept for the next day
+        ticks = {"AAPL": day_ticks([[100.0, 120.0, 110.0, 107.0, 104.0], [130.0, 100.0]])}
+        hp = rule(limit_type='high_percent', limit_value=10.0, high_price=100.0, average_price=90.0,
+                  current_holding=1, target_amount=5, daily_money=200.0)
+        idle = rule(id=2, hash_value='hash_b', limit_type='high_percent', limit_value=10.0)
+        result = run_backtest([hp, idle], ticks, accounts={"hash_a": 1000.0, "hash_b": 1000.0}, utc_offset=0)
+        # Day 1 band: <= 108 from the 120 tick on; day 2: <= 117 after the 130 tick
+        self.assertEqual([(t['date'], t['price']) for t in result.trades],
+                         [('2024-01-08', 107.0), ('2024-01-09', 100.0)])
+        self.assertEqual(result.rules[0]['high_price'], 130.0)
+        self.assertEqual(result.rules[1]['high_price'], 0.0)  # high_price 0 never starts tracking
+
+    def test_weekly_rule_reactivates(self):
+        ticks = {"VOO": day_ticks([[400.0]] * 8)}
+        weekly = rule(symbol='VOO', limit_type='weekly', limit_value=0, target_amount=100, daily_money=500.0)
+        result = run_backtest([weekly], ticks, accounts={"hash_a": 10000.0}, utc_offset=0)
+        # Monday 01-08 (ACTIVE at start), then PROCESSED until the next Monday
+        self.assertEqual([t['date'] for t in result.trades], ['2024-01-08', '2024-01-15'])
+        self.assertEqual(result.rules[0]['status'], 'PROCESSED')
+
+    def test_shortfall_sells_etf(self):
+        ticks = {"AAPL": day_ticks([[50.0]])}
+        flexible = rule(cash_only=False, limit_value=60.0)
+        result = run_backtest([flexible], ticks, accounts={"hash_a": {"cash": 200.0, "etf": 250.0}}, utc_offset=0)
+        self.assertEqual(result.trades[0]['quantity'], 9)  # 450 of cash + ETF
+        self.assertEqual(result.daily[0]['accounts']['hash_a']['etf'], 0.0)
+
+    def test_matches_tick_by_tick_reference(self):
+        rng = random.Random(7)
+        ticks = {}
+        for symbol in ('AAPL', 'MSFT'):
+            days = [[round(100 + rng.uniform(-8, 8), 2) for _ in range(200)] for _ in range(5)]
+            ticks[symbol] = day_ticks(days, step=rng.choice([30.0, 45.0]))
+        rules = []
+        for i in range(12):
+            buy = i % 3 != 0
+            rules.append(rule(id=i, symbol=rng.choice(['AAPL', 'MSFT']), trade_action=BUY if buy else SELL,
+                              limit_value=rng.uniform(95, 100) if buy else rng.uniform(100, 105),
+                              target_amount=rng.randint(0, 40), daily_money=rng.choice([150.0, 420.0, 1000.0]),
+                              hash_value=rng.choice(['hash_a', 'hash_b'])))
+        cash = {"hash_a": 3000.0, "hash_b": 800.0}
+        positions = {"hash_a": {"AAPL": 20, "MSFT": 5}, "hash_b": {"AAPL": 0, "MSFT": 30}}
+        result = run_backtest(rules, ticks, accounts=dict(cash), positions=positions, utc_offset=0)
+        self.assertGreater(len(result.trades), 10)
+        self.assertEqual({t['side'] for t in result.trades}, {'BUY', 'SELL'})
+        self.assertEqual([(t['ts'], t['rule_id'], t['quantity'], t['price']) for t in result.trades],
+                         reference_backtest(rules, ticks, dict(cash), positions))
+
+    def test_reads_tick_archive(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        archive = TickArchive(test_dir)
+        ts, price = day_ticks([[101.0, 99.0]])
+        for name, arr in (('AAPL.ts.npy', ts), ('AAPL.price.npy', price)):
+            np.save(os.path.join(test_dir, name), arr)
+        archive.manifest['symbols']['AAPL'] = {"file": "AAPL", "count": 2, "first_ts": ts[0], "last_ts": ts[-1]}
+        result = run_backtest([rule(target_amount=2)], archive, accounts={"hash_a": 1000.0}, utc_offset=0)
+        self.assertEqual([(t['quantity'], t['price']) for t in result.trades], [(2, 99.0)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+from library.recorder import backup_databases, prune_backups
+
+DUMP = b"-- MySQL dump 10.13\nCREATE TABLE users (id int);\n-- Dump completed on 2024-01-09 16:05:00\n"
+
+class TestBackupVerification(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        patcher = patch('library.recorder.secret')
+        mock_secret = patcher.start()
+        self.addCleanup(patcher.stop)
+        mock_secret.db_name = 'test_db'
+        mock_secret.db_name_kr = None
+        mock_secret.db_ip = '127.0.0.1'
+        mock_secret.db_port = 3306
+        mock_secret.db_id = 'user'
+        mock_secret.db_passwd = 'pass'
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _backup(self, output, returncode=0, **kwargs):
+        proc = MagicMock()
+        proc.stdout = io.BytesIO(output)
+        proc.wait.return_value = returncode
+        with patch('library.recorder.subprocess.Popen', return_value=proc):
+            with self.assertLogs('recorder', level='INFO') as cm:
+                results = backup_databases('end', backup_dir=self.test_dir, **kwargs)
+        return results, cm.output
+
+    def test_truncated_dump_is_discarded(self):
+        results, logs = self._backup(DUMP[:40])
+        self.assertFalse(results[0]['ok'])
+        self.assertTrue(any("Backup incomplete" in line for line in logs), logs)
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_failed_dump_is_discarded(self):
+        results, logs = self._backup(DUMP, returncode=2)
+        self.assertFalse(results[0]['ok'])
+        self.assertTrue(any("Failed to backup test_db" in line for line in logs), logs)
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_uncompressed_and_background(self):
+        results, _ = self._backup(DUMP, compress=False)
+        self.assertTrue(results[0]['ok'])
+        self.assertEqual(results[0]['bytes'], len(DUMP))
+        with open(results[0]['path'], 'rb') as f:
+            self.assertEqual(f.read(), DUMP)
+
+        proc = MagicMock()
+        proc.stdout = io.BytesIO(DUMP)
+        proc.wait.return_value = 0
+        with patch('library.recorder.subprocess.Popen', return_value=proc):
+            job = backup_databases('start', backup_dir=self.test_dir, wait=False)
+            self.assertTrue(job.wait_started(timeout=5))
+            results = job.wait()
+        self.assertTrue(job.done())
+        self.assertTrue(results[0]['ok'])
+
+class TestBackupRetention(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _touch(self, name, size=100):
+        with open(os.path.join(self.test_dir, name), 'wb') as f:
+            f.write(b'x' * size)
+
+    def test_keeps_recent_days_and_weekly(self):
+        # Daily start/end backups for 60 days (2023-11-11 .. 2024-01-09), two databases
+        for db in ('db_us', 'db_kr'):
+            for day in range(60):
+                date = datetime.fromordinal(datetime(2024, 1, 9).toordinal() - day).strftime('%Y%m%d')
+                self._touch(f"backup_{db}_{date}_083000_start.sql.gz")
+                self._touch(f"backup_{db}_{date}_160500_end.sql")
+        self._touch("market_data_schwab_20231101.jsonl")
+
+        deleted, freed, remaining = prune_backups(self.test_dir, keep_days=7, keep_weeks=4,
+                                                  now=datetime(2024, 1, 9, 17, 0))
+
+        kept = sorted(os.listdir(self.test_dir))
+        us_days = sorted({name.split('_')[3] for name in kept if name.startswith('backup_db_us')})
+        # 7 most recent days + the newest day of each of the last 4 ISO weeks
+        # (the two current weeks already fall inside the 7 days)
+        self.assertEqual(us_days, ['20231224', '20231231',
+                                   '20240103', '20240104', '20240105', '20240106', '20240107', '20240108', '20240109'])
+        self.assertIn("market_data_schwab_20231101.jsonl", kept)
+        self.assertEqual(len(deleted), 2 * 2 * 51)
+        self.assertEqual(freed, len(deleted) * 100)
+        self.assertEqual(remaining, (len(kept) - 1) * 100)
+
+if __name__ == '__main__':
+    unittest.main()
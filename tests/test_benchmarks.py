@@ -0,0 +1,51 @@
+import unittest
+import copy
+import logging
+
+from benchmarks.trading_loop import run_scenario, run_suite, compare, expand_scenarios, build_scenario
+
+
+class TestTradingLoopBenchmark(unittest.TestCase):
+    def test_build_scenario_spreads_rules_over_accounts(self):
+        db, exchange, clock = build_scenario(rules=14, users=2, accounts=3, cycles=5)
+        rules = db.get_all_trading_rules()
+        self.assertEqual(len(rules), 14)
+        self.assertEqual(len({r['hash_value'] for r in rules}), 6)
+        self.assertEqual(len({(r['hash_value'], r['symbol']) for r in rules}), 14)
+        self.assertEqual(len(exchange.accounts), 6)
+        sells = [r for r in rules if r['trade_action'] == 0]
+        self.assertTrue(sells and all(r['current_holding'] > 0 for r in sells))
+        db.engine.dispose()
+
+    def test_run_scenario_reports_metrics(self):
+        result = run_scenario(rules=12, users=2, accounts=2, cycles=4, log_level=logging.ERROR)
+        self.assertEqual(result['key'], 'rules=12,users=2,accounts=2')
+        self.assertEqual(result['cycles_run'], 4)
+        self.assertGreater(result['sql_per_cycle'], 0)
+        self.assertGreater(result['broker_calls_per_cycle'], 0)
+        self.assertGreater(result['startup_sql'], 0)
+        self.assertGreater(result['peak_rss_mb'], 0)
+        self.assertLessEqual(result['cycle_ms_p50'], result['cycle_ms_max'])
+        # Counts are deterministic for a seed, so they can be compared exactly against a baseline
+        again = run_scenario(rules=12, users=2, accounts=2, cycles=4, log_level=logging.ERROR)
+        for metric in ('sql_per_cycle', 'broker_calls_per_cycle', 'broker_calls', 'fills'):
+            self.assertEqual(result[metric], again[metric])
+
+    def test_compare_flags_regressions(self):
+        report = run_suite(expand_scenarios([6], [1], [1]), cycles=2, isolate=False)
+        baseline = copy.deepcopy(report)
+        self.assertEqual(compare(report, baseline), [])
+
+        current = copy.deepcopy(report)
+        scenario = current['scenarios'][0]
+        scenario['cycle_ms_p50'] = baseline['scenarios'][0]['cycle_ms_p50'] * 1.2 + 1.0  # within 25% + 2ms
+        scenario['sql_per_cycle'] += 1
+        regressions = compare(current, baseline)
+        self.assertEqual([r['metric'] for r in regressions], ['sql_per_cycle'])
+        self.assertEqual([r['metric'] for r in compare(current, baseline, count_tolerance=0.5)], [])
+
+        scenario['cycle_ms_p50'] = baseline['scenarios'][0]['cycle_ms_p50'] * 2 + 5
+        self.assertIn('cycle_ms_p50', [r['metric'] for r in compare(current, baseline, count_tolerance=0.5)])
+
+if __name__ == '__main__':
+    unittest.main()
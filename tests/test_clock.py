@@ -1,7 +1,7 @@
 import unittest
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from library.clock import Clock, MockClock
+from library.clock import Clock, MockClock, SimulatedClock
 from library.schwab_manager import SchwabManager
 
 class TestClock(unittest.TestCase):
@@ -41,6 +41,49 @@ class TestMockClock(unittest.TestCase):
         self.assertEqual(ny_time.hour, 7) # 12 - 5 = 7
         self.assertEqual(ny_time.tzinfo, ny_tz)
 
+class TestSimulatedClock(unittest.TestCase):
+    def setUp(self):
+        self.clock = SimulatedClock(datetime(2024, 1, 2, 9, 30))
+        self.fired = []
+
+    def record(self, name):
+        self.fired.append((name, self.clock.now().strftime('%H:%M:%S')))
+
+    def test_sleep_runs_due_events_at_their_time(self):
+        self.clock.call_later(5, self.record, 'b')
+        self.clock.call_later(2, self.record, 'a')
+        self.clock.call_later(2, self.record, 'a2')  # same instant: scheduling order
+        self.clock.call_later(60, self.record, 'late')
+        self.clock.sleep(10)
+        self.assertEqual(self.fired, [('a', '09:30:02'), ('a2', '09:30:02'), ('b', '09:30:05')])
+        self.assertEqual(self.clock.now(), datetime(2024, 1, 2, 9, 30, 10))
+        self.assertEqual((self.clock.slept, self.clock.events_fired), (10, 3))
+
+    def test_repeating_and_cancelled_events(self):
+        tick = self.clock.call_every(30, self.record, 'tick')
+        once = self.clock.call_later(45, self.record, 'never')
+        self.clock.cancel(once)
+        self.clock.call_later(70, self.clock.cancel, tick)
+        self.clock.sleep(120)
+        self.assertEqual(self.fired, [('tick', '09:30:00'), ('tick', '09:30:30'), ('tick', '09:31:00')])
+        self.assertIsNone(self.clock.next_event_time())
+
+    def test_run_next_jumps_to_next_event(self):
+        self.clock.call_at(datetime(2024, 1, 2, 16, 0), self.record, 'close')
+        self.assertTrue(self.clock.run_next())
+        self.assertEqual(self.fired, [('close', '16:00:00')])
+        self.assertFalse(self.clock.run_next())
+
+    def test_events_can_schedule_events(self):
+        def chain(n):
+            self.record(n)
+            if n < 3:
+                self.clock.call_later(1, chain, n + 1)
+        self.clock.call_later(1, chain, 1)
+        self.clock.sleep(1)
+        self.clock.sleep(5)
+        self.assertEqual([t for _, t in self.fired], ['09:30:01', '09:30:02', '09:30:03'])
+
 class TestManagerWithClock(unittest.TestCase):
     def test_schwab_market_hours_mock(self):
         # Mocking user_id 'test_user' requires existing config or mock? 
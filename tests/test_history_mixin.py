@@ -0,0 +1,179 @@
+import unittest
+import datetime
+from unittest import mock
+from sqlalchemy import event, text
+from library.mysql_helper import DatabaseHandler
+from library.db_modules.sql_dialect import insert_ignore
+
+
+class HistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseHandler(':memory:', backend='sqlite')
+        self.addCleanup(self.db.engine.dispose)
+        self.db.bootstrap_schema('us')
+        self.db.add_account('user_0', 'user', '1111', 'Main')
+        self.db.add_account('user_1', 'user', '2222', 'IRA')
+
+    def execute(self, sql, params=None):
+        with self.db.engine.begin() as conn:
+            return conn.execute(text(sql), params or {})
+
+    def rollup(self):
+        rows = self.execute("SELECT record_date, account_id, total_value FROM daily_portfolio_totals "
+                            "ORDER BY record_date, account_id")
+        return [(str(r.record_date), r.account_id, float(r.total_value)) for r in rows]
+
+    def totals_from_records(self):
+        rows = self.execute("SELECT record_date, account_id, SUM(amount) AS total FROM daily_records "
+                            "WHERE symbol = 'total' GROUP BY record_date, account_id ORDER BY record_date, account_id")
+        return [(str(r.record_date), r.account_id, float(r.total)) for r in rows]
+
+
+class TestDailyPortfolioTotals(HistoryTestCase):
+    def test_repeated_date_upserts_one_rollup_row(self):
+        self.db.add_daily_result('2024-01-02', 'user_0', 40.0, 100.0, {})
+        self.db.upsert_daily_record('2024-01-02', 'user_0', 110.0)
+        self.db.upsert_daily_record('2024-01-02', 'user_0', 125.0)
+        self.db.upsert_daily_record('2024-01-02', 'user_0', 5.0, symbol='cash')  # not a total: no rollup change
+        self.assertEqual(self.rollup(), [('2024-01-02', 'user_0', 125.0)])
+        self.assertEqual(self.rollup(), self.totals_from_records())
+
+    def test_rebuild_matches_daily_records(self):
+        self.db.add_daily_result('2024-01-02', 'user_0', 40.0, 100.0, {'AAPL': {'quantity': 1, 'last_price': 60.0}})
+        self.db.add_daily_result('2024-01-02', 'user_1', 10.0, 50.0, {})
+        self.db.add_daily_result('2024-01-03', 'user_0', 30.0, 120.0, {})
+        # Manual SQL behind the rollup's back: an edited total and a missing rollup row
+        self.execute("UPDATE daily_records SET amount = 70 WHERE record_date = '2024-01-02' "
+                     "AND account_id = 'user_1' AND symbol = 'total'")
+        self.execute("DELETE FROM daily_portfolio_totals WHERE record_date = '2024-01-03'")
+        self.assertNotEqual(self.rollup(), self.totals_from_records())
+
+        self.assertEqual(self.db.rebuild_daily_portfolio_totals(), 3)
+        self.assertEqual(self.rollup(), self.totals_from_records())
+        self.assertEqual(self.db.get_daily_total_values(50), [
+            {'record_date': '2024-01-02', 'total_value': 170.0},
+            {'record_date': '2024-01-03', 'total_value': 120.0},
+        ])
+
+    def test_adjacent_date_reads_rollup(self):
+        for day in ('2024-01-02', '2024-01-04', '2024-01-08'):
+            self.db.add_daily_result(day, 'user_0', 0.0, 100.0, {})
+        # A snapshot written straight into daily_records is not visible until the rollup is rebuilt
+        self.execute("INSERT INTO daily_records (record_date, account_id, symbol, amount) "
+                     "VALUES ('2024-01-05', 'user_0', 'total', 100)")
+        self.assertEqual(self.db.get_adjacent_date('2024-01-08', 'prev'), '2024-01-04')
+        self.assertEqual(self.db.get_adjacent_date('2024-01-04', 'next'), '2024-01-08')
+        self.assertIsNone(self.db.get_adjacent_date('2024-01-02', 'prev'))
+        self.assertIsNone(self.db.get_adjacent_date('2024-01-08', 'next'))
+
+        self.db.rebuild_daily_portfolio_totals()
+        self.assertEqual(self.db.get_adjacent_date('2024-01-08', 'prev'), '2024-01-05')
+        self.assertEqual(self.db.get_adjacent_date('2024-01-04', 'next'), '2024-01-05')
+
+
+class TestAllocationCache(HistoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.statements = []
+        listener = lambda conn, cursor, statement, *args: self.statements.append(statement)
+        event.listen(self.db.engine, 'before_cursor_execute', listener)
+        self.addCleanup(event.remove, self.db.engine, 'before_cursor_execute', listener)
+        self.db.add_daily_result('2024-01-02', 'user_0', 40.0, 100.0, {'AAPL': {'quantity': 1, 'last_price': 60.0}})
+        self.db.add_daily_result('2024-01-03', 'user_0', 30.0, 120.0, {'AAPL': {'quantity': 1, 'last_price': 90.0}})
+
+    def allocation(self):
+        self.statements.clear()
+        allocations, total_value = self.db.get_consolidated_portfolio_allocation()
+        return {a['symbol']: a['total_value'] for a in allocations}, total_value, len(self.statements)
+
+    def test_one_query_per_load_and_none_when_cached(self):
+        self.assertEqual(self.allocation(), ({'AAPL': 90.0, 'cash': 30.0}, 120.0, 1))
+        self.assertEqual(self.allocation(), ({'AAPL': 90.0, 'cash': 30.0}, 120.0, 0))
+        self.assertEqual(self.db._allocation_cache[2], ('2024-01-03', 120.0))
+
+    def test_writes_in_this_process_invalidate(self):
+        self.allocation()
+        self.db.add_daily_result('2024-01-04', 'user_0', 20.0, 150.0, {'AAPL': {'quantity': 1, 'last_price': 130.0}})
+        self.assertEqual(self.allocation(), ({'AAPL': 130.0, 'cash': 20.0}, 150.0, 1))
+        self.db.upsert_daily_record('2024-01-04', 'user_0', 200.0)
+        self.assertEqual(self.allocation()[1:], (200.0, 1))
+        record = self.db.get_daily_records_by_date('2024-01-04')[0]
+        self.db.update_daily_record(record['id'], 180.0)
+        self.assertEqual(self.allocation()[1:], (180.0, 1))
+
+    def expired(self):
+        return mock.patch('library.db_modules.history_mixin.time.monotonic',
+                          return_value=self.db._allocation_cache[1] + self.db.allocation_cache_seconds + 1)
+
+    def test_other_process_writes_show_up_after_expiry(self):
+        self.allocation()
+        # Another process (the trader) writes a snapshot: no version bump here
+        other = DatabaseHandler.__new__(DatabaseHandler)
+        other.__dict__.update(self.db.__dict__, _history_version=0)
+        other.add_daily_result('2024-01-04', 'user_0', 20.0, 150.0, {})
+        self.assertEqual(self.allocation()[1:], (120.0, 0))
+        # Snapshot check + reload
+        with self.expired():
+            self.assertEqual(self.allocation()[1:], (150.0, 2))
+        # Same day snapshot rewritten with a new total
+        other.upsert_daily_record('2024-01-04', 'user_0', 160.0)
+        with self.expired():
+            self.assertEqual(self.allocation()[1:], (160.0, 2))
+
+    def test_expiry_without_new_snapshot_keeps_the_cache(self):
+        self.allocation()
+        with self.expired():
+            self.assertEqual(self.allocation(), ({'AAPL': 90.0, 'cash': 30.0}, 120.0, 1))
+        # The check extended the cache: nothing is read until it expires again
+        self.assertEqual(self.allocation()[2], 0)
+
+
+class TestContributionAggregates(HistoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.insert_sql = f"""
+            {insert_ignore(self.db.dialect)} INTO contribution_history
+            (account_number, activity_id, transaction_date, type, amount, description)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        self.db.execute_many(self.insert_sql, [
+            ('1111', 1, datetime.datetime(2024, 1, 2, 10, 0), 'JOURNAL', 100.0, ''),
+            ('1111', 2, datetime.datetime(2024, 1, 3, 10, 0), 'JOURNAL', 50.0, ''),
+            ('2222', 3, datetime.datetime(2024, 1, 3, 11, 0), 'JOURNAL', -20.0, ''),
+        ])
+        self.db.refresh_contribution_aggregates(['1111', '2222'])
+
+    def contributions(self):
+        return {a['id']: a['contribution'] for a in self.db.get_accounts()}
+
+    def test_refresh_matches_history(self):
+        self.assertEqual(self.contributions(), {'user_0': 150.0, 'user_1': -20.0})
+        self.assertEqual(self.db.get_daily_contributions(), {'2024-01-02': 100.0, '2024-01-03': 30.0})
+        # Re-loading the same activities is ignored, new ones only touch their account and days
+        self.db.execute_many(self.insert_sql, [
+            ('1111', 2, datetime.datetime(2024, 1, 3, 10, 0), 'JOURNAL', 50.0, ''),
+            ('2222', 4, datetime.datetime(2024, 1, 4, 9, 0), 'JOURNAL', 70.0, ''),
+        ])
+        self.db.refresh_contribution_aggregates(['2222'], datetime.datetime(2024, 1, 4))
+        self.assertEqual(self.contributions(), {'user_0': 150.0, 'user_1': 50.0})
+        self.assertEqual(self.db.get_daily_contributions(),
+                         {'2024-01-02': 100.0, '2024-01-03': 30.0, '2024-01-04': 70.0})
+
+    def test_account_without_history_loses_its_total(self):
+        self.execute("DELETE FROM contribution_history WHERE account_number = '2222'")
+        self.db.refresh_contribution_aggregates(['2222'], datetime.datetime(2024, 1, 3))
+        self.assertEqual(self.contributions(), {'user_0': 150.0, 'user_1': 0})
+        self.assertEqual(self.db.get_daily_contributions(), {'2024-01-02': 100.0, '2024-01-03': 50.0})
+        rows = self.execute("SELECT account_number FROM contribution_totals").fetchall()
+        self.assertEqual([r.account_number for r in rows], ['1111'])
+
+    def test_rebuild(self):
+        self.execute("UPDATE contribution_totals SET total_amount = 999")
+        self.execute("DELETE FROM contribution_daily_totals")
+        self.db.rebuild_contribution_aggregates()
+        self.assertEqual(self.contributions(), {'user_0': 150.0, 'user_1': -20.0})
+        self.assertEqual(self.db.get_daily_contributions(), {'2024-01-02': 100.0, '2024-01-03': 30.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from library.clock import SimulatedClock
+from library.intraday_tracker import IntradayTracker
+from library.mysql_helper import DatabaseHandler
+from library.paper_broker import PaperExchange
+from strategies.paper_strategy import PaperMarketStrategy
+from trader import TradingSystem
+
+
+class TestIntradayTracker(unittest.TestCase):
+    def test_high_low_and_dirty(self):
+        tracker = IntradayTracker()
+        for price in (100.0, 98.0, 103.5, 101.0, 97.0):
+            tracker.observe('AAPL', price)
+        self.assertEqual(tracker.observe('MSFT', 400.0), 400.0)
+        self.assertEqual(tracker.observe('AAPL', 102.0), 103.5)
+        self.assertEqual((tracker.high('AAPL'), tracker.low('AAPL')), (103.5, 97.0))
+        self.assertEqual((tracker.high('NVDA'), tracker.low('NVDA')), (0.0, None))
+        self.assertEqual(tracker.drain_highs(), {'AAPL': 103.5, 'MSFT': 400.0})
+        # Only new highs make a symbol dirty again
+        tracker.observe('AAPL', 90.0)
+        self.assertEqual(tracker.drain_highs(), {})
+        tracker.observe('AAPL', 104.0)
+        self.assertEqual(tracker.drain_highs(), {'AAPL': 104.0})
+        tracker.reset()
+        self.assertEqual((tracker.highs, tracker.lows, tracker.observed), ({}, {}, 0))
+
+
+class TestIntradayHighs(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = DatabaseHandler(os.path.join(self.test_dir, 'intraday.sqlite'), backend='sqlite')
+        self.db.bootstrap_schema('us')
+        for u in range(2):
+            self.db.add_account(f'user{u}_0', f'user{u}', f'10{u}', 'Main')
+            self.db.update_account_hash(f'10{u}', f'hash_{u}', f'user{u}')
+            self.db.add_trading_rule(f'user{u}_0', 'AAPL', 10.0, 'high_percent', 20, 500.0, 1, 1)
+        self.db.add_trading_rule('user0_0', 'MSFT', 95.0, 'price', 20, 500.0, 1, 1)
+        # user0 holds AAPL with a tracked high of 100; user1 has no position (high_price 0)
+        self.db.update_current_price_quantity(1, 95.0, 10, 90.0, 100.0)
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        shutil.rmtree(self.test_dir)
+
+    def high_prices(self):
+        return {rule['id']: rule['high_price'] for rule in self.db.get_all_trading_rules()}
+
+    def test_update_high_prices_only_raises_tracked_highs(self):
+        self.db.update_current_price_quantity(3, 95.0, 0, 0, 300.0)  # a 'price' rule with a stored high
+        self.db.update_high_prices({'AAPL': 99.0, 'MSFT': 500.0})
+        self.assertEqual(self.high_prices(), {1: 100.0, 2: 0.0, 3: 300.0})
+        self.db.update_high_prices({'AAPL': 120.5})
+        self.assertEqual(self.high_prices(), {1: 120.5, 2: 0.0, 3: 300.0})
+        self.db.update_high_prices({})
+
+    def test_loop_buys_below_intraday_high_and_batches_writes(self):
+        clock = SimulatedClock(datetime(2024, 1, 2, 15, 0))
+        prices = {'MSFT': 100.0}
+        path = [100.0, 110.0, 120.0, 112.0, 107.0, 105.0, 104.0]
+
+        def publish():
+            step = int((clock.now() - datetime(2024, 1, 2, 15, 0)).total_seconds() // 600)
+            prices['AAPL'] = path[min(step, len(path) - 1)]
+
+        clock.call_every(600, publish)
+        exchange = PaperExchange(prices, clock=clock)
+        exchange.load_accounts(self.db, cash=3000.0)
+        system = TradingSystem(PaperMarketStrategy(exchange, self.db), clock=clock)
+        system.send_alert = lambda msg: None
+        flushes = []
+        update_high_prices = self.db.update_high_prices
+
+        def recording_update(highs):
+            flushes.append(dict(highs))
+            update_high_prices(highs)
+
+        self.db.update_high_prices = recording_update
+        system.process_trading_rules()
+
+        # The stored high (100) alone would need <= 90; the intraday high 120 moves the trigger to 108
+        fills = [(f['hash_value'], f['price'], f['at'].strftime('%H:%M')) for f in exchange.fills]
+        self.assertEqual(fills, [('hash_0', 107.0, '15:40')])
+        self.assertEqual(system.intraday.high('AAPL'), 120.0)
+        # One batch per new high over a ~3600-cycle session, the last one written at close
+        self.assertEqual([f.get('AAPL') for f in flushes], [100.0, 110.0, 120.0])
+        self.assertEqual(self.high_prices(), {1: 120.0, 2: 0.0, 3: 0.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
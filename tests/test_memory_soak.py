@@ -0,0 +1,92 @@
+import unittest
+import logging
+import tracemalloc
+from datetime import datetime
+
+from library.clock import SimulatedClock
+from library.memory_monitor import MemoryMonitor
+from library.models import Position
+from library.mysql_helper import DatabaseHandler
+from library.paper_broker import PaperExchange
+from library.synthetic_market import SyntheticMarket
+from strategies.paper_strategy import PaperMarketStrategy
+from trader import TradingSystem
+
+OPEN_TIME = datetime(2024, 1, 2, 9, 30)  # Tuesday
+TICK_SECONDS = 60
+
+
+class TestMemorySoak(unittest.TestCase):
+    """A full simulated session at 10x the paper-loop rule count, one cycle per virtual minute"""
+
+    def setUp(self):
+        self.db = DatabaseHandler(':memory:', backend='sqlite')
+        self.addCleanup(self.db.engine.dispose)
+        self.db.bootstrap_schema('us')
+        market = SyntheticMarket('schwab', n_symbols=12, days=1, tick_seconds=TICK_SECONDS, seed=3,
+                                 jumps_per_day=0.0, sigma=(0.3, 0.6))
+        _, self.prices = market.generate_day(0)
+        self.index = {s: k for k, s in enumerate(market.symbols)}
+        for u in range(5):
+            for a in range(2):
+                account_id, number = f'user{u}_{a}', f'{u}{a}'
+                self.db.add_account(account_id, f'user{u}', number, 'Main')
+                self.db.update_account_hash(number, f'hash_{number}', f'user{u}')
+                for k, symbol in enumerate(market.symbols):
+                    open_price = float(self.prices[k, 0])
+                    self.db.add_trading_rule(account_id, symbol, round(open_price * 0.98, 2), 'price',
+                                             1000, 300.0, 1, 1)
+
+    def price_source(self, symbol, now):
+        tick = int((now - OPEN_TIME).total_seconds() // TICK_SECONDS)
+        return float(self.prices[self.index[symbol], min(tick, self.prices.shape[1] - 1)])
+
+    def test_full_day_memory_stays_flat(self):
+        clock = SimulatedClock(OPEN_TIME)
+        exchange = PaperExchange(self.price_source, clock=clock)
+        exchange.load_accounts(self.db, cash=1e6)
+        system = TradingSystem(PaperMarketStrategy(exchange, self.db), clock=clock)
+        system.send_alert = lambda msg: None
+        system.cycle_interval = TICK_SECONDS
+        system.memory_monitor = MemoryMonitor(every=30)
+        system.logger.setLevel(logging.ERROR)  # keep captured log output out of the measurement
+        self.addCleanup(system.logger.setLevel, logging.DEBUG)
+
+        tracemalloc.start()
+        try:
+            system.process_trading_rules()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(clock.now().strftime('%H:%M'), '16:00')
+        self.assertEqual(system.cycle_count, 6.5 * 3600 / TICK_SECONDS)
+        self.assertGreater(len(exchange.fills), 0)
+        samples = [s for s in system.memory_monitor.samples if 'traced_mb' in s]
+        self.assertEqual([s['cycle'] for s in samples[:3]], [30, 60, 90])
+        # After the first hour nothing accumulates: traced memory and the held structures stay flat
+        settled = [s for s in samples if s['cycle'] >= 60]
+        traced = [s['traced_mb'] for s in settled]
+        self.assertLess(max(traced) - min(traced), 0.5, traced)
+        self.assertEqual({s['sizes']['rules'] for s in settled[:-1]}, {120})
+        # Position caches only grow by symbols actually bought, never per cycle
+        self.assertTrue(all(s['sizes']['positions'] <= 120 for s in samples))
+        self.assertEqual(len({s['sizes']['positions_result'] for s in settled[:-1]}), 1)
+        self.assertIsInstance(next(iter(system.positions_result_by_account['hash_00'].values())), Position)
+
+
+class TestCompactRecords(unittest.TestCase):
+    def test_position_reads_like_the_manager_dict(self):
+        raw = {"quantity": "7", "average_price": 51.5, "last_price": 53.0}  # KoreaManager returns str quantities
+        position = Position.from_mapping(raw)
+        self.assertEqual(position['quantity'], "7")
+        self.assertEqual(position.get('last_price'), 53.0)
+        self.assertIsNone(position.get('missing'))
+        self.assertIn('average_price', position)
+        self.assertEqual(position, raw)
+        self.assertEqual(position.to_dict(), raw)
+        with self.assertRaises(KeyError):
+            position['missing']
+        self.assertFalse(hasattr(position, '__dict__'))
+
+if __name__ == '__main__':
+    unittest.main()
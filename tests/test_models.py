@@ -0,0 +1,106 @@
+import unittest
+import random
+from decimal import Decimal
+
+from library.models import Rule, BUY, SELL, load_rules
+
+
+def legacy_decision(rule, last_price):
+    """The per-tick branch chain trader.py used on raw rule dicts"""
+    action = rule['trade_action']
+    if rule.get('limit_type') in ['weekly', 'monthly']:
+        return 'BUY' if action == BUY else None
+    if rule.get('limit_type') == 'percent':
+        if rule.get('average_price') is None or rule['average_price'] == 0:
+            return 'BUY' if action == BUY else None
+        percent = rule['limit_value']
+        if action == BUY and last_price <= rule['average_price'] * (1 - percent / 100):
+            return 'BUY'
+        if action == SELL and last_price >= rule['average_price'] * (1 + percent / 100):
+            return 'SELL'
+        return None
+    if rule.get('limit_type') == 'high_percent':
+        if action == BUY and rule.get('high_price', 0) > 0:
+            if last_price <= rule['high_price'] * (1 - rule['limit_value'] / 100):
+                return 'BUY'
+        return None
+    if action == BUY and last_price <= rule['limit_value']:
+        return 'BUY'
+    if action == SELL and last_price >= rule['limit_value']:
+        return 'SELL'
+    return None
+
+
+def decision(rule, last_price):
+    if rule.trade_action == BUY and last_price <= rule.buy_below:
+        return 'BUY'
+    if rule.trade_action == SELL and last_price >= rule.sell_above:
+        return 'SELL'
+    return None
+
+
+def row(**kwargs):
+    base = {"id": 1, "account_id": "user_0", "symbol": "AAPL", "trade_action": BUY, "limit_value": 100.0,
+            "limit_type": "price", "target_amount": 10, "daily_money": 1000.0, "cash_only": 1,
+            "current_holding": 0, "average_price": 0.0, "last_price": 0.0, "high_price": 0.0,
+            "last_updated": None, "status": "ACTIVE", "user_id": "user", "hash_value": "hash_a",
+            "description": "Main"}
+    base.update(kwargs)
+    return base
+
+
+class TestRule(unittest.TestCase):
+    def test_converts_numerics_once(self):
+        rule = Rule.from_row(row(limit_value=Decimal('12.50'), daily_money=Decimal('300.00'),
+                                 high_price=None, target_amount=Decimal('7')))
+        self.assertEqual((rule.limit_value, rule.daily_money, rule.high_price, rule.target_amount),
+                         (12.5, 300.0, 0.0, 7))
+        self.assertIsInstance(rule.limit_value, float)
+        self.assertIsInstance(rule.target_amount, int)
+
+    def test_reads_like_the_row_dict(self):
+        source = row(limit_type='percent', average_price=None)
+        rule = Rule.from_row(dict(source, stock_name=None, extra_col='x'))
+        self.assertEqual(rule['symbol'], 'AAPL')
+        self.assertIsNone(rule.get('average_price'))
+        self.assertNotIn('stock_name', rule)  # US rows have no stock_name
+        self.assertEqual(rule.display_symbol, 'AAPL')
+        self.assertEqual(rule['extra_col'], 'x')
+        self.assertEqual(rule.to_dict(), dict(source, extra_col='x'))
+        self.assertFalse(hasattr(rule, '__dict__'))
+
+        kr = Rule.from_row(row(symbol='005930', stock_name='삼성전자'))
+        self.assertIn('stock_name', kr)
+        self.assertEqual(kr.display_symbol, '삼성전자')
+
+    def test_thresholds_match_the_legacy_branches(self):
+        rng = random.Random(11)
+        for _ in range(2000):
+            source = row(trade_action=rng.choice([BUY, SELL]),
+                         limit_type=rng.choice(['price', 'percent', 'high_percent', 'weekly', 'monthly']),
+                         limit_value=round(rng.uniform(1, 150), 2),
+                         average_price=rng.choice([None, 0.0, round(rng.uniform(50, 150), 2)]),
+                         high_price=rng.choice([0.0, round(rng.uniform(50, 150), 2)]))
+            rule = Rule.from_row(source)
+            for price in (round(rng.uniform(20, 200), 2), source['limit_value']):
+                self.assertEqual(decision(rule, price), legacy_decision(source, price), (source, price))
+
+    def test_refresh_thresholds_with_live_high(self):
+        rule = Rule.from_row(row(limit_type='high_percent', limit_value=10.0, high_price=100.0))
+        self.assertEqual(rule.buy_below, 90.0)
+        rule.refresh_thresholds(high_price=120.0)
+        self.assertAlmostEqual(rule.buy_below, 108.0)
+        self.assertEqual(rule.sell_above, float('inf'))
+
+    def test_load_rules_reuses_unchanged_rows(self):
+        cache = {}
+        first = load_rules([row(id=1), row(id=2, symbol='MSFT')], cache)
+        again = load_rules([row(id=1), row(id=2, symbol='MSFT', limit_value=90.0)], cache)
+        self.assertIs(again[0], first[0])
+        self.assertIsNot(again[1], first[1])
+        self.assertEqual(again[1].buy_below, 90.0)
+        load_rules([row(id=2, symbol='MSFT', limit_value=90.0)], cache)
+        self.assertEqual(list(cache), [2])  # rules that left the active set are dropped
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from sqlalchemy import text
+from library.clock import MockClock, SimulatedClock
+from library.mysql_helper import DatabaseHandler
+from library.paper_broker import PaperExchange, PaperBroker, PaperBrokerError
+from strategies.paper_strategy import PaperMarketStrategy
+from trader import TradingSystem
+
+OPEN_TIME = datetime(2024, 1, 2, 10, 0)  # Tuesday
+
+
+class TestPaperBroker(unittest.TestCase):
+    def setUp(self):
+        self.prices = {'AAPL': 100.0, 'BIL': 91.5}
+        self.clock = MockClock(OPEN_TIME)
+        self.exchange = PaperExchange(self.prices, clock=self.clock)
+        self.exchange.add_account('user', '1111', 'hash_a', cash=1000.0, positions={'BIL': (10, 91.0)})
+        self.broker = PaperBroker('user', self.exchange)
+
+    def test_marketable_limit_fills_at_current_price(self):
+        order = self.broker.place_limit_buy_order('hash_a', 'AAPL', 5, 101.0)
+        self.assertTrue(order.is_success)
+        self.assertEqual((order.status, order.fill_price), ('FILLED', 100.0))
+        self.assertEqual(self.broker.get_cash('hash_a'), 500.0)
+        self.assertEqual(self.broker.get_positions('hash_a'), {'BIL': 10, 'AAPL': 5})
+        result = self.broker.get_positions_result('hash_a')['AAPL']
+        self.assertEqual((result['average_price'], result['last_price']), (100.0, 100.0))
+
+    def test_resting_order_reserves_and_fills_on_cross(self):
+        order = self.broker.place_limit_buy_order('hash_a', 'AAPL', 5, 95.0)
+        self.assertEqual(order.status, 'OPEN')
+        self.assertEqual(self.broker.get_cash('hash_a'), 525.0)  # 475 reserved
+        # Cash that is reserved cannot be spent twice
+        self.assertFalse(self.broker.place_limit_buy_order('hash_a', 'AAPL', 6, 95.0).is_success)
+
+        self.prices['AAPL'] = 94.0
+        self.assertEqual(self.broker.get_last_price('AAPL'), 94.0)
+        self.assertEqual((order.status, order.fill_price), ('FILLED', 94.0))
+        self.assertEqual(self.broker.get_cash('hash_a'), 1000.0 - 5 * 94.0)
+
+        resting = self.broker.place_limit_sell_order('hash_a', 'AAPL', 5, 120.0)
+        self.assertEqual(self.exchange.end_of_day(), 1)
+        self.assertEqual(resting.status, 'CANCELED')
+        self.assertFalse(self.broker.place_limit_sell_order('hash_a', 'AAPL', 6, 90.0).is_success)
+
+    def test_sell_etf_for_cash(self):
+        order = self.broker.sell_etf_for_cash('hash_a', 200.0, {'BIL': 10})
+        self.assertEqual((order.status, order.quantity), ('FILLED', 3))  # ceil(200 / 91.5)
+        self.assertAlmostEqual(self.broker.get_cash('hash_a'), 1000.0 + 3 * 91.5)
+        self.assertIsNone(self.broker.sell_etf_for_cash('hash_a', 200.0, {}))
+
+    def test_latency_and_error_injection(self):
+        exchange = PaperExchange(self.prices, clock=self.clock, latency=0.25, error_rate=0.5, seed=1,
+                                 error_methods=['get_last_price', 'place_limit_buy_order'])
+        exchange.add_account('user', '1111', 'hash_a', cash=1e9)
+        broker = PaperBroker('user', exchange)
+
+        failures = 0
+        for _ in range(200):
+            try:
+                broker.get_last_price('AAPL')
+            except PaperBrokerError:
+                failures += 1
+        self.assertTrue(60 < failures < 140, failures)
+        orders = [broker.place_limit_buy_order('hash_a', 'AAPL', 1, 100.0) for _ in range(100)]
+        self.assertTrue(any(not o.is_success for o in orders) and any(o.is_success for o in orders))
+        self.assertEqual(broker.get_cash('hash_a'), 1e9 - 100.0 * sum(o.is_success for o in orders))
+        # Latency is spent on the (mocked) clock
+        self.assertEqual((self.clock.now() - OPEN_TIME).total_seconds(), 0.25 * 301)
+
+    def test_market_hours_and_foreign_account(self):
+        self.assertTrue(self.broker.get_market_hours())
+        self.clock.set_time(datetime(2024, 1, 2, 16, 0))
+        self.assertFalse(self.broker.get_market_hours())
+        self.clock.set_time(datetime(2024, 1, 6, 11, 0))  # Saturday
+        self.assertFalse(self.broker.get_market_hours())
+        with self.assertRaises(PaperBrokerError):
+            PaperBroker('other', self.exchange).get_cash('hash_a')
+
+
+class TestPaperTradingLoop(unittest.TestCase):
+    """The real TradingSystem loop against the paper exchange and a SQLite DB"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db = DatabaseHandler(os.path.join(self.test_dir, 'paper.sqlite'), backend='sqlite')
+        self.db.bootstrap_schema('us')
+        symbols = ['AAPL', 'MSFT', 'NVDA', 'QQQ']
+        for u in range(3):
+            user, account_id = f'user{u}', f'user{u}_0'
+            self.db.add_account(account_id, user, f'10{u}', 'Main')
+            self.db.update_account_hash(f'10{u}', f'hash_{u}', user)
+            for k, symbol in enumerate(symbols):
+                self.db.add_trading_rule(account_id, symbol, 99.0 - k, 'price', 20, 500.0, 1, 1)
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        shutil.rmtree(self.test_dir)
+
+    def test_loop_trades_against_paper_exchange(self):
+        clock = MockClock(datetime(2024, 1, 2, 15, 58))
+
+        def price_source(symbol, now):
+            # Every symbol slides 1.0 per minute from 100 during the last minutes of the session
+            return round(100.0 - (now - datetime(2024, 1, 2, 15, 58)).total_seconds() / 60, 2)
+
+        exchange = PaperExchange(price_source, clock=clock, latency=0.001)
+        self.assertEqual(exchange.load_accounts(self.db, cash=3000.0), 3)
+
+        system = TradingSystem(PaperMarketStrategy(exchange, self.db), clock=clock)
+        system.send_alert = lambda msg: None
+        system.process_trading_rules()
+
+        self.assertGreater(system.cycle_count, 100)
+        self.assertEqual(clock.now().strftime('%H:%M'), '16:00')
+        fills = exchange.fills
+        self.assertGreater(len(fills), 0)
+        with self.db.engine.connect() as conn:
+            recorded = conn.execute(text("select count(*), sum(used_money) from trade_history")).fetchone()
+        self.assertEqual(recorded[0], len(fills))
+        self.assertAlmostEqual(recorded[1], sum(f['quantity'] * f['price'] for f in fills))
+        # Daily money is respected per rule
+        for rule in self.db.get_all_trading_rules():
+            spent = sum(f['quantity'] * f['price'] for f in fills
+                        if f['hash_value'] == rule['hash_value'] and f['symbol'] == rule['symbol'])
+            self.assertLessEqual(spent, 500.0)
+            self.assertEqual(rule['current_holding'],
+                             exchange.accounts[rule['hash_value']].positions.get(rule['symbol'], [0])[0])
+
+    def test_full_day_on_simulated_clock(self):
+        # A price feed scheduled on the clock: the loop's sleep(1) jumps through the whole session
+        clock = SimulatedClock(datetime(2024, 1, 2, 15, 0))
+        prices = {}
+        path = [100.0, 99.5, 98.0, 97.2, 96.1, 99.0, 95.4, 96.8]
+
+        def publish():
+            step = int((clock.now() - datetime(2024, 1, 2, 15, 0)).total_seconds() // 600)
+            for k, symbol in enumerate(['AAPL', 'MSFT', 'NVDA', 'QQQ']):
+                prices[symbol] = path[(step + k) % len(path)]
+
+        clock.call_every(600, publish)
+        exchange = PaperExchange(prices, clock=clock)
+        exchange.load_accounts(self.db, cash=3000.0)
+        system = TradingSystem(PaperMarketStrategy(exchange, self.db), clock=clock)
+        system.send_alert = lambda msg: None
+        system.process_trading_rules()
+
+        self.assertEqual(clock.now().strftime('%H:%M'), '16:00')
+        self.assertEqual(clock.events_fired, 7)  # 15:00 .. 16:00 every 10 minutes
+        self.assertEqual(system.cycle_count, int(clock.slept))
+        fills = [(f['hash_value'], f['symbol'], f['quantity'], f['price'], f['at'].strftime('%H:%M'))
+                 for f in exchange.fills]
+        # Each rule fills once, in the cycle right after the price that crosses its limit is published
+        first = {}
+        for hash_value, symbol, quantity, price, at in fills:
+            first.setdefault(symbol, (price, at))
+        self.assertEqual(first, {'MSFT': (98.0, '15:10'), 'AAPL': (98.0, '15:20'),
+                                 'NVDA': (96.1, '15:20'), 'QQQ': (95.4, '15:30')})
+        self.assertEqual(len(fills), 12)
+        self.assertTrue(all(f[2] == 5 for f in fills))  # 500 of daily money per rule
+
+if __name__ == '__main__':
+    unittest.main()
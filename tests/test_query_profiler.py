@@ -0,0 +1,67 @@
+import unittest
+import json
+from unittest.mock import MagicMock
+from library.mysql_helper import DatabaseHandler
+from library.query_profiler import QueryProfiler
+
+class TestQueryProfiler(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseHandler(':memory:', backend='sqlite')
+        self.db.bootstrap_schema('us')
+        self.db.add_account('user_0', 'user', '1111', 'Main')
+        self.logger = MagicMock()
+        self.profiler = QueryProfiler(n_plus_one_threshold=3, logger=self.logger)
+        self.profiler.attach(self.db.engine)
+
+    def tearDown(self):
+        self.profiler.detach()
+
+    def test_queries_outside_unit_are_ignored(self):
+        self.db.get_users()
+        self.assertEqual(self.profiler.to_dict()['units'], 0)
+
+    def test_unit_summary_counts_and_callers(self):
+        with self.profiler.unit('cycle', 'cycle-1'):
+            self.db.get_users()
+            self.db.get_active_trading_rules()
+
+        summary = self.profiler.summaries[-1]
+        self.assertEqual(summary['kind'], 'cycle')
+        self.assertEqual(summary['query_count'], 2)
+        self.assertEqual(summary['n_plus_one'], [])
+        callers = {c for s in summary['statements'] for c in s['callers']}
+        self.assertTrue(any(c.startswith('account_mixin.') and c.endswith('get_users') for c in callers))
+        self.assertTrue(any(c.endswith('get_active_trading_rules') for c in callers))
+        rows = {s['sql']: s['rows'] for s in summary['statements']}
+        self.assertTrue(all(r >= 0 for r in rows.values()))
+
+    def test_nested_helper_attributed_to_outer_method(self):
+        with self.profiler.unit('cycle', 'cycle-1'):
+            self.db.add_daily_result('2024-01-02', 'user_0', 10.0, 10.0, {})
+        callers = {c for s in self.profiler.summaries[-1]['statements'] for c in s['callers']}
+        self.assertEqual(len(callers), 1)
+        self.assertTrue(callers.pop().endswith('add_daily_result'))
+
+    def test_n_plus_one_warning(self):
+        self.db.add_trading_rule('user_0', 'AAPL', 150.0, 'price', 10, 1000.0, 1, 1)
+        rule_id = self.db.get_active_trading_rules()[0]['id']
+        with self.profiler.unit('cycle', 'cycle-2'):
+            for _ in range(5):
+                self.db.get_trade_today(rule_id)
+
+        summary = self.profiler.summaries[-1]
+        self.assertEqual(len(summary['n_plus_one']), 1)
+        self.assertEqual(summary['n_plus_one'][0]['count'], 5)
+        self.logger.warning.assert_called_once()
+        self.assertIn('[SQL N+1]', self.logger.warning.call_args[0][0])
+
+    def test_json_summary(self):
+        with self.profiler.unit('request', 'GET /'):
+            self.db.get_accounts()
+        data = json.loads(self.profiler.to_json())
+        self.assertEqual(data['units'], 1)
+        self.assertEqual(data['total_queries'], 1)
+        self.assertEqual(data['summaries'][0]['name'], 'GET /')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from library.recorder import AsyncDataRecorder
+
+class TestRecorderBatching(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.test_dir, "batch_log.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _read_records(self):
+        with open(self.log_file, 'r') as f:
+            return [json.loads(line) for line in f if '"meta"' not in line]
+
+    def test_entries_are_grouped_into_batches(self):
+        recorder = AsyncDataRecorder(self.log_file, batch_max_entries=100, batch_max_ms=500)
+        for i in range(1000):
+            recorder.record('get_last_price', ['AAPL'], {}, result=100.0 + i)
+        recorder.close()
+
+        records = self._read_records()
+        self.assertEqual(len(records), 1000)
+        # Order is preserved across batches
+        self.assertEqual([r['result'] for r in records], [100.0 + i for i in range(1000)])
+
+        stats = recorder.get_stats()
+        self.assertEqual(stats['entries'], 1000)
+        self.assertLess(stats['batches'], 1000)
+        self.assertLessEqual(stats['max_batch_entries'], 100)
+        self.assertGreater(stats['write_entries_per_sec'], 0)
+
+    def test_byte_bound_closes_batch(self):
+        recorder = AsyncDataRecorder(self.log_file, batch_max_entries=10000, batch_max_bytes=1, batch_max_ms=500)
+        for i in range(5):
+            recorder.record('get_cash', ['hash'], {}, result=i)
+        recorder.close()
+        self.assertEqual(recorder.get_stats()['batches'], 5)
+
+    @patch('library.recorder.os.fsync')
+    def test_fsync_per_batch(self, mock_fsync):
+        recorder = AsyncDataRecorder(self.log_file, fsync_policy='batch')
+        recorder.record('get_cash', ['hash'], {}, result=1)
+        recorder.close()
+        stats = recorder.get_stats()
+        # One per batch plus the final fsync on shutdown
+        self.assertEqual(mock_fsync.call_count, stats['batches'] + 1)
+        self.assertEqual(stats['fsyncs'], mock_fsync.call_count)
+
+    @patch('library.recorder.os.fsync')
+    def test_no_fsync_by_default(self, mock_fsync):
+        recorder = AsyncDataRecorder(self.log_file)
+        recorder.record('get_cash', ['hash'], {}, result=1)
+        recorder.close()
+        mock_fsync.assert_not_called()
+
+    def test_invalid_fsync_policy(self):
+        with self.assertRaises(ValueError):
+            AsyncDataRecorder(self.log_file, fsync_policy='always')
+
+if __name__ == '__main__':
+    unittest.main()
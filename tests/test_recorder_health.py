@@ -0,0 +1,178 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+from library.recorder import AsyncDataRecorder
+from library.recording_io import iter_recording
+from library.replay import ReplaySession, RecordingHealth
+
+class TestRecorderHealth(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.test_dir, "market_data_schwab_20240109.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _read(self):
+        with open(self.log_file) as f:
+            return [json.loads(line) for line in f]
+
+    def _stalled_recorder(self, **kwargs):
+        """Recorder whose writer is blocked until the gate is set so the queue fills up"""
+        gate = threading.Event()
+        original = AsyncDataRecorder._collect_batch
+
+        def blocked(recorder_self):
+            gate.wait()
+            return original(recorder_self)
+
+        patcher = patch.object(AsyncDataRecorder, '_collect_batch', blocked)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        recorder = AsyncDataRecorder(self.log_file, queue_size=10, **kwargs)
+        return recorder, gate
+
+    def test_counters_and_trailer(self):
+        recorder = AsyncDataRecorder(self.log_file)
+        for i in range(20):
+            recorder.record('get_cash', ['hash'], {}, result=i)
+        recorder.close()
+
+        records = self._read()
+        entries = [r for r in records if 'meta' not in r]
+        self.assertEqual([e['seq'] for e in entries], list(range(20)))
+        trailer = records[-1]['meta']
+        self.assertEqual(trailer['type'], 'session_end')
+        self.assertEqual(trailer['recorder']['written'], 20)
+        self.assertEqual(trailer['recorder']['enqueued'], 20)
+        self.assertEqual(trailer['recorder']['dropped'], 0)
+        self.assertEqual(trailer['recorder']['seq_issued'], 20)
+
+        stats = recorder.get_stats()
+        self.assertGreaterEqual(stats['queue_high_water'], 1)
+        self.assertGreater(stats['max_write_ms'], 0)
+        self.assertTrue(ReplaySession(self.log_file).recording_health['gapless'])
+
+    def test_drop_newest_is_detected_by_replay(self):
+        recorder, gate = self._stalled_recorder()
+        for i in range(15):
+            recorder.record('get_cash', ['hash'], {}, result=i)
+        self.assertEqual(recorder.stats['dropped'], 5)
+        self.assertEqual(recorder.stats['queue_high_water'], 10)
+        gate.set()
+        recorder.close()
+
+        self.assertEqual([e['result'] for e in self._read() if 'meta' not in e], list(range(10)))
+        health = ReplaySession(self.log_file).recording_health
+        self.assertFalse(health['gapless'])
+        self.assertEqual(health['dropped'], 5)
+        # Newest entries lost -> the trailer's seq_issued exposes the missing tail
+        self.assertEqual(health['seq_gaps'], [[9, 15]])
+
+    def test_drop_oldest_keeps_latest(self):
+        recorder, gate = self._stalled_recorder(backpressure='drop_oldest')
+        for i in range(15):
+            recorder.record('get_cash', ['hash'], {}, result=i)
+        gate.set()
+        recorder.close()
+
+        self.assertEqual([e['result'] for e in self._read() if 'meta' not in e], list(range(5, 15)))
+        self.assertEqual(recorder.stats['dropped'], 5)
+        # First five entries were evicted: the session starts at seq 5
+        self.assertEqual(ReplaySession(self.log_file).recording_health['seq_gaps'], [[-1, 5]])
+
+    def test_sample_ticks_reserves_room_for_orders(self):
+        recorder, gate = self._stalled_recorder(backpressure='sample_ticks', tick_shed_fraction=0.5)
+        for i in range(10):
+            recorder.record('get_last_price', ['AAPL'], {}, result=100.0 + i)
+        recorder.record('place_limit_buy_order', ['hash', 'AAPL', 1, 100.0], {}, result={'is_success': True})
+        gate.set()
+        recorder.close()
+
+        methods = [e['method'] for e in self._read() if 'meta' not in e]
+        self.assertEqual(methods.count('get_last_price'), 5)
+        self.assertIn('place_limit_buy_order', methods)
+        self.assertEqual(recorder.stats['dropped_orders'], 0)
+
+    def test_block_orders_waits_for_room(self):
+        recorder, gate = self._stalled_recorder(backpressure='block_orders', block_timeout=2.0)
+        for i in range(10):
+            recorder.record('get_last_price', ['AAPL'], {}, result=100.0 + i)
+        threading.Timer(0.2, gate.set).start()
+        recorder.record('place_limit_sell_order', ['hash', 'AAPL', 1, 110.0], {}, result={'is_success': True})
+        recorder.close()
+
+        self.assertEqual(recorder.stats['dropped'], 0)
+        self.assertIn('place_limit_sell_order', [e['method'] for e in self._read() if 'meta' not in e])
+
+    def test_heartbeat_records(self):
+        recorder = AsyncDataRecorder(self.log_file, heartbeat_interval=0)
+        recorder.record('get_cash', ['hash'], {}, result=1)
+        recorder.close()
+        types = [r['meta']['type'] for r in self._read() if 'meta' in r]
+        self.assertIn('heartbeat', types)
+        self.assertEqual(types[-1], 'session_end')
+
+    def test_missing_trailer_and_legacy_files(self):
+        health = RecordingHealth()
+        health.observe_meta({'type': 'session_start'})
+        health.observe_seq(0)
+        health.observe_seq(1)
+        self.assertEqual(health.to_dict()['unterminated_sessions'], 1)
+        self.assertFalse(health.to_dict()['gapless'])
+        # Recordings from before seq numbers: unknown, not a failure
+        self.assertIsNone(RecordingHealth().to_dict()['gapless'])
+
+    def _append_sessions(self, path, values):
+        for session in values:
+            recorder = AsyncDataRecorder(path)
+            for value in session:
+                recorder.record('get_cash', ['hash'], {}, result=value)
+            recorder.close()
+
+    def test_appended_sessions_are_separate(self):
+        # A restart on the same day appends to the same file; seq starts again at 0
+        for path in (self.log_file, self.log_file + '.gz'):
+            self._append_sessions(path, [[1, 2, 3], [4, 5]])
+            metas = [e['meta'] for e in iter_recording(path, include_meta=True) if 'meta' in e]
+            self.assertEqual([m['type'] for m in metas],
+                             ['session_start', 'session_end', 'session_start', 'session_end'])
+            starts = [m['session_id'] for m in metas if m['type'] == 'session_start']
+            self.assertEqual(len(set(starts)), 2)
+            self.assertEqual([m['session_id'] for m in metas if m['type'] == 'session_end'], starts)
+
+            health = ReplaySession(path).recording_health
+            self.assertEqual((health['sessions'], health['seq_gaps'], health['gapless']), (2, [], True))
+
+    def test_appended_session_after_partial_line(self):
+        self._append_sessions(self.log_file, [[1, 2]])
+        with open(self.log_file, 'a') as f:
+            f.write('{"ts": 1.0, "seq": 2, "meth')  # crash mid-write
+        self._append_sessions(self.log_file, [[3]])
+        entries = [e for e in iter_recording(self.log_file) if 'meta' not in e]
+        self.assertEqual([e['result'] for e in entries], [1, 2, 3])
+        self.assertEqual(ReplaySession(self.log_file).recording_health['sessions'], 2)
+
+    def test_headerless_appended_session(self):
+        # Files appended to before every open wrote a session_start: seq 0 starts a new session
+        health = RecordingHealth()
+        health.observe_meta({'type': 'session_start'})
+        for seq in range(3):
+            health.observe_seq(seq)
+        health.observe_meta({'type': 'session_end', 'recorder': {'seq_issued': 3}})
+        self.assertTrue(health.observe_seq(0))
+        self.assertFalse(health.observe_seq(1))
+        health.observe_meta({'type': 'session_end', 'recorder': {'seq_issued': 2}})
+        result = health.to_dict()
+        self.assertEqual((result['sessions'], result['seq_gaps'], result['gapless']), (2, [], True))
+
+    def test_invalid_backpressure(self):
+        with self.assertRaises(ValueError):
+            AsyncDataRecorder(self.log_file, backpressure='drop_all')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@ import json
 import os
 import shutil
 import tempfile
+import io
+import gzip
 from unittest.mock import patch, MagicMock
 from library.recorder import AsyncDataRecorder, apply_patches, backup_databases
 
@@ -77,9 +79,9 @@ class TestRecorderIntegration(unittest.TestCase):
         self.assertEqual(rec2['args'], ['hash1', 'AAPL', 10, 100.0])
         self.assertTrue(rec2['result']['is_success'])
 
-    @patch('library.recorder.subprocess.run')
+    @patch('library.recorder.subprocess.Popen')
     @patch('library.recorder.secret')
-    def test_backup_logic(self, mock_secret, mock_subprocess):
+    def test_backup_logic(self, mock_secret, mock_popen):
         """
         Verify that backup_databases constructs the correct mysqldump command.
         """
@@ -90,16 +92,24 @@ class TestRecorderIntegration(unittest.TestCase):
         mock_secret.db_passwd = 'test_password'
         mock_secret.db_name = 'db_us'
         mock_secret.db_name_kr = 'db_kr'
+
+        def fake_dump(cmd, **kwargs):
+            proc = MagicMock()
+            proc.stdout = io.BytesIO(f"CREATE TABLE users;\n-- Dump completed on {cmd[-1]}\n".encode())
+            proc.wait.return_value = 0
+            return proc
+        mock_popen.side_effect = fake_dump
         
         # Call function
-        backup_databases('start')
+        results = backup_databases('start', backup_dir=self.test_dir)
         
         # Verify calls
-        # Should be called twice (once for US, once for KR)
-        self.assertEqual(mock_subprocess.call_count, 2)
+        # Should be called twice (once for US, once for KR), in parallel
+        self.assertEqual(mock_popen.call_count, 2)
+        calls = sorted(mock_popen.call_args_list, key=lambda c: c.args[0][-1], reverse=True)
         
         # Check first call args (US DB)
-        args, kwargs = mock_subprocess.call_args_list[0]
+        args, kwargs = calls[0]
         cmd = args[0]
         env = kwargs['env']
         
@@ -109,9 +119,16 @@ class TestRecorderIntegration(unittest.TestCase):
         self.assertEqual(env['MYSQL_PWD'], 'test_password')
         
         # Check second call args (KR DB)
-        args, kwargs = mock_subprocess.call_args_list[1]
+        args, kwargs = calls[1]
         cmd = args[0]
         self.assertIn('db_kr', cmd)
 
+        # Dumps are gzip-compressed on the fly
+        self.assertTrue(all(r['ok'] for r in results))
+        for r in results:
+            self.assertTrue(r['path'].endswith('_start.sql.gz'))
+            with gzip.open(r['path']) as f:
+                self.assertIn(f"-- Dump completed on {r['db']}".encode(), f.read())
+
 if __name__ == '__main__':
     unittest.main()
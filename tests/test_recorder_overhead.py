@@ -0,0 +1,130 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from library.recorder import AsyncDataRecorder, apply_patches, parse_record_policy
+from library.replay import ReplaySession, ReplayManager, ReplayExhausted
+
+PRICES = [100.0, 100.0, 100.0, 101.0, 101.0, 100.0, 100.0, 100.0]
+
+def make_manager_class():
+    class Manager:
+        def __init__(self, user_id):
+            self.user_id = user_id
+            self.prices = list(PRICES)
+
+        def get_last_price(self, symbol):
+            return self.prices.pop(0)
+
+        def get_cash(self, hash_value):
+            return 1000.0
+
+        def get_market_hours(self):
+            return True
+
+    return Manager
+
+class TestRecordPolicies(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.test_dir, "market_data_schwab_20240109.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _entries(self):
+        with open(self.log_file) as f:
+            return [e for e in map(json.loads, f) if 'meta' not in e]
+
+    def test_parse_policy(self):
+        self.assertEqual(parse_record_policy('on_change'), 'on_change')
+        self.assertEqual(parse_record_policy('1/10'), 10)
+        self.assertEqual(parse_record_policy('10'), 10)
+        self.assertEqual(parse_record_policy(1), 'always')
+        for bad in ('sometimes', '0'):
+            with self.assertRaises(ValueError):
+                parse_record_policy(bad)
+
+    def test_policies_and_replay(self):
+        manager_cls = make_manager_class()
+        recorder = AsyncDataRecorder(self.log_file)
+        count = apply_patches(recorder, [manager_cls], {
+            'get_last_price': 'on_change', 'get_cash': '1/3', 'get_market_hours': 'off'})
+        self.assertEqual(count, 2)
+        self.assertFalse(hasattr(manager_cls.get_market_hours, '__wrapped__'))
+
+        manager = manager_cls('user')
+        self.assertEqual([manager.get_last_price('AAPL') for _ in PRICES], PRICES)
+        for _ in range(7):
+            manager.get_cash('hash_a')
+        recorder.close()
+
+        entries = self._entries()
+        prices = [(e['call_no'], e['result']) for e in entries if e['method'] == 'get_last_price']
+        self.assertEqual(prices, [(0, 100.0), (3, 101.0), (5, 100.0)])
+        self.assertEqual([e['call_no'] for e in entries if e['method'] == 'get_cash'], [0, 3, 6])
+
+        # Replay serves every call, including the ones that were not written
+        session = ReplaySession(self.log_file)
+        replay = ReplayManager('user', session)
+        self.assertEqual([replay.get_last_price('AAPL') for _ in PRICES], PRICES)
+        with self.assertRaises(ReplayExhausted):
+            replay.get_last_price('AAPL')
+        self.assertEqual([replay.get_cash('hash_a') for _ in range(7)], [1000.0] * 7)
+        self.assertFalse(session.has_response('get_cash', ['hash_a']))
+        self.assertEqual(session.unserved_count(), 0)
+
+    def test_appended_sessions_replay_in_order(self):
+        # A restart on the same day appends a second session whose call_no starts again at 0
+        for prices in ([1.0, 1.0, 2.0], [3.0, 3.0, 4.0]):
+            manager_cls = make_manager_class()
+            recorder = AsyncDataRecorder(self.log_file)
+            apply_patches(recorder, [manager_cls], {'get_last_price': 'on_change'})
+            manager = manager_cls('user')
+            manager.prices = list(prices)
+            for _ in prices:
+                manager.get_last_price('AAPL')
+            recorder.close()
+
+        replay = ReplayManager('user', ReplaySession(self.log_file))
+        self.assertEqual([replay.get_last_price('AAPL') for _ in range(6)], [1.0, 1.0, 2.0, 3.0, 3.0, 4.0])
+        with self.assertRaises(ReplayExhausted):
+            replay.get_last_price('AAPL')
+
+    def test_headerless_appended_session(self):
+        # Files appended to before every open wrote a session_start: the seq drop starts the session
+        with open(self.log_file, 'w') as f:
+            for seq, (call_no, price) in enumerate([(0, 1.0), (2, 2.0), (0, 3.0), (1, 4.0)]):
+                f.write(json.dumps({"ts": 1.0 + seq, "seq": seq % 2, "method": "get_last_price",
+                                    "args": ["AAPL"], "kwargs": {}, "result": price, "call_no": call_no}) + "\n")
+        replay = ReplayManager('user', ReplaySession(self.log_file))
+        self.assertEqual([replay.get_last_price('AAPL') for _ in range(5)], [1.0, 1.0, 2.0, 3.0, 4.0])
+        with self.assertRaises(ReplayExhausted):
+            replay.get_last_price('AAPL')
+
+    def test_errors_always_recorded(self):
+        class Flaky:
+            user_id = 'user'
+            calls = 0
+
+            def get_last_price(self, symbol):
+                Flaky.calls += 1
+                if Flaky.calls == 2:
+                    raise RuntimeError('quote timeout')
+                return 100.0
+
+        recorder = AsyncDataRecorder(self.log_file)
+        apply_patches(recorder, [Flaky], {'get_last_price': 'on_change'})
+        manager = Flaky()
+        manager.get_last_price('AAPL')
+        with self.assertRaises(RuntimeError):
+            manager.get_last_price('AAPL')
+        manager.get_last_price('AAPL')
+        recorder.close()
+        # The price after the error is written again even though it did not change
+        self.assertEqual([(e['call_no'], e['error']) for e in self._entries()],
+                         [(0, None), (1, 'quote timeout'), (2, None)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import io
 import os
 import tempfile
 import shutil
@@ -16,7 +17,7 @@ class TestRecorderZeroByteRepro(unittest.TestCase):
         os.chdir(self.original_cwd)
         shutil.rmtree(self.test_dir)
 
-    @patch('library.recorder.subprocess.run')
+    @patch('library.recorder.subprocess.Popen')
     @patch('library.recorder.secret')
     def test_backup_cleans_up_zero_byte_file(self, mock_secret, mock_subprocess):
         """
@@ -32,11 +33,11 @@ class TestRecorderZeroByteRepro(unittest.TestCase):
         mock_secret.db_passwd = 'pass'
 
         # Simulate success return code from mysqldump
-        mock_subprocess.return_value.returncode = 0
+        mock_subprocess.return_value.wait.return_value = 0
         
-        # When subprocess.run is called, it simply returns. 
-        # The `with open(filename, 'w')` in the real code creates the file.
-        # Since we don't write to it in the mock, it remains 0 bytes.
+        # mysqldump exits 0 but writes nothing to stdout.
+        # The real code still opens the (.part) output file, which stays 0 bytes.
+        mock_subprocess.return_value.stdout = io.BytesIO(b"")
 
         # Capture logs
         with self.assertLogs('recorder', level='INFO') as cm:
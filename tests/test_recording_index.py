@@ -0,0 +1,116 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from library.recorder import AsyncDataRecorder
+from library.recording_io import convert_jsonl_to_framed, _parse_line
+from library.recording_index import (build_offset_index, load_offset_index, offset_index_path,
+                                     query_recording, update_offset_index)
+
+BASE_TS = 1704810000.0  # minute-aligned
+
+class TestRecordingIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.test_dir, "market_data_schwab_20240109.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _record(self, offset_index):
+        # One call per account/symbol every 10 seconds for 10 minutes
+        recorder = AsyncDataRecorder(self.log_file, batch_max_entries=7, offset_index=offset_index)
+        clock = [BASE_TS]
+        with patch('library.recorder.time.time', side_effect=lambda: clock[0]):
+            for i in range(60):
+                clock[0] = BASE_TS + i * 10
+                recorder.record('get_cash', ['hash_a'], {}, result=1000.0 + i)
+                recorder.record('get_cash', ['hash_b'], {}, result=5.0)
+                recorder.record('get_last_price', ['AAPL'], {}, result=150.0 + i)
+            recorder.record('get_positions', [{'not': 'scalar'}], {}, result={})
+            recorder.close()
+
+    def test_incremental_index_matches_rebuilt(self):
+        self._record(offset_index=True)
+        incremental = load_offset_index(self.log_file)
+        self.assertEqual(build_offset_index(self.log_file), 181)
+        rebuilt = load_offset_index(self.log_file)
+        self.assertEqual({k: sorted(v) for k, v in incremental.items()},
+                         {k: sorted(v) for k, v in rebuilt.items()})
+        self.assertIn(('get_positions', None, int(BASE_TS // 60) + 9), rebuilt)
+
+    def test_query_seeks_to_matching_entries(self):
+        self._record(offset_index=True)
+        at = BASE_TS + 4 * 60 + 10  # "10:14:10"
+        with patch('library.recording_index._parse_line', wraps=_parse_line) as parse:
+            entries = query_recording(self.log_file, 'get_cash', key='hash_a', start_ts=at, end_ts=at)
+            # Only the indexed lines are parsed, not the whole file
+            self.assertLessEqual(parse.call_count, 6)
+        self.assertEqual([e['result'] for e in entries], [1025.0])
+
+        minute = query_recording(self.log_file, 'get_cash', start_ts=BASE_TS + 120, end_ts=BASE_TS + 179)
+        self.assertEqual(len(minute), 12)
+        self.assertEqual({e['args'][0] for e in minute}, {'hash_a', 'hash_b'})
+
+    def test_index_built_on_demand_and_for_gzip(self):
+        self._record(offset_index=False)
+        self.assertFalse(os.path.exists(offset_index_path(self.log_file)))
+        prices = query_recording(self.log_file, 'get_last_price', key='AAPL', start_ts=BASE_TS + 590)
+        self.assertEqual([e['result'] for e in prices], [209.0])
+        self.assertTrue(os.path.exists(offset_index_path(self.log_file)))
+
+        gz_path, _ = convert_jsonl_to_framed(self.log_file, frame_max_bytes=2048)
+        build_offset_index(gz_path)
+        entries = query_recording(gz_path, 'get_cash', key='hash_a', start_ts=BASE_TS + 250, end_ts=BASE_TS + 260)
+        self.assertEqual([e['result'] for e in entries], [1025.0, 1026.0])
+
+    def _append_cash(self, path, results, **kwargs):
+        recorder = AsyncDataRecorder(path, **kwargs)
+        with patch('library.recorder.time.time', return_value=BASE_TS + 700):
+            for result in results:
+                recorder.record('get_cash', ['hash_c'], {}, result=result)
+            recorder.close()
+
+    def test_grown_recording_is_indexed_before_query(self):
+        self._append_cash(self.log_file, [1.0])
+        build_offset_index(self.log_file)
+        # Still being written: two more entries after the index was built
+        self._append_cash(self.log_file, [2.0, 3.0])
+        self.assertEqual([e['result'] for e in query_recording(self.log_file, 'get_cash', key='hash_c')],
+                         [1.0, 2.0, 3.0])
+        self.assertEqual(update_offset_index(self.log_file), 0)
+
+        gz_path = self.log_file + '.gz'
+        self._append_cash(gz_path, [1.0])
+        build_offset_index(gz_path)
+        self._append_cash(gz_path, [2.0, 3.0])
+        self.assertEqual([e['result'] for e in query_recording(gz_path, 'get_cash', key='hash_c')],
+                         [1.0, 2.0, 3.0])
+
+    def test_recorder_index_covers_its_file(self):
+        self._record(offset_index=True)
+        # Only meta lines lie outside the recorder's batches
+        self.assertEqual(update_offset_index(self.log_file), 0)
+        # A later session recorded without the index
+        self._append_cash(self.log_file, [1.0, 2.0])
+        self.assertEqual(update_offset_index(self.log_file), 2)
+        self.assertEqual(len(query_recording(self.log_file, 'get_cash', key='hash_c')), 2)
+
+    def test_stale_index_of_replaced_file_is_rebuilt(self):
+        self._record(offset_index=True)
+        os.remove(self.log_file)
+        self._append_cash(self.log_file, [1.0])
+        self.assertEqual(update_offset_index(self.log_file), 1)
+        self.assertEqual(list(load_offset_index(self.log_file)), [('get_cash', 'hash_c', int(BASE_TS // 60) + 11)])
+
+    def test_gzip_recorder_ignores_offset_index(self):
+        gz_file = self.log_file + '.gz'
+        recorder = AsyncDataRecorder(gz_file, offset_index=True)
+        recorder.record('get_cash', ['hash_a'], {}, result=1.0)
+        recorder.close()
+        self.assertFalse(recorder.offset_index)
+        self.assertFalse(os.path.exists(offset_index_path(gz_file)))
+
+if __name__ == '__main__':
+    unittest.main()
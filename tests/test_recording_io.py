@@ -0,0 +1,114 @@
+import unittest
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+from library.recorder import AsyncDataRecorder
+from library.recording_io import (
+    FramedGzipWriter, iter_recording, read_index, build_index, convert_jsonl_to_framed, index_path
+)
+
+def _entry(ts, price):
+    return json.dumps({"ts": ts, "method": "get_last_price", "args": ["AAPL"], "kwargs": {},
+                       "result": price, "error": None}) + "\n"
+
+class TestRecordingIO(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "market_data.jsonl.gz")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write_frames(self, frames=10, per_frame=50):
+        writer = FramedGzipWriter(self.path, frame_max_bytes=10 ** 9, frame_max_seconds=float('inf'))
+        ts = 1000.0
+        for _ in range(frames):
+            data = "".join(_entry(ts + i, 100.0 + i) for i in range(per_frame))
+            writer.write_batch(data, ts, ts + per_frame - 1, per_frame)
+            writer.flush()
+            ts += per_frame
+        writer.close()
+
+    def test_frames_are_plain_gzip_and_indexed(self):
+        self._write_frames()
+        index = read_index(self.path)
+        self.assertEqual(len(index), 10)
+        self.assertEqual(index[1]['first_ts'], 1050.0)
+
+        # Concatenated members read as one gzip stream
+        with gzip.open(self.path, 'rt') as f:
+            lines = f.readlines()
+        self.assertIn('meta', json.loads(lines[0]))
+        self.assertEqual(len(lines), 501)
+
+        entries = list(iter_recording(self.path, include_meta=True))
+        self.assertEqual(len(entries), 501)
+
+    def test_seek_by_timestamp(self):
+        self._write_frames()
+        entries = list(iter_recording(self.path, start_ts=1275.0, end_ts=1280.0))
+        self.assertEqual([e['ts'] for e in entries], [1275.0 + i for i in range(6)])
+
+    def test_truncated_tail_frame_is_dropped(self):
+        self._write_frames(frames=3)
+        size = os.path.getsize(self.path)
+        with open(self.path, 'r+b') as f:
+            f.truncate(size - 10)
+        entries = list(iter_recording(self.path))
+        self.assertEqual(len(entries), 100)
+
+        # Index can be rebuilt from the surviving frames
+        os.remove(index_path(self.path))
+        self.assertEqual(build_index(self.path), 2)
+        self.assertEqual(read_index(self.path)[-1]['last_ts'], 1099.0)
+
+    def test_convert_jsonl(self):
+        src = os.path.join(self.test_dir, "market_data.jsonl")
+        with open(src, 'w') as f:
+            f.write(json.dumps({"meta": {"type": "session_start"}}) + "\n")
+            for i in range(1000):
+                f.write(_entry(2000.0 + i, 100.0))
+        dst, frames = convert_jsonl_to_framed(src, frame_max_bytes=16 * 1024)
+        self.assertGreater(frames, 1)
+        self.assertLess(os.path.getsize(dst), os.path.getsize(src))
+        self.assertEqual(list(iter_recording(dst)), list(iter_recording(src)))
+        self.assertEqual(len(list(iter_recording(dst, start_ts=2990.0))), 10)
+
+    def test_recorder_writes_compressed_format(self):
+        recorder = AsyncDataRecorder(self.path)
+        for i in range(100):
+            recorder.record('get_last_price', ['AAPL'], {}, result=100.0 + i)
+        recorder.close()
+
+        entries = list(iter_recording(self.path))
+        self.assertEqual([e['result'] for e in entries], [100.0 + i for i in range(100)])
+        self.assertTrue(read_index(self.path))
+
+    def test_flush_if_due_emits_an_aged_frame(self):
+        with patch('library.recording_io.time.monotonic', return_value=100.0):
+            writer = FramedGzipWriter(self.path, frame_max_bytes=10 ** 9, frame_max_seconds=10.0)
+            writer.write_batch(_entry(1000.0, 100.0), 1000.0, 1000.0, 1)
+        with patch('library.recording_io.time.monotonic', return_value=109.0):
+            self.assertFalse(writer.flush_if_due())
+        with patch('library.recording_io.time.monotonic', return_value=110.0):
+            self.assertTrue(writer.flush_if_due())
+            self.assertFalse(writer.flush_if_due())
+        self.assertEqual(read_index(self.path)[0]['entries'], 1)
+        writer.close()
+
+    def test_idle_recorder_emits_its_frame(self):
+        recorder = AsyncDataRecorder(self.path, frame_options={'frame_max_seconds': 0.1})
+        recorder.record('get_last_price', ['AAPL'], {}, result=100.0)
+        # No further entries: the writer loop still emits the frame once it is due
+        deadline = time.monotonic() + 5
+        while not read_index(self.path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual([e['result'] for e in iter_recording(self.path)], [100.0])
+        recorder.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from library.clock import MockClock
+from library.recorder import AsyncDataRecorder, apply_patches
+from library.replay import ReplaySession, ReplayManager, ReplayExhausted, prepare_replay_db, run_replay
+from library.mysql_helper import DatabaseHandler
+from strategies.market_strategy import MarketStrategy
+from trader import TradingSystem
+
+PRICES = [140.0, 145.0, 139.0, 151.0]
+
+def make_broker_class():
+    class FakeBroker:
+        """Scripted broker used to produce a recording"""
+        def __init__(self, user_id):
+            self.user_id = user_id
+            self.prices = list(PRICES)
+            self.open_cycles = len(PRICES)
+
+        def get_hashs(self):
+            return {'1111': 'hash_a'}
+
+        def get_market_hours(self):
+            self.open_cycles -= 1
+            return self.open_cycles >= 0
+
+        def get_positions(self, hash_value):
+            return {}
+
+        def get_positions_result(self, hash_value):
+            return {}
+
+        def get_cash(self, hash_value):
+            return 10000.0
+
+        def get_account_result(self, hash_value):
+            return 9000.0, 10000.0
+
+        def get_last_price(self, symbol):
+            return self.prices.pop(0) if self.prices else PRICES[-1]
+
+        def place_limit_buy_order(self, hash_value, symbol, quantity, price):
+            return type('Order', (), {'is_success': True})()
+
+    return FakeBroker
+
+class FakeStrategy(MarketStrategy):
+    def __init__(self, db_handler, broker_cls):
+        self.db_handler = db_handler
+        self.broker_cls = broker_cls
+        self.managers = {}
+
+    def get_manager(self, user_id):
+        if user_id not in self.managers:
+            self.managers[user_id] = self.broker_cls(user_id)
+        return self.managers[user_id]
+
+    def get_db_handler(self):
+        return self.db_handler
+
+    def extract_order_id(self, manager, hash_value, order):
+        return 'live-order'
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, 'start_state.sqlite')
+        db = DatabaseHandler(self.db_path, backend='sqlite')
+        db.bootstrap_schema('us')
+        db.add_account('user_0', 'user', '1111', 'Main')
+        db.update_account_hash('1111', 'hash_a', 'user')
+        db.add_trading_rule('user_0', 'AAPL', 142.0, 'price', 20, 1000.0, 1, 1)
+        db.engine.dispose()
+
+        # Record a live-like session against a copy of the start state
+        self.record_path = os.path.join(self.test_dir, 'market_data_schwab.jsonl')
+        recorder = AsyncDataRecorder(self.record_path)
+        broker_cls = make_broker_class()
+        apply_patches(recorder, [broker_cls])
+        live_db, self.live_db_path = prepare_replay_db(self.db_path)
+        system = TradingSystem(FakeStrategy(live_db, broker_cls), clock=MockClock(datetime(2024, 1, 2, 7, 0)))
+        system.send_alert = lambda msg: None
+        system.process_trading_rules()
+        recorder.close()
+        live_db.engine.dispose()
+
+    def tearDown(self):
+        os.remove(self.live_db_path)
+        shutil.rmtree(self.test_dir)
+
+    def test_replay_reproduces_recorded_orders(self):
+        replay_db, temp_db = prepare_replay_db(self.db_path)
+        try:
+            report = run_replay(TradingSystem, self.record_path, replay_db)
+        finally:
+            replay_db.engine.dispose()
+            os.remove(temp_db)
+
+        orders = report['orders']
+        # 140.0 buys 7 shares; 139.0 is then blocked by the daily money limit
+        self.assertEqual(orders['recorded'], 1)
+        self.assertTrue(orders['identical'], orders)
+        self.assertEqual(report['missing_responses'], 0)
+        self.assertEqual(report['unserved'], 0)
+        self.assertEqual(report['alerts'], 1)
+        self.assertEqual(report['cycles'], len(PRICES))
+
+    def test_replay_detects_changed_behavior(self):
+        replay_db, temp_db = prepare_replay_db(self.db_path)
+        try:
+            replay_db.update_rule_field(replay_db.get_active_trading_rules()[0]['id'], 'limit_value', 139.5)
+            report = run_replay(TradingSystem, self.record_path, replay_db)
+        finally:
+            replay_db.engine.dispose()
+            os.remove(temp_db)
+
+        orders = report['orders']
+        self.assertFalse(orders['identical'])
+        # Only the 139.0 tick triggers now
+        self.assertEqual(orders['produced'], 1)
+        self.assertEqual(orders['matched'], 0)
+        self.assertEqual([o['args'][1:4] for o in orders['missing']], [['AAPL', 7, 140.0]])
+        self.assertEqual([o['args'][1:4] for o in orders['unexpected']], [['AAPL', 7, 139.0]])
+
+    def test_manager_serves_in_call_order_and_advances_clock(self):
+        session = ReplaySession(self.record_path)
+        manager = ReplayManager('user', session)
+        start = session.clock.now()
+        self.assertEqual([manager.get_last_price('AAPL') for _ in PRICES], PRICES)
+        self.assertGreaterEqual(session.clock.now(), start)
+        # Price lookup made by update_result after the close
+        self.assertEqual(manager.get_last_price('AAPL'), PRICES[-1])
+        with self.assertRaises(ReplayExhausted):
+            manager.get_last_price('AAPL')
+        # Market closes once recorded market hours run out
+        for _ in range(len(PRICES) + 1):
+            manager.get_market_hours()
+        self.assertFalse(manager.get_market_hours())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from library.clock import MockClock
+from library.mysql_helper import DatabaseHandler
+from library.recorder import AsyncDataRecorder, apply_patches, capture_db_reads, capture_clock
+from library.recording_io import json_default, decode_value
+from library.replay import ReplaySession, ReplayDatabaseHandler, ReplayExhausted, run_replay
+from trader import TradingSystem
+from test_replay import PRICES, FakeStrategy, make_broker_class
+
+class TestValueEncoding(unittest.TestCase):
+    def test_round_trip(self):
+        value = {"price": Decimal("142.50"), "at": datetime(2024, 1, 9, 10, 14, 3),
+                 "day": date(2024, 1, 9), "rows": [{"avg": Decimal("0.1")}], "plain": {"a": 1}}
+        encoded = json.loads(json.dumps(value, default=json_default))
+        self.assertEqual(encoded["price"], {"$decimal": "142.50"})
+        self.assertEqual(decode_value(encoded), value)
+
+class TestReplayCapture(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.record_path = os.path.join(self.test_dir, 'market_data_schwab_20240102.jsonl')
+
+        # Patch subclasses so the real DatabaseHandler / MockClock stay untouched for other tests
+        class CapturedDB(DatabaseHandler):
+            pass
+
+        class CapturedClock(MockClock):
+            pass
+
+        db = CapturedDB(os.path.join(self.test_dir, 'live.sqlite'), backend='sqlite')
+        db.bootstrap_schema('us')
+        db.add_account('user_0', 'user', '1111', 'Main')
+        db.update_account_hash('1111', 'hash_a', 'user')
+        db.add_trading_rule('user_0', 'AAPL', 142.0, 'price', 20, 1000.0, 1, 1)
+
+        recorder = AsyncDataRecorder(self.record_path)
+        broker_cls = make_broker_class()
+        apply_patches(recorder, [broker_cls])
+        self.assertEqual(capture_db_reads(recorder, [CapturedDB], {'get_active_trading_rules': 'on_change'}), 7)
+        capture_clock(recorder, CapturedClock)
+
+        system = TradingSystem(FakeStrategy(db, broker_cls), clock=CapturedClock(datetime(2024, 1, 2, 7, 0)))
+        system.send_alert = lambda msg: None
+        system.process_trading_rules()
+        recorder.close()
+        db.engine.dispose()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_replay_without_database(self):
+        report = run_replay(TradingSystem, self.record_path)
+
+        self.assertTrue(report['orders']['identical'], report['orders'])
+        self.assertEqual(report['orders']['recorded'], 1)
+        self.assertEqual(report['missing_responses'], 0)
+        self.assertEqual(report['unserved'], 0)
+        self.assertEqual(report['cycles'], len(PRICES))
+        # record_trade, rule status/price updates, ... are collected instead of executed
+        self.assertGreater(report['db_writes'], 0)
+
+    def test_captured_reads_and_clock(self):
+        session = ReplaySession(self.record_path)
+        self.assertIn('get_active_trading_rules', session.db_methods)
+        db = ReplayDatabaseHandler(session)
+
+        self.assertEqual(db.get_users(), ['user'])
+        rules = db.get_active_trading_rules()
+        self.assertEqual(rules[0]['symbol'], 'AAPL')
+        # Recorded with on_change: later calls reuse the same rows
+        self.assertEqual(db.get_active_trading_rules(), rules)
+        with self.assertRaises(ReplayExhausted):
+            db.get_trading_rules()
+        db.update_rule_status(1, 'COMPLETED')
+        self.assertEqual(session.db_writes, [{"method": "update_rule_status", "args": [1, 'COMPLETED'], "kwargs": {}}])
+
+        # Clock.now() comes back as a datetime from the recording
+        now = session.clock.now()
+        self.assertIsInstance(now, datetime)
+        self.assertEqual(now.date(), date(2024, 1, 2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+from library.clock import MockClock
+from library.mysql_helper import DatabaseHandler
+from library.paper_broker import PaperExchange
+from library.session_profiler import SessionProfiler
+from strategies.paper_strategy import PaperMarketStrategy
+from trader import TradingSystem
+
+
+class TestSessionProfiler(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.test_dir)
+
+    def test_profiled_loop_writes_artifacts(self):
+        db = DatabaseHandler(':memory:', backend='sqlite')
+        self.addCleanup(db.engine.dispose)
+        db.bootstrap_schema('us')
+        db.add_account('user0_0', 'user0', '100', 'Main')
+        db.update_account_hash('100', 'hash_0', 'user0')
+        db.add_trading_rule('user0_0', 'AAPL', 99.0, 'price', 20, 500.0, 1, 1)
+
+        clock = MockClock(datetime(2024, 1, 2, 15, 59))
+        exchange = PaperExchange(lambda symbol, now: 100.0 - now.second / 30, clock=clock, latency=0.05)
+        exchange.load_accounts(db, cash=3000.0)
+        system = TradingSystem(PaperMarketStrategy(exchange, db), clock=clock)
+        system.send_alert = lambda msg: None
+
+        out_dir = os.path.join(self.test_dir, 'profile_schwab_20240102')
+        profiler = system.enable_session_profiling(out_dir, snapshot_every=10, sample_interval=0.001)
+        profiler.start()
+        try:
+            system.process_trading_rules()
+        finally:
+            summary = profiler.stop(cycle=system.cycle_count)
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(summary['cycles'], system.cycle_count)
+        self.assertEqual(summary['snapshots'], system.cycle_count // 10 + (system.cycle_count % 10 != 0))
+        for name in ('loop.pstats', 'loop_top.txt', 'samples.folded', 'summary.json', 'memory_timeline.jsonl',
+                     'tracemalloc_cycle_000010.txt'):
+            self.assertTrue(os.path.exists(os.path.join(out_dir, name)), name)
+
+        stats = pstats.Stats(os.path.join(out_dir, 'loop.pstats'))
+        self.assertTrue(any(func[2] == 'process_trading_rules' for func in stats.stats))
+        with open(os.path.join(out_dir, 'tracemalloc_cycle_000020.txt'), encoding='utf-8') as f:
+            report = f.read()
+        self.assertIn('growth since previous snapshot', report)
+        self.assertIn('growth since first snapshot', report)
+        with open(os.path.join(out_dir, 'memory_timeline.jsonl'), encoding='utf-8') as f:
+            timeline = [json.loads(line) for line in f]
+        self.assertEqual([t['cycle'] for t in timeline][:2], [10, 20])
+        self.assertIsNone(profiler.stop())  # already stopped
+
+    def test_snapshots_can_be_disabled(self):
+        profiler = SessionProfiler(self.test_dir, snapshot_every=0, use_cprofile=False)
+        profiler.start()
+        self.assertFalse(tracemalloc.is_tracing())
+        profiler.on_cycle(300)
+        summary = profiler.stop(cycle=300)
+        self.assertEqual((summary['snapshots'], summary['samples']), (0, 0))
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['summary.json'])
+
+if __name__ == '__main__':
+    unittest.main()
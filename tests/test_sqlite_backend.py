@@ -0,0 +1,99 @@
+import unittest
+import datetime
+from library.mysql_helper import DatabaseHandler
+from library.db_modules.sql_dialect import insert_ignore
+
+class TestSQLiteBackend(unittest.TestCase):
+    def setUp(self):
+        self.db = DatabaseHandler(':memory:', backend='sqlite')
+        self.db.bootstrap_schema('us')
+        self.db.add_account('user_0', 'user', '1111', 'Main')
+        self.db.add_account('user_1', 'user', '2222', 'IRA')
+        self.db.update_account_hash('1111', 'hash_a', 'user')
+        self.db.update_account_hash('2222', 'hash_b', 'user')
+
+    def test_bootstrap_is_idempotent(self):
+        self.db.bootstrap_schema('us')
+        self.assertEqual(len(self.db.get_accounts(use_dynamic_contribution=False)), 2)
+
+    def test_kr_schema_has_stock_name(self):
+        kr_db = DatabaseHandler(':memory:', backend='sqlite')
+        kr_db.bootstrap_schema('kr')
+        kr_db.add_account('kr_0', 'kr', '3333', 'KR')
+        kr_db.add_kr_trading_rule('kr_0', '005930', 'Samsung', 70000, 'price', 10, 1000000, 1, 1)
+        rules = kr_db.get_active_trading_rules()
+        self.assertEqual(rules[0]['stock_name'], 'Samsung')
+
+    def test_trading_rules_and_trades(self):
+        self.db.add_trading_rule('user_0', 'AAPL', 150.0, 'price', 10, 1000.0, 1, 1)
+        rules = self.db.get_active_trading_rules()
+        self.assertEqual(len(rules), 1)
+        self.assertEqual(rules[0]['hash_value'], 'hash_a')
+
+        rule_id = rules[0]['id']
+        self.db.record_trade('user_0', rule_id, 'ord1', 'AAPL', 2, 150.0, 'BUY')
+        self.assertEqual(self.db.get_trade_today(rule_id), 300)
+
+        self.db.update_rule_field(rule_id, 'daily_money', 2000.0)
+        self.db.update_rule_status(rule_id, 'COMPLETED')
+        self.assertEqual(self.db.get_active_trading_rules(), [])
+
+    def test_daily_results_and_rollup(self):
+        self.db.add_daily_result('2024-01-02', 'user_0', 40.0, 100.0,
+                                 {'AAPL': {'quantity': 1, 'last_price': 60.0}})
+        self.db.add_daily_result('2024-01-03', 'user_0', 30.0, 120.0,
+                                 {'AAPL': {'quantity': 1, 'last_price': 70.0},
+                                  'MSFT': {'quantity': 2, 'last_price': 10.0}})
+        self.db.add_daily_result('2024-01-03', 'user_1', 50.0, 50.0, {})
+
+        totals = self.db.get_daily_total_values(50)
+        self.assertEqual(totals, [
+            {'record_date': '2024-01-02', 'total_value': 100.0},
+            {'record_date': '2024-01-03', 'total_value': 170.0},
+        ])
+        self.assertEqual(self.db.get_adjacent_date('2024-01-03', 'prev'), '2024-01-02')
+
+        allocations, total_value = self.db.get_consolidated_portfolio_allocation()
+        self.assertEqual(total_value, 170.0)
+        by_symbol = {a['symbol']: a for a in allocations}
+        self.assertAlmostEqual(by_symbol['AAPL']['diff_value'], 10.0)
+        self.assertAlmostEqual(by_symbol['MSFT']['diff_quantity'], 2.0)
+
+        # Manual edit updates the rollup and invalidates the cached allocation
+        self.db.upsert_daily_record('2024-01-03', 'user_1', 80.0)
+        allocations, total_value = self.db.get_consolidated_portfolio_allocation()
+        self.assertEqual(total_value, 200.0)
+        self.assertEqual(self.db.get_daily_total_values(50)[-1]['total_value'], 200.0)
+
+        record = self.db.get_daily_records_by_date('2024-01-02')[0]
+        self.db.update_daily_record(record['id'], 90.0)
+        self.assertEqual(self.db.get_daily_total_values(50)[0]['total_value'], 90.0)
+
+        self.assertEqual(self.db.rebuild_daily_portfolio_totals(), 3)
+        self.assertEqual(self.db.get_daily_total_values(50)[-1]['total_value'], 200.0)
+
+    def test_contribution_aggregates(self):
+        sql = f"""
+            {insert_ignore(self.db.dialect)} INTO contribution_history
+            (account_number, activity_id, transaction_date, type, amount, description)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        rows = [
+            ('1111', 1, datetime.datetime(2024, 1, 2, 10, 0), 'JOURNAL', 100.0, ''),
+            ('1111', 2, datetime.datetime(2024, 1, 3, 10, 0), 'JOURNAL', 50.0, ''),
+        ]
+        self.db.execute_many(sql, rows)
+        # Duplicate activity ids are ignored
+        self.db.execute_many(sql, rows)
+        self.db.refresh_contribution_aggregates(['1111'], datetime.datetime(2024, 1, 2, 10, 0))
+
+        accounts = {a['id']: a for a in self.db.get_accounts()}
+        self.assertEqual(accounts['user_0']['contribution'], 150.0)
+        self.assertEqual(accounts['user_1']['contribution'], 0)
+        self.assertEqual(self.db.get_daily_contributions(), {'2024-01-02': 100.0, '2024-01-03': 50.0})
+
+        self.db.rebuild_contribution_aggregates()
+        self.assertEqual(self.db.get_daily_contributions(), {'2024-01-02': 100.0, '2024-01-03': 50.0})
+
+if __name__ == '__main__':
+    unittest.main()
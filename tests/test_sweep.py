@@ -0,0 +1,99 @@
+import unittest
+import csv
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from library.backtester import run_backtest, BUY
+from library.sweep import parse_grid_spec, expand_grid, apply_params, run_sweep, write_results
+from library.tick_archive import TickArchive
+
+BASE_TS = 1704724200.0  # 2024-01-08 14:30 UTC
+
+
+def make_archive(archive_dir):
+    # A slow 20% slide and recovery over 10 days
+    rng = np.random.default_rng(3)
+    ts = BASE_TS + np.repeat(np.arange(10) * 86400.0, 300) + np.tile(np.arange(300) * 60.0, 10)
+    trend = np.concatenate([np.linspace(100, 80, 1500), np.linspace(80, 100, 1500)])
+    price = np.round(trend + rng.normal(0, 0.5, len(ts)), 2)
+    os.makedirs(archive_dir)
+    np.save(os.path.join(archive_dir, 'AAPL.ts.npy'), ts)
+    np.save(os.path.join(archive_dir, 'AAPL.price.npy'), price)
+    with open(os.path.join(archive_dir, 'manifest.json'), 'w') as f:
+        json.dump({"version": 1, "sources": {}, "symbols": {
+            "AAPL": {"file": "AAPL", "count": len(ts), "first_ts": ts[0], "last_ts": ts[-1]}}}, f)
+
+
+RULES = [
+    {"id": 1, "hash_value": "hash_a", "symbol": "AAPL", "trade_action": BUY, "limit_type": "high_percent",
+     "limit_value": 5.0, "target_amount": 100, "daily_money": 1000.0, "cash_only": True, "status": "ACTIVE",
+     "average_price": 100.0, "high_price": 100.0, "current_holding": 1},
+    {"id": 2, "hash_value": "hash_a", "symbol": "MSFT", "trade_action": BUY, "limit_type": "price",
+     "limit_value": 1.0, "target_amount": 1, "daily_money": 10.0, "cash_only": True, "status": "ACTIVE"},
+]
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.archive_dir = os.path.join(self.test_dir, 'schwab')
+        make_archive(self.archive_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_grid_parsing(self):
+        self.assertEqual(parse_grid_spec('limit_value=3:15:3'), ('limit_value', [3.0, 6.0, 9.0, 12.0, 15.0]))
+        self.assertEqual(parse_grid_spec('limit_value=0.1:0.3:0.1')[1], [0.1, 0.2, 0.3])
+        self.assertEqual(parse_grid_spec('daily_money=500,1000'), ('daily_money', [500.0, 1000.0]))
+        with self.assertRaises(ValueError):
+            parse_grid_spec('limit_value')
+        grid = expand_grid({'limit_value': [3.0, 5.0], 'daily_money': [500.0, 1000.0, 2000.0]})
+        self.assertEqual(len(grid), 6)
+        self.assertEqual(grid[1], {'limit_value': 3.0, 'daily_money': 1000.0})
+        rules = apply_params(RULES, {'limit_value': 9.0}, rule_ids=[1])
+        self.assertEqual([r['limit_value'] for r in rules], [9.0, 1.0])
+        self.assertEqual(RULES[0]['limit_value'], 5.0)
+
+    def test_parallel_matches_serial_and_ranks(self):
+        grid = {'limit_value': [3.0, 6.0, 9.0, 12.0], 'daily_money': [300.0, 1000.0]}
+        kwargs = dict(accounts={'hash_a': 20000.0}, rule_ids=[1], utc_offset=0)
+        parallel = run_sweep(self.archive_dir, RULES, grid, processes=2, **kwargs)
+        serial = run_sweep(self.archive_dir, RULES, grid, processes=1, **kwargs)
+        self.assertEqual(parallel, serial)
+
+        self.assertEqual([row['rank'] for row in parallel], list(range(1, 9)))
+        returns = [row['return_pct'] for row in parallel]
+        self.assertEqual(returns, sorted(returns, reverse=True))
+        # Every point is the same as a direct backtest
+        best = parallel[0]
+        direct = run_backtest(apply_params(RULES, {'limit_value': best['limit_value'],
+                                                    'daily_money': best['daily_money']}, [1]),
+                              TickArchive(self.archive_dir), accounts={'hash_a': 20000.0}, utc_offset=0)
+        self.assertEqual(direct.summary()['end_equity'], best['end_equity'])
+
+        by_drawdown = run_sweep(self.archive_dir, RULES, grid, processes=1, rank_by='max_drawdown_pct', **kwargs)
+        drawdowns = [row['max_drawdown_pct'] for row in by_drawdown]
+        self.assertEqual(drawdowns, sorted(drawdowns))
+
+    def test_write_results(self):
+        rows = run_sweep(self.archive_dir, RULES, {'limit_value': [3.0, 6.0]}, accounts={'hash_a': 5000.0},
+                         processes=1, utc_offset=0)
+        csv_path = os.path.join(self.test_dir, 'sweep.csv')
+        write_results(rows, csv_path)
+        with open(csv_path) as f:
+            table = list(csv.DictReader(f))
+        self.assertEqual(list(table[0])[:3], ['rank', 'point', 'limit_value'])
+        self.assertEqual([int(r['rank']) for r in table], [1, 2])
+
+        json_path = os.path.join(self.test_dir, 'sweep.json')
+        write_results(rows, json_path)
+        with open(json_path) as f:
+            self.assertEqual(json.load(f), rows)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import os
+import shutil
+import tempfile
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from library.clock import MockClock
+from library.mysql_helper import DatabaseHandler
+from library.paper_broker import PaperExchange
+from library.replay import ReplaySession, ReplayManager
+from library.synthetic_market import SyntheticMarket, krx_tick_size, round_to_market
+from library.tick_archive import TickArchive, extract_ticks
+from strategies.paper_strategy import PaperMarketStrategy
+from trader import TradingSystem
+
+
+class TestSyntheticMarket(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_price_rounding(self):
+        self.assertEqual(krx_tick_size([1999, 2000, 4999, 19990, 49950, 199900, 499500, 900000]).tolist(),
+                         [1, 5, 5, 10, 50, 100, 500, 1000])
+        self.assertEqual(round_to_market([1998.6, 2002.4, 51234.0, 0.2], 'korea').tolist(),
+                         [1999.0, 2000.0, 51200.0, 1.0])
+        self.assertEqual(round_to_market([101.237, 0.001], 'schwab').tolist(), [101.24, 0.01])
+
+    def test_sessions_and_price_grid(self):
+        market = SyntheticMarket('korea', n_symbols=20, start=date(2024, 1, 5), days=2, tick_seconds=10.0, seed=1)
+        self.assertEqual(market.trading_days, [date(2024, 1, 5), date(2024, 1, 8)])  # weekend skipped
+        (day, ts, prices), _ = list(market.iter_days())
+        seoul = ZoneInfo('Asia/Seoul')
+        self.assertEqual(datetime.fromtimestamp(ts[0], seoul).strftime('%H:%M'), '09:00')
+        self.assertLess(datetime.fromtimestamp(ts[-1], seoul).strftime('%H:%M'), '15:30')
+        self.assertEqual(prices.shape, (20, len(ts)))
+        self.assertTrue(np.all(prices % krx_tick_size(prices) == 0))
+
+        us = SyntheticMarket('schwab', n_symbols=5, days=1, tick_seconds=30.0, seed=1)
+        _, _, us_prices = next(us.iter_days())
+        self.assertTrue(np.allclose(us_prices * 100, np.round(us_prices * 100)))
+
+    def test_seeded_and_splits(self):
+        make = lambda: SyntheticMarket('schwab', n_symbols=3, days=3, tick_seconds=60.0, seed=7, overnight_std=0.0,
+                                       jumps_per_day=0, splits=[('SYN0001', date(2024, 1, 3), 10)])
+        a, b = make().to_series(changes_only=False), make().to_series(changes_only=False)
+        for symbol in a:
+            np.testing.assert_array_equal(a[symbol][1], b[symbol][1])
+        ts, price = a['SYN0001']
+        day2 = np.searchsorted(ts, datetime(2024, 1, 3, tzinfo=ZoneInfo('America/New_York')).timestamp())
+        self.assertAlmostEqual(price[day2 - 1] / price[day2], 10, delta=0.5)
+        self.assertEqual(make().split_events, [{"symbol": "SYN0001", "date": "2024-01-03", "ratio": 10.0}])
+
+    def test_recordings_replay_and_archive(self):
+        market = SyntheticMarket('schwab', n_symbols=4, days=2, tick_seconds=60.0, seed=3)
+        paths = market.write_recordings(self.test_dir)
+        self.assertEqual([os.path.basename(p) for p in paths],
+                         ['market_data_schwab_20240102.jsonl', 'market_data_schwab_20240103.jsonl'])
+
+        # Every poll is served by replay even though only changes were written
+        _, ts, prices = next(SyntheticMarket('schwab', n_symbols=4, days=2, tick_seconds=60.0, seed=3).iter_days())
+        session = ReplaySession(paths[0])
+        self.assertTrue(session.recording_health['gapless'])
+        replay = ReplayManager('user', session)
+        self.assertEqual([replay.get_last_price('SYN0002') for _ in ts], prices[2].tolist())
+
+        archive = TickArchive(os.path.join(self.test_dir, 'archive'))
+        for path in paths:
+            archive.add_recording(path)
+        series = SyntheticMarket('schwab', n_symbols=4, days=2, tick_seconds=60.0, seed=3).to_series()
+        ts, price = archive.load('SYN0003')
+        np.testing.assert_array_equal(np.asarray(price), series['SYN0003'][1])
+
+        direct = TickArchive(os.path.join(self.test_dir, 'direct'))
+        SyntheticMarket('schwab', n_symbols=4, days=2, tick_seconds=60.0, seed=3).build_archive(direct)
+        self.assertEqual(direct.manifest['symbols']['SYN0003']['count'], len(price))
+        self.assertEqual(extract_ticks(paths[1]).keys(), set(market.symbols))
+
+    def test_split_is_adjusted_by_trader(self):
+        db = DatabaseHandler(os.path.join(self.test_dir, 'split.sqlite'), backend='sqlite')
+        self.addCleanup(db.engine.dispose)
+        db.bootstrap_schema('us')
+        db.add_account('user_0', 'user', '1111', 'Main')
+        db.update_account_hash('1111', 'hash_a', 'user')
+        db.add_trading_rule('user_0', 'SYN0000', 5.0, 'high_percent', 50, 1000.0, 1, 1)
+        rule_id = db.get_all_trading_rules()[0]['id']
+        db.update_current_price_quantity(rule_id, 200.0, 20, 180.0, 220.0)
+
+        clock = MockClock(datetime(2024, 1, 2, 9, 0))
+        exchange = PaperExchange({'SYN0000': 20.0}, clock=clock)
+        exchange.load_accounts(db, cash=1000.0)
+        exchange.split('SYN0000', 10)  # 1:10 split overnight
+
+        system = TradingSystem(PaperMarketStrategy(exchange, db), clock=clock)
+        system.sync_split_and_merge_adjustments('user')
+        rule = db.get_all_trading_rules()[0]
+        self.assertEqual((rule['current_holding'], rule['target_amount']), (200, 500))
+        self.assertAlmostEqual(rule['average_price'], 18.0)
+        self.assertAlmostEqual(rule['high_price'], 22.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from library.recorder import AsyncDataRecorder
+from library.tick_archive import TickArchive, extract_ticks, market_of
+
+class TestTickArchive(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.archive_dir = os.path.join(self.test_dir, 'archive', 'schwab')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write_day(self, date, base_ts, prices, tick_channel=False):
+        path = os.path.join(self.test_dir, f"market_data_schwab_{date}.jsonl")
+        recorder = AsyncDataRecorder(path, tick_channel=tick_channel)
+        for symbol, price in prices:
+            recorder.record('get_last_price', [symbol], {}, result=price)
+        recorder.close()
+        # Rewrite timestamps so days do not overlap
+        if not tick_channel:
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+            with open(path, 'w') as f:
+                for i, entry in enumerate(lines):
+                    if 'ts' in entry:
+                        entry['ts'] = base_ts + i
+                    f.write(json.dumps(entry) + "\n")
+        return path
+
+    def test_extract_drops_repeats_and_errors(self):
+        path = self._write_day('20240108', 1000.0, [('AAPL', 150.0), ('AAPL', 150.0), ('AAPL', 151.0), ('MSFT', None)])
+        series = extract_ticks(path)
+        self.assertEqual(list(series), ['AAPL'])
+        ts, price = series['AAPL']
+        self.assertEqual(price.tolist(), [150.0, 151.0])
+        self.assertEqual(ts.dtype, np.float64)
+        self.assertEqual(len(extract_ticks(path, changes_only=False)['AAPL'][1]), 3)
+        self.assertEqual(market_of(path), 'schwab')
+
+    def test_archive_merges_days_and_slices_with_memmap(self):
+        day1 = self._write_day('20240108', 1000.0, [('AAPL', 150.0 + i) for i in range(10)] + [('BRK/B', 400.0)])
+        day2 = self._write_day('20240109', 2000.0, [('AAPL', 200.0 + i) for i in range(10)])
+
+        archive = TickArchive(self.archive_dir)
+        self.assertEqual(archive.add_recording(day2), 10)
+        self.assertEqual(archive.add_recording(day1), 11)
+        # Already ingested -> skipped
+        self.assertEqual(archive.add_recording(day1), 0)
+
+        reopened = TickArchive(self.archive_dir)
+        self.assertEqual(reopened.symbols(), ['AAPL', 'BRK/B'])
+        self.assertTrue(os.path.exists(os.path.join(self.archive_dir, 'BRK_B.ts.npy')))
+        self.assertEqual(reopened.manifest['symbols']['AAPL']['count'], 20)
+
+        ts, price = reopened.load('AAPL')
+        self.assertIsInstance(ts, np.memmap)
+        self.assertTrue(np.all(np.diff(ts) > 0))
+
+        ts, price = reopened.slice('AAPL', start_ts=2000.0, end_ts=2004.0)
+        self.assertEqual(price.tolist(), [200.0, 201.0, 202.0, 203.0])
+        # Views into the mapped file, not copies
+        self.assertFalse(price.flags.owndata)
+
+        self.assertIsNone(reopened.price_at('AAPL', 10.0))
+        self.assertEqual(reopened.price_at('AAPL', 1500.0), 159.0)
+        with self.assertRaises(KeyError):
+            reopened.load('TSLA')
+
+    def test_force_replaces_the_source(self):
+        other = self._write_day('20240108', 1000.0, [('AAPL', 150.0), ('AAPL', 151.0)])
+        path = self._write_day('20240109', 2000.0, [('AAPL', 1.0), ('AAPL', 2.0), ('AAPL', 3.0), ('MSFT', 9.0)])
+        archive = TickArchive(self.archive_dir)
+        archive.add_recording(other)
+        self.assertEqual(archive.add_recording(path), 4)
+        # The day file is rewritten after a mid-day ingest (and MSFT is no longer in it)
+        os.remove(path)
+        path = self._write_day('20240109', 2000.0, [('AAPL', 1.0), ('AAPL', 2.0), ('AAPL', 3.0), ('AAPL', 4.0)])
+        self.assertEqual(archive.add_recording(path, force=True), 4)
+        self.assertEqual(archive.slice('AAPL')[1].tolist(), [150.0, 151.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(archive.manifest['symbols']['AAPL']['count'], 6)
+        self.assertEqual(archive.symbols(), ['AAPL'])
+        self.assertFalse(os.path.exists(os.path.join(self.archive_dir, 'MSFT.ts.npy')))
+
+    def test_force_without_ranges_drops_duplicates(self):
+        path = self._write_day('20240109', 2000.0, [('AAPL', 1.0), ('AAPL', 2.0), ('AAPL', 3.0)])
+        archive = TickArchive(self.archive_dir)
+        archive.add_recording(path)
+        del archive.manifest['sources'][os.path.basename(path)]['ranges']  # manifest written before ranges
+        archive.add_recording(path, force=True)
+        self.assertEqual(archive.slice('AAPL')[1].tolist(), [1.0, 2.0, 3.0])
+
+    def test_symbols_sharing_a_file_are_rejected(self):
+        archive = TickArchive(self.archive_dir)
+        archive.add_series({'BRK/B': ([1.0], [400.0])})
+        with self.assertRaises(ValueError):
+            archive.add_series({'BRK_B': ([2.0], [401.0])})
+        with self.assertRaises(ValueError):
+            TickArchive(os.path.join(self.test_dir, 'other')).add_series(
+                {'BRK/B': ([1.0], [400.0]), 'BRK_B': ([2.0], [401.0])})
+        self.assertEqual(archive.slice('BRK/B')[1].tolist(), [400.0])
+
+    def test_tick_channel_recording(self):
+        path = self._write_day('20240110', 0, [('AAPL', 150.0)] * 5 + [('AAPL', 152.0)], tick_channel=True)
+        archive = TickArchive(self.archive_dir)
+        self.assertEqual(archive.add_recording(path), 2)
+        self.assertEqual(archive.slice('AAPL')[1].tolist(), [150.0, 152.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from library.recorder import AsyncDataRecorder, TICK_STRUCT, read_ticks, tick_paths
+from library.replay import ReplaySession, ReplayManager, ReplayExhausted
+
+class TestTickStore(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.test_dir, "market_data_schwab_20240109.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _calls(self):
+        # (symbol, price or exception) in call order; prices mostly repeat
+        calls = []
+        for i in range(300):
+            calls.append(('AAPL', 150.0 if i < 200 else 151.25))
+            calls.append(('005930', 70000 if i % 100 else 70100))
+        calls.insert(101, ('AAPL', RuntimeError('quote timeout')))
+        return calls
+
+    def _record(self, tick_channel):
+        recorder = AsyncDataRecorder(self.log_file, tick_channel=tick_channel)
+        recorder.record('get_market_hours', [], {}, result=True)
+        for symbol, value in self._calls():
+            if isinstance(value, Exception):
+                recorder.record('get_last_price', [symbol], {}, error=value)
+            else:
+                recorder.record('get_last_price', [symbol], {}, result=value)
+        recorder.close()
+        return recorder
+
+    def test_ticks_written_only_on_change(self):
+        recorder = self._record(tick_channel=True)
+        tick_path, sym_path = tick_paths(self.log_file)
+        self.assertEqual(tick_path, os.path.join(self.test_dir, "market_data_schwab_20240109.ticks"))
+
+        [(session_id, ticks)] = read_ticks(self.log_file)
+        self.assertEqual(session_id, recorder.session_id)
+        self.assertEqual([price for _, _, price in ticks['AAPL']], [150.0, 151.25])
+        self.assertEqual(len(ticks['005930']), 6)  # 70100 / 70000 alternate every 100 calls
+        self.assertEqual(os.path.getsize(tick_path), TICK_STRUCT.size * 8)
+        self.assertEqual(recorder.get_stats()['ticks'], 8)
+
+        with open(self.log_file) as f:
+            entries = [e for e in map(json.loads, f) if "meta" not in e]
+        # Only the market-hours call and the failed lookup stay in JSONL
+        self.assertEqual([e['method'] for e in entries], ['get_market_hours', 'get_last_price'])
+        self.assertEqual(entries[1]['tick_seq'], 51)
+
+    def test_size_reduction(self):
+        self._record(tick_channel=False)
+        plain_size = os.path.getsize(self.log_file)
+        os.remove(self.log_file)
+
+        self._record(tick_channel=True)
+        tick_path, sym_path = tick_paths(self.log_file)
+        compact_size = sum(os.path.getsize(p) for p in (self.log_file, tick_path, sym_path))
+        self.assertGreater(plain_size / compact_size, 20)
+
+    def test_replay_reproduces_every_call(self):
+        self._record(tick_channel=True)
+        manager = ReplayManager('user', ReplaySession(self.log_file))
+        self.assertTrue(manager.get_market_hours())
+        for symbol, value in self._calls():
+            if isinstance(value, Exception):
+                with self.assertRaises(Exception):
+                    manager.get_last_price(symbol)
+            else:
+                self.assertEqual(manager.get_last_price(symbol), value)
+
+    def test_appended_sessions(self):
+        # A restart on the same day appends to the same tick files; seq restarts at 0
+        sessions = [[150.0, 150.0, 151.0, RuntimeError('quote timeout'), 151.0],
+                    [152.0, 152.0, RuntimeError('quote timeout'), 150.0, 150.0, 150.0]]
+        recorders = []
+        for values in sessions:
+            recorder = AsyncDataRecorder(self.log_file, tick_channel=True)
+            for value in values:
+                if isinstance(value, Exception):
+                    recorder.record('get_last_price', ['AAPL'], {}, error=value)
+                else:
+                    recorder.record('get_last_price', ['AAPL'], {}, result=value)
+            recorder.close()
+            recorders.append(recorder)
+
+        ticks = read_ticks(self.log_file)
+        self.assertEqual([session_id for session_id, _ in ticks], [r.session_id for r in recorders])
+        self.assertEqual([[(seq, price) for seq, _, price in t['AAPL']] for _, t in ticks],
+                         [[(0, 150.0), (2, 151.0)], [(0, 152.0), (3, 150.0)]])
+
+        manager = ReplayManager('user', ReplaySession(self.log_file))
+        for value in sessions[0] + sessions[1]:
+            if isinstance(value, Exception):
+                with self.assertRaises(Exception) as raised:
+                    manager.get_last_price('AAPL')
+                self.assertNotIsInstance(raised.exception, ReplayExhausted)
+            else:
+                self.assertEqual(manager.get_last_price('AAPL'), value)
+        with self.assertRaises(ReplayExhausted):
+            manager.get_last_price('AAPL')
+
+    def test_session_without_trailer(self):
+        # First session crashed: no trailer, so its calls end at the last recorded seq
+        recorder = AsyncDataRecorder(self.log_file, tick_channel=True)
+        for price in (150.0, 151.0):
+            recorder.record('get_last_price', ['AAPL'], {}, result=price)
+        with patch.object(AsyncDataRecorder, '_write_meta'):
+            recorder.close()
+        recorder = AsyncDataRecorder(self.log_file, tick_channel=True)
+        for price in (152.0, 152.0):
+            recorder.record('get_last_price', ['AAPL'], {}, result=price)
+        recorder.close()
+
+        manager = ReplayManager('user', ReplaySession(self.log_file))
+        self.assertEqual([manager.get_last_price('AAPL') for _ in range(4)], [150.0, 151.0, 152.0, 152.0])
+        with self.assertRaises(ReplayExhausted):
+            manager.get_last_price('AAPL')
+
+    def test_partial_tick_record_is_ignored(self):
+        self._record(tick_channel=True)
+        tick_path, _ = tick_paths(self.log_file)
+        with open(tick_path, 'ab') as f:
+            f.write(b'\x00' * 5)
+        [(_, ticks)] = read_ticks(self.log_file)
+        self.assertEqual(sum(len(t) for t in ticks.values()), 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,9 +26,11 @@ def verify_methods():
         'get_daily_total_values', 'get_daily_contributions', 
         'get_daily_records_by_date', 'get_daily_records_breakdown',
         'get_adjacent_date', 'update_daily_record', 'upsert_daily_record',
+        'rebuild_daily_portfolio_totals', 'refresh_contribution_aggregates',
+        'rebuild_contribution_aggregates',
         
         # Base
-        'is_database_exist', 'execute_many'
+        'is_database_exist', 'execute_many', 'bootstrap_schema'
     ]
     
     missing = []
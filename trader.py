@@ -1,6 +1,5 @@
 import multiprocess as mp
 from datetime import datetime
-import time
 from enum import IntEnum
 from library.logger_config import setup_logger
 
@@ -11,6 +10,9 @@ from strategies.schwab_strategy import SchwabMarketStrategy
 from strategies.korea_strategy import KoreaMarketStrategy
 from library.clock import Clock
 from library.trade_calculator import TradeCalculator
+from library.memory_monitor import MemoryMonitor
+from library.models import compact_positions, load_rules
+from library.intraday_tracker import IntradayTracker
 class OrderType(IntEnum):
     SELL = 0
     BUY = 1
@@ -26,9 +28,77 @@ class TradingSystem:
         self.db_handler = market_strategy.get_db_handler()
         self.managers = {}  # {user_id: UserAuthManager}
         self.positions_by_account = {}  # {account_id: {symbol: quantity}}
-        self.positions_result_by_account = {}
+        self.positions_result_by_account = {}  # {hash_value: {symbol: Position}}
         self._market_hours = None
         self.logger = setup_logger("trading_system", "log")
+        self.query_profiler = None  # library.query_profiler.QueryProfiler (opt-in)
+        self.session_profiler = None  # library.session_profiler.SessionProfiler (--profile, opt-in)
+        self.recorder = None  # library.recorder.AsyncDataRecorder (health 모니터링, opt-in)
+        self._recorder_dropped = 0
+        self.send_alert = SendMessage  # replay에서는 알림 발송 대신 수집
+        self.market_type = getattr(market_strategy, 'market_type',
+                                   'KR' if isinstance(market_strategy, KoreaMarketStrategy) else 'US')
+        self.cycle_count = 0
+        self.cycle_interval = 1  # 사이클 사이 대기 (초)
+        self.last_rule_count = 0
+        self._rule_cache = {}  # {rule_id: (row values, library.models.Rule)}
+        self.memory_monitor = MemoryMonitor(logger=self.logger)  # 300 사이클마다 RSS/힙 샘플링
+        self.intraday = IntradayTracker()  # 심볼별 장중 고가/저가 (high_percent 판정용)
+        self.high_flush_every = 300  # 장중 고가를 trading_rules.high_price에 반영하는 주기 (사이클)
+
+    def enable_query_profiling(self, n_plus_one_threshold: int = 5):
+        """DB 엔진에 쿼리 프로파일러 부착 (사이클 단위 집계)"""
+        from library.query_profiler import QueryProfiler
+        self.query_profiler = QueryProfiler(n_plus_one_threshold=n_plus_one_threshold, logger=self.logger)
+        self.query_profiler.attach(self.db_handler.engine)
+        return self.query_profiler
+
+    def enable_session_profiling(self, out_dir: str, snapshot_every: int = 300, sample_interval: float = None,
+                                 frames: int = 1):
+        """cProfile + 주기적 tracemalloc 스냅샷 (+ 선택적 스택 샘플링). start()/stop()은 호출자가 담당"""
+        from library.session_profiler import SessionProfiler
+        self.session_profiler = SessionProfiler(out_dir, snapshot_every=snapshot_every,
+                                                sample_interval=sample_interval, frames=frames, logger=self.logger)
+        return self.session_profiler
+
+    def _start_profile_unit(self, name: str):
+        if self.query_profiler:
+            self.query_profiler.start_unit('cycle', name)
+
+    def _end_profile_unit(self):
+        if self.query_profiler:
+            self.query_profiler.end_unit()
+
+    def _check_recorder_health(self):
+        """사이클마다 레코더 드롭 여부 확인 (드롭이 있으면 replay 파일이 불완전)"""
+        if not self.recorder:
+            return
+        dropped = self.recorder.stats["dropped"]
+        if dropped > self._recorder_dropped:
+            self.logger.warning(
+                f"Recorder dropped {dropped - self._recorder_dropped} entries in cycle {self.cycle_count}: "
+                f"{self.recorder.health()}")
+            self._recorder_dropped = dropped
+
+    def _trigger_message(self, rule, symbol, last_price):
+        """매매 조건 충족 로그 (limit_type별 문구)"""
+        side = 'Buy' if rule.trade_action == OrderType.BUY else 'Sell'
+        if rule.limit_type in ('weekly', 'monthly'):
+            return f"Periodic buy for {symbol} at current price ${last_price}"
+        if rule.limit_type == 'percent':
+            if not rule.average_price:
+                return f"Buy condition met for {symbol}: average_price is 0, buying at current price ${last_price}"
+            if side == 'Buy':
+                return (f"Buy condition met for {symbol}: price ${last_price} <= {rule.limit_value}% below avg "
+                        f"${rule.average_price} (${rule.buy_below:.2f})")
+            return (f"Sell condition met for {symbol}: price ${last_price} >= {rule.limit_value}% above avg "
+                    f"${rule.average_price} (${rule.sell_above:.2f})")
+        if rule.limit_type == 'high_percent':
+            return (f"Buy condition met for {symbol}: price ${last_price} <= {rule.limit_value}% below high "
+                    f"${rule.high_price} (${rule.buy_below:.2f})")
+        if side == 'Buy':
+            return f"Buy condition met for {symbol}: price ${last_price} <= limit ${rule.limit_value}"
+        return f"Sell condition met for {symbol}: price ${last_price} >= limit ${rule.limit_value}"
 
     def get_manager(self, user_id: str):
         """Get or create user-specific manager for the market"""
@@ -96,8 +166,7 @@ class TradingSystem:
                                 f"(retry {retry_count}/{max_retries}): error: {str(e)}"
                             )
                             # 재시도 전 딜레이 적용 (지수 백오프 적용)
-                            import time
-                            time.sleep(retry_delay * (2 ** (retry_count - 1)))
+                            self.clock.sleep(retry_delay * (2 ** (retry_count - 1)))
                         else:
                             raise
         except Exception as e:
@@ -110,10 +179,7 @@ class TradingSystem:
             hash_list = self.db_handler.get_hash_value(user_id)
             for hash_value in hash_list:
                 positions = manager.get_positions_result(hash_value)
-                self.positions_result_by_account[hash_value] = {
-                    symbol: data
-                    for symbol, data in positions.items()
-                }
+                self.positions_result_by_account[hash_value] = compact_positions(positions)
                 self.logger.debug(f"Retrieved positions for hash {hash_value}: {positions}")
         except Exception as e:
             self.logger.error(f"Error getting positions for user {user_id}: {str(e)}")
@@ -124,7 +190,7 @@ class TradingSystem:
         
         # --- SAFETY GUARD (DRY RUN MODE) ---
         try:
-            market_type = 'KR' if isinstance(self.market_strategy, KoreaMarketStrategy) else 'US'
+            market_type = self.market_type
             
             # Fetch cash if not provided (Safety Fallback)
             if current_cash is None:
@@ -148,7 +214,7 @@ class TradingSystem:
             if order and order.is_success:
                 # 매매 성공 알림 메시지 생성 및 전송
                 alert_msg = self._create_buy_alert_message(rule, quantity, price)
-                SendMessage(alert_msg)
+                self.send_alert(alert_msg)
 
                 try:
                     self.positions_by_account[rule['hash_value']][rule['symbol']] = (
@@ -173,7 +239,7 @@ class TradingSystem:
         
         # --- SAFETY GUARD (DRY RUN MODE) ---
         try:
-            market_type = 'KR' if isinstance(self.market_strategy, KoreaMarketStrategy) else 'US'
+            market_type = self.market_type
             
             # Use cached holding if not provided (Safety Fallback)
             if current_holding is None:
@@ -197,7 +263,7 @@ class TradingSystem:
             if order and order.is_success:
                 # 매매 성공 알림 메시지 생성 및 전송
                 alert_msg = self._create_sell_alert_message(rule, quantity, price)
-                SendMessage(alert_msg)
+                self.send_alert(alert_msg)
 
                 try:
                     self.positions_by_account[rule['hash_value']][rule['symbol']] = (
@@ -394,10 +460,12 @@ Order At {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')}
         self.update_periodic_rule_status()
         
         # 각 유저의 각 계좌별 포지션 로드
+        self._start_profile_unit('startup')
         users = self.db_handler.get_users()
         for user in users:
             # 1. 상세 데이터 로드 (평단가 확인용)
             self.get_positions(user)
+            manager = self.get_manager(user)
 
             # [GUARD] Phase 1: State Integrity Check
             import sys
@@ -420,7 +488,7 @@ Order At {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')}
                 
                 # Send Critical Alert Email
                 try:
-                    SendMessage(error_msg)
+                    self.send_alert(error_msg)
                 except Exception as alert_err:
                     self.logger.error(f"Failed to send alert: {alert_err}")
                 
@@ -431,82 +499,80 @@ Order At {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')}
             self.sync_split_and_merge_adjustments(user)
             # 3. 매매 로직용 데이터 로드
             self.load_daily_positions(user)
+        self._end_profile_unit()
+        self.intraday.reset()
 
         while self.is_market_open():
+            self.cycle_count += 1
+            self._start_profile_unit(f'cycle-{self.cycle_count}')
             try:
-                rules = self.db_handler.get_active_trading_rules()
+                # 숫자형 변환 + 매매 임계가 계산은 규칙 행이 바뀔 때만 (변경 없는 행은 이전 Rule 재사용)
+                rules = load_rules(self.db_handler.get_active_trading_rules(), self._rule_cache)
+                self.last_rule_count = len(rules)
                 self.logger.info(f"Loaded {len(rules)} active trading rules")
 
                 for rule in rules:
-                    symbol = rule['symbol']
-                    manager = self.get_manager(rule['user_id'])
+                    manager = self.get_manager(rule.user_id)
                     try:
-                        last_price = manager.get_last_price(symbol)
+                        last_price = manager.get_last_price(rule.symbol)
                     except Exception as e:
                         continue
                     if last_price is None:
                         continue
-                    symbol = rule['stock_name'] if 'stock_name' in rule else rule['symbol']
-                    #self.logger.debug(f"Current price for {symbol}: ${last_price}")
-
-                    action = rule['trade_action']
-                    # limit_type에 따라 분기
-                    if rule.get('limit_type') in ['weekly', 'monthly']:
-                        if action == OrderType.BUY:
-                            self.logger.info(f"Periodic buy for {symbol} at current price ${last_price}")
-                            self.buy_stock(manager, rule, last_price, symbol)
-                    elif rule.get('limit_type') == 'percent':
-                        if rule.get('average_price') is None or rule['average_price'] == 0:
-                            # average_price가 0인 경우: 현재가로 매수만, 매도는 안함
-                            if action == OrderType.BUY:
-                                self.logger.info(
-                                    f"Buy condition met for {symbol}: average_price is 0, buying at current price ${last_price}")
-                                self.buy_stock(manager, rule, last_price, symbol)
-                        else:
-                            percent = rule['limit_value']
-                            if action == OrderType.BUY:
-                                buy_price = rule['average_price'] * (1 - percent / 100)
-                                if last_price <= buy_price:
-                                    self.logger.info(
-                                        f"Buy condition met for {symbol}: price ${last_price} <= {percent}% below avg ${rule['average_price']} (${buy_price:.2f})")
-                                    self.buy_stock(manager, rule, last_price, symbol)
-                            elif action == OrderType.SELL:
-                                sell_price = rule['average_price'] * (1 + percent / 100)
-                                if last_price >= sell_price:
-                                    self.logger.info(
-                                        f"Sell condition met for {symbol}: price ${last_price} >= {percent}% above avg ${rule['average_price']} (${sell_price:.2f})")
-                                    self.sell_stock(rule, last_price, symbol)
-                    elif rule.get('limit_type') == 'high_percent':
-                        if action == OrderType.BUY and rule.get('high_price', 0) > 0:
-                            buy_price = rule['high_price'] * (1 - rule['limit_value'] / 100)
-                            if last_price <= buy_price:
-                                self.logger.info(
-                                    f"Buy condition met for {symbol}: price ${last_price} <= {rule['limit_value']}% below high ${rule['high_price']} (${buy_price:.2f})")
-                                self.buy_stock(manager, rule, last_price, symbol)
-
-                    else:
-                        # 가격 기준 거래
-                        if action == OrderType.BUY and last_price <= rule['limit_value']:
-                            self.logger.info(
-                                f"Buy condition met for {symbol}: price ${last_price} <= limit ${rule['limit_value']}")
+                    high = self.intraday.observe(rule.symbol, last_price)
+                    if rule.limit_type == 'high_percent' and high > rule.high_price > 0:
+                        # 장중 신고가: DB 반영 전에도 바로 매수 기준가에 적용
+                        rule.high_price = high
+                        rule.refresh_thresholds()
+
+                    if rule.trade_action == OrderType.BUY:
+                        if last_price <= rule.buy_below:
+                            symbol = rule.display_symbol
+                            self.logger.info(self._trigger_message(rule, symbol, last_price))
                             self.buy_stock(manager, rule, last_price, symbol)
-                        elif action == OrderType.SELL and last_price >= rule['limit_value']:
-                            self.logger.info(
-                                f"Sell condition met for {symbol}: price ${last_price} >= limit ${rule['limit_value']}")
+                    elif rule.trade_action == OrderType.SELL:
+                        if last_price >= rule.sell_above:
+                            symbol = rule.display_symbol
+                            self.logger.info(self._trigger_message(rule, symbol, last_price))
                             self.sell_stock(rule, last_price, symbol)
 
-                time.sleep(1)
+                self._end_profile_unit()
+                self._check_recorder_health()
+                if self.session_profiler:
+                    self.session_profiler.on_cycle(self.cycle_count)
+                self.memory_monitor.on_cycle(self.cycle_count, self)
+                if self.high_flush_every and self.cycle_count % self.high_flush_every == 0:
+                    self.flush_intraday_highs()
+                self.clock.sleep(self.cycle_interval)
 
             except Exception as e:
+                self._end_profile_unit()
                 self.logger.error(f"Error during trading rule processing: {str(e)}")
                 raise
 
         # update current_holding, last_price
         self.logger.info("Market closed. Updating final positions and prices.")
+        self._start_profile_unit('close')
+        self.flush_intraday_highs()
         self.update_result(users)
+        self._end_profile_unit()
+        self.memory_monitor.sample(self.cycle_count, self)
+        self.logger.info(f"[Memory] {self.memory_monitor.summary()}")
+
+    def flush_intraday_highs(self):
+        """마지막 반영 이후 오른 장중 고가를 한 번의 배치로 trading_rules.high_price에 기록"""
+        highs = self.intraday.drain_highs()
+        if not highs:
+            return
+        try:
+            self.db_handler.update_high_prices(highs)
+            self.logger.info(f"Flushed intraday highs for {len(highs)} symbols")
+        except Exception as e:
+            self.intraday.dirty.update(highs)  # 다음 반영 때 재시도
+            self.logger.error(f"Error flushing intraday highs: {str(e)}")
 
     def update_result(self, users):
-        today = self.clock.now().strftime('%Y%m%d')
+        today = self.clock.now().strftime('%Y-%m-%d')
         for user in users:
             self.get_positions(user)
             # Get accounts for this user and update cash balances
@@ -598,9 +664,9 @@ Order At {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')}
         today_traded_money = self.db_handler.get_trade_today(rule['id'])
         
         decision = TradeCalculator.calculate_sell_quantity(
-            target_amount=int(rule['target_amount']),
+            target_amount=rule['target_amount'],
             current_holding=int(current_holding),
-            daily_money_limit=float(rule['daily_money']),
+            daily_money_limit=rule['daily_money'],
             today_traded_money=today_traded_money,
             current_price=last_price
         )
@@ -640,9 +706,9 @@ Order At {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')}
         # If cash_only=False, it returns shortfall.
         
         decision = TradeCalculator.calculate_buy_quantity(
-            target_amount=int(rule['target_amount']),
+            target_amount=rule['target_amount'],
             current_holding=int(current_holding),
-            daily_money_limit=float(rule['daily_money']),
+            daily_money_limit=rule['daily_money'],
             today_traded_money=today_traded_money,
             current_price=last_price,
             available_cash=current_cash,
@@ -668,9 +734,9 @@ Order At {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')}
                 # 4. Second Pass: Re-calculate with new cash (Strict Mode)
                 # Now we must strictly respect the cash we have.
                 decision = TradeCalculator.calculate_buy_quantity(
-                    target_amount=int(rule['target_amount']),
+                    target_amount=rule['target_amount'],
                     current_holding=int(current_holding),
-                    daily_money_limit=float(rule['daily_money']),
+                    daily_money_limit=rule['daily_money'],
                     today_traded_money=today_traded_money,
                     current_price=last_price,
                     available_cash=current_cash,
@@ -683,9 +749,9 @@ Order At {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')}
                 # Better to re-calculate strictly with old cash to avoid order failure.
                  
                 decision = TradeCalculator.calculate_buy_quantity(
-                    target_amount=int(rule['target_amount']),
+                    target_amount=rule['target_amount'],
                     current_holding=int(current_holding),
-                    daily_money_limit=float(rule['daily_money']),
+                    daily_money_limit=rule['daily_money'],
                     today_traded_money=today_traded_money,
                     current_price=last_price,
                     available_cash=current_cash,
@@ -708,7 +774,7 @@ Order At {self.clock.now().strftime('%Y-%m-%d %H:%M:%S')}
         if self.place_buy_order(rule, decision.quantity, last_price, current_cash):
             if rule['limit_type'] in ['weekly', 'monthly']:
                 self.db_handler.update_rule_status(rule['id'], 'PROCESSED')
-            elif int(current_holding) + decision.quantity >= int(rule['target_amount']):
+            elif int(current_holding) + decision.quantity >= rule['target_amount']:
                 self.logger.info(
                     f"Rule {rule['id']} completed after buying {decision.quantity} shares. New holding: {int(current_holding) + decision.quantity}")
                 self.db_handler.update_rule_status(rule['id'], 'COMPLETED')
@@ -720,10 +786,69 @@ if __name__ == "__main__":
     parser.add_argument('--market', choices=['schwab', 'korea'], default='schwab',
                         help='Market to trade on (schwab or korea)')
     parser.add_argument('--no-record', action='store_true', help='Disable market data recording')
+    parser.add_argument('--record-fsync', choices=['none', 'batch', 'interval'], default='none',
+                        help='fsync policy for the recorder (none, every batch, or every 5 seconds)')
+    parser.add_argument('--record-compress', action='store_true',
+                        help='Write recordings as compressed, seekable gzip frames (.jsonl.gz + .idx)')
+    parser.add_argument('--record-ticks', action='store_true',
+                        help='Store get_last_price results in a compact binary tick file (only on price change)')
+    parser.add_argument('--record-index', action='store_true',
+                        help='Maintain a (method, key, minute) -> offset sidecar index (.oidx) while recording')
+    parser.add_argument('--record-backpressure', default='drop_newest',
+                        choices=['drop_newest', 'drop_oldest', 'sample_ticks', 'block_orders'],
+                        help='What the recorder sheds when its queue is full (default drop_newest)')
+    parser.add_argument('--record-db-reads', action='store_true',
+                        help='Also record DatabaseHandler reads so --replay needs no DB restore')
+    parser.add_argument('--record-clock', action='store_true', help='Also record Clock.now() results')
+    parser.add_argument('--record-policy', action='append', default=[], metavar='METHOD=POLICY',
+                        help='Per-method recording: always, on_change, off or 1/N sampling '
+                             '(e.g. get_last_price=on_change; repeatable)')
+    parser.add_argument('--profile-sql', action='store_true',
+                        help='Profile SQL per trading cycle and write a JSON summary to log/')
+    parser.add_argument('--sql-n-plus-one', type=int, default=5,
+                        help='Warn when one statement runs more than N times in a cycle (with --profile-sql)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the session (cProfile + tracemalloc snapshots) into log/profile_{market}_{date}/')
+    parser.add_argument('--profile-snapshot-every', type=int, default=300, metavar='N',
+                        help='Cycles between tracemalloc snapshots with --profile (0 disables tracemalloc)')
+    parser.add_argument('--profile-sample-ms', type=float, default=0, metavar='MS',
+                        help='Also sample the loop stack every MS milliseconds into samples.folded (0: off)')
+    parser.add_argument('--profile-frames', type=int, default=1,
+                        help='Traceback depth tracemalloc keeps per allocation (more = slower)')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='Replay a recorded session (records/market_data_*.jsonl[.gz]) instead of trading live')
+    parser.add_argument('--replay-db', metavar='SQLITE',
+                        help='SQLite DB holding the session-start state for --replay (copied, never modified). '
+                             'Default: DB reads captured in the recording (--record-db-reads), else an empty DB')
+    parser.add_argument('--replay-report', metavar='JSON', help='Write the replay report (order diff) to this file')
     args = parser.parse_args()
 
+    # --- Deterministic Replay (no broker, no real sleeps) ---
+    if args.replay:
+        import json
+        import os
+        from library.replay import prepare_replay_db, run_replay
+
+        market_type = 'KR' if args.market == 'korea' else 'US'
+        replay_db, temp_db = None, None
+        if args.replay_db:
+            replay_db, temp_db = prepare_replay_db(args.replay_db, 'kr' if market_type == 'KR' else 'us')
+        try:
+            report = run_replay(TradingSystem, args.replay, replay_db, market_type=market_type)
+        finally:
+            if temp_db:
+                os.remove(temp_db)
+        print(json.dumps(report, indent=2, default=str))
+        if report['recording_health']['gapless'] is False:
+            print("[Replay] WARNING: recording is incomplete (dropped entries or missing trailer) - diff may be unreliable")
+        if args.replay_report:
+            with open(args.replay_report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, default=str)
+        raise SystemExit(0 if report['orders']['identical'] else 1)
+
     # --- Data Recorder Integration ---
     recorder = None
+    start_backup = None
     if not args.no_record:
         try:
             from library.recorder import AsyncDataRecorder, apply_patches, backup_databases
@@ -732,14 +857,29 @@ if __name__ == "__main__":
             
             today_str = datetime.now().strftime('%Y%m%d')
             record_filename = f"records/market_data_{args.market}_{today_str}.jsonl"
+            if args.record_compress:
+                record_filename += ".gz"
             
-            # 1. Backup DB at Start
-            backup_databases('start')
+            # 1. Backup DB at Start (in the background; trading only waits until the
+            #    dumps have opened their --single-transaction snapshot)
+            start_backup = backup_databases('start', wait=False)
+            if not start_backup.wait_started(timeout=30.0):
+                print("[Backup] Start backup did not begin streaming within 30s, continuing")
             
-            recorder = AsyncDataRecorder(record_filename)
+            recorder = AsyncDataRecorder(record_filename, fsync_policy=args.record_fsync,
+                                         tick_channel=args.record_ticks, offset_index=args.record_index,
+                                         backpressure=args.record_backpressure)
             
             # Apply patches to Manager classes
-            patched_count = apply_patches(recorder, [SchwabManager, KoreaManager])
+            record_policies = dict(item.split('=', 1) for item in args.record_policy)
+            patched_count = apply_patches(recorder, [SchwabManager, KoreaManager], record_policies)
+            if args.record_db_reads:
+                from library.recorder import capture_db_reads
+                from library.mysql_helper import DatabaseHandler
+                patched_count += capture_db_reads(recorder, [DatabaseHandler], record_policies)
+            if args.record_clock:
+                from library.recorder import capture_clock
+                patched_count += capture_clock(recorder, Clock)
             
             # Use print or basic logger since setup_logger might not be fully configured for 'recorder' yet
             print(f"[Recorder] Active: {record_filename}. Patched {patched_count} methods.")
@@ -757,6 +897,17 @@ if __name__ == "__main__":
 
     # Initialize trading system with the selected strategy
     trading_system = TradingSystem(market_strategy)
+    trading_system.recorder = recorder
+    if args.profile_sql:
+        trading_system.enable_query_profiling(args.sql_n_plus_one)
+    if args.profile:
+        profile_dir = f"log/profile_{args.market}_{datetime.now().strftime('%Y%m%d')}"
+        trading_system.enable_session_profiling(
+            profile_dir, snapshot_every=args.profile_snapshot_every,
+            sample_interval=args.profile_sample_ms / 1000 if args.profile_sample_ms else None,
+            frames=args.profile_frames)
+        trading_system.session_profiler.start()
+        print(f"[Profiler] Session profile -> {profile_dir}")
 
     # Start trading
     mp.freeze_support()
@@ -777,10 +928,25 @@ Status: Trading system crashed unexpectedly
             print(f"Original error: {e}")
         raise  # 원래 에러를 다시 발생시켜서 디버깅 정보 유지
     finally:
+        if trading_system.session_profiler:
+            try:
+                trading_system.session_profiler.stop(cycle=trading_system.cycle_count)
+                print(f"[Profiler] Session profile written to {trading_system.session_profiler.out_dir}")
+            except Exception as e:
+                print(f"[Profiler] Failed to write session profile: {e}")
+        if trading_system.query_profiler:
+            profile_path = f"log/sql_profile_{args.market}_{datetime.now().strftime('%Y%m%d')}.json"
+            try:
+                trading_system.query_profiler.dump(profile_path)
+                print(f"[Profiler] SQL summary written to {profile_path}")
+            except Exception as e:
+                print(f"[Profiler] Failed to write SQL summary: {e}")
         if recorder:
             try:
+                if start_backup:
+                    start_backup.wait()
                 # 2. Backup DB at End
                 backup_databases('end')
             except Exception as e:
                 print(f"[Backup] Failed at end: {e}")
-            recorder.close()
\ No newline at end of file
+            recorder.close()  # logs the throughput summary